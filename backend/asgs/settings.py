@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 from environs import Env
@@ -19,10 +21,8 @@ from dotenv import find_dotenv
 env = Env()
 if env.bool("DEVELOPMENT", "False") or env.bool("DEV", "False"):
     load_dotenv(find_dotenv())
-    print("DEVELOPMENT version. Use '.env.dev'")
 else:
     load_dotenv(find_dotenv(".env"))
-    print("PRODUCTION version. Use '.env'")
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -40,31 +40,44 @@ CSRF_TRUSTED_ORIGINS = env.list("CSRF_TRUSTED_ORIGINS")
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = env.bool("DEBUG", True)
-print("DEBUG:", DEBUG)
 
 ALLOWED_HOSTS = env.list("ALLOWED_HOSTS")
-print("ALLOWED_HOSTS:", ALLOWED_HOSTS)
 
 
+LOG_LEVEL = env("LOG_LEVEL", "INFO")
+# Outside the source tree unless set, so test and dev runs leave no log behind
+LOG_FILE = env("LOG_FILE", os.path.join(tempfile.gettempdir(), "asgs.log"))
+
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
+    "filters": {
+        "sampling": {
+            "()": "core.log.SamplingFilter",
+            "rates": {"django.db.backends": env.float("LOG_SQL_SAMPLE_RATE", 0.01)},
+        },
+    },
     "handlers": {
         "file": {
-            "level": "INFO",
-            "class": "logging.FileHandler",
-            "filename": "./debug.log",
+            "level": LOG_LEVEL,
+            "class": "core.log.AsyncFileHandler",
+            "filename": LOG_FILE,
+            "max_bytes": env.int("LOG_MAX_BYTES", 50 * 1024 * 1024),
+            "backup_count": env.int("LOG_BACKUP_COUNT", 5),
+            "when": env("LOG_ROTATE_WHEN", "") or None,
+            "queue_size": env.int("LOG_QUEUE_SIZE", 10000),
+            "filters": ["sampling"],
         },
     },
     "loggers": {
         "django": {
             "handlers": ["file"],
-            "level": "DEBUG",
+            "level": LOG_LEVEL,
             "propagate": True,
         },
         "core": {
             "handlers": ["file"],
-            "level": "DEBUG",
+            "level": LOG_LEVEL,
             "propagate": True,
         },
     },
@@ -80,6 +93,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "rest_framework.authtoken",
     "corsheaders",
     "rest_framework",
@@ -88,6 +102,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "core.middleware.CompressionMiddleware",
+    "core.throttling.ConcurrencyLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -95,6 +111,8 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "core.profiling.ProfilingMiddleware",
+    "core.querylog.QueryLogMiddleware",
 ]
 
 ROOT_URLCONF = "asgs.urls"
@@ -129,9 +147,24 @@ DATABASES = {
         "PASSWORD": env("DB_PASSWORD"),
         "HOST": env("DB_HOST"),
         "PORT": env.int("DB_PORT"),
+        # Seconds a connection is reused across requests, 0 closes it after each
+        "CONN_MAX_AGE": env.int("DB_CONN_MAX_AGE", 0),
+        "CONN_HEALTH_CHECKS": True,
     }
 }
 
+# Product orders are spread over shards by sale point, see core/sharding.py.
+# The default database is the first shard; each name in ORDER_SHARDS adds a
+# database on the same server. Only ever append: a shard's position is part of
+# its order ids.
+ORDER_SHARDS = ["default"]
+for index, name in enumerate(env.list("ORDER_SHARDS", []), start=1):
+    DATABASES[f"orders_{index}"] = {**DATABASES["default"], "NAME": name}
+    ORDER_SHARDS.append(f"orders_{index}")
+DATABASE_ROUTERS = ["core.sharding.OrderShardRouter"]
+# Threads per worker querying shards concurrently
+ORDER_SHARD_THREADS = env.int("ORDER_SHARD_THREADS", 4 * len(ORDER_SHARDS))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -183,12 +216,149 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "core.renderers.ORJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "core.renderers.MessagePackRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "core.parsers.ORJSONParser",
+        "core.parsers.MessagePackParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "core.throttling.PrincipalWriteThrottle",
+        "core.throttling.EndpointWriteThrottle",
+    ],
+    # Token buckets for write requests per user (or address), see core/throttling.py
+    "DEFAULT_THROTTLE_RATES": {
+        "writes": env("THROTTLE_RATE_WRITES", "600/min"),
+        "orders": env("THROTTLE_RATE_ORDERS", "120/min"),
+        "order_status": env("THROTTLE_RATE_ORDER_STATUS", "30/min"),
+        "stock_sync": env("THROTTLE_RATE_STOCK_SYNC", "60/min"),
+        "tracking": env("THROTTLE_RATE_TRACKING", "120/min"),
+    },
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 1000,
 }
 
 AUTH_USER_MODEL = "core.ExtendedUser"
 
+# Product orders are stored in monthly partitions, see `manage.py order_partitions`
+ORDER_PARTITION_MONTHS_AHEAD = env.int("ORDER_PARTITION_MONTHS_AHEAD", 3)
+ORDER_ARCHIVE_AFTER_MONTHS = env.int("ORDER_ARCHIVE_AFTER_MONTHS", 12)
+ORDER_ARCHIVE_DIR = env("ORDER_ARCHIVE_DIR", "")
+ORDER_ARCHIVE_TABLESPACE = env("ORDER_ARCHIVE_TABLESPACE", "")
+
+# Order list: the count stops at ORDER_COUNT_LIMIT rows, and filtering by
+# several statuses alone needs a date range of at most ORDER_FILTER_MAX_DAYS
+ORDER_COUNT_LIMIT = env.int("ORDER_COUNT_LIMIT", 100000)
+ORDER_FILTER_MAX_DAYS = env.int("ORDER_FILTER_MAX_DAYS", 31)
+
+# Delivery tracking: pings per ingest request, how far ahead of the server
+# clock a ping may be, and monthly partitions, see `manage.py tracking_partitions`.
+# Partitions older than TRACKING_ARCHIVE_AFTER_MONTHS (0 keeps them) are dumped
+# to TRACKING_ARCHIVE_DIR if set, and dropped.
+TRACKING_MAX_BATCH = env.int("TRACKING_MAX_BATCH", 10000)
+TRACKING_MAX_CLOCK_SKEW = env.int("TRACKING_MAX_CLOCK_SKEW", 300)
+TRACKING_PARTITION_MONTHS_AHEAD = env.int("TRACKING_PARTITION_MONTHS_AHEAD", 3)
+TRACKING_ARCHIVE_AFTER_MONTHS = env.int("TRACKING_ARCHIVE_AFTER_MONTHS", 0)
+TRACKING_ARCHIVE_DIR = env("TRACKING_ARCHIVE_DIR", "")
+
+# Transactions that hit a deadlock or serialization failure are run again up
+# to DB_RETRY_ATTEMPTS times, after a random delay of up to
+# DB_RETRY_BASE_DELAY * 2 ** attempt seconds (capped), see core/retry.py
+DB_RETRY_ATTEMPTS = env.int("DB_RETRY_ATTEMPTS", 5)
+DB_RETRY_BASE_DELAY = env.float("DB_RETRY_BASE_DELAY", 0.02)
+DB_RETRY_MAX_DELAY = env.float("DB_RETRY_MAX_DELAY", 1.0)
+
+# Lines reported per rejected stock import, see core/stock_import.py
+STOCK_IMPORT_MAX_ERRORS = env.int("STOCK_IMPORT_MAX_ERRORS", 1000)
+
+# Seconds a stock snapshot lags behind now, see `manage.py stock_snapshots`
+STOCK_SNAPSHOT_LAG = env.int("STOCK_SNAPSHOT_LAG", 300)
+
+# Demand forecasts, see `manage.py forecast_demand`
+FORECAST_HISTORY_DAYS = env.int("FORECAST_HISTORY_DAYS", 182)
+FORECAST_HORIZON_DAYS = env.int("FORECAST_HORIZON_DAYS", 14)
+FORECAST_LEAD_TIME_DAYS = env.int("FORECAST_LEAD_TIME_DAYS", 7)
+FORECAST_SERVICE_LEVEL = env.float("FORECAST_SERVICE_LEVEL", 0.95)
+
+# Per-worker availability index refreshed by LISTEN/NOTIFY, see core/availability.py
+AVAILABILITY_INDEX = env.bool("AVAILABILITY_INDEX", True)
+AVAILABILITY_RECONNECT_DELAY = env.float("AVAILABILITY_RECONNECT_DELAY", 5)
+
+# Seconds a new gunicorn worker waits for the availability index to load
+# before serving, see core/warmup.py and gunicorn.conf.py
+WARMUP_TIMEOUT = env.float("WARMUP_TIMEOUT", 10)
+
+# Sampling profiler, see core/profiling.py: admins profile a request by sending
+# the PROFILE_HEADER header and PROFILE_SAMPLE_RATE (0 to 1) of all requests are
+# profiled. Stacks are sampled every PROFILE_INTERVAL seconds and the newest
+# PROFILE_KEEP profiles are kept in PROFILE_DIR, listed at `profiles/`.
+PROFILE_HEADER = env("PROFILE_HEADER", "X-Profile")
+PROFILE_SAMPLE_RATE = env.float("PROFILE_SAMPLE_RATE", 0)
+PROFILE_INTERVAL = env.float("PROFILE_INTERVAL", 0.005)
+PROFILE_DIR = env("PROFILE_DIR", str(BASE_DIR / "profiles"))
+PROFILE_KEEP = env.int("PROFILE_KEEP", 500)
+
+# Statements slower than SLOW_QUERY_MS (0 turns the log off) are saved per
+# fingerprint every SLOW_QUERY_FLUSH_INTERVAL seconds. Each worker captures the
+# plan of a fingerprint at most every SLOW_QUERY_EXPLAIN_INTERVAL seconds, with
+# EXPLAIN limited to SLOW_QUERY_EXPLAIN_TIMEOUT ms, see core/querylog.py and
+# `slow-queries/`.
+SLOW_QUERY_MS = env.float("SLOW_QUERY_MS", 200)
+SLOW_QUERY_FLUSH_INTERVAL = env.float("SLOW_QUERY_FLUSH_INTERVAL", 10)
+SLOW_QUERY_EXPLAIN_INTERVAL = env.float("SLOW_QUERY_EXPLAIN_INTERVAL", 3600)
+SLOW_QUERY_EXPLAIN_TIMEOUT = env.int("SLOW_QUERY_EXPLAIN_TIMEOUT", 10000)
+
+# Number of suggestions returned by `product/autocomplete/`
+SEARCH_AUTOCOMPLETE_LIMIT = env.int("SEARCH_AUTOCOMPLETE_LIMIT", 10)
+
+# Maximum number of low-stock alerts returned per feed request
+STOCK_ALERT_FEED_LIMIT = env.int("STOCK_ALERT_FEED_LIMIT", 500)
+# Alerts younger than this many seconds are held back from the feed, since a
+# transaction still committing may hold a lower id
+STOCK_ALERT_FEED_LAG = env.float("STOCK_ALERT_FEED_LAG", 5)
+
+# Bulk user onboarding, see `register-user/bulk/` and `manage.py onboard_users`
+ONBOARDING_MAX_ROWS = env.int("ONBOARDING_MAX_ROWS", 10000)
+# Processes hashing the passwords of one large batch, started for it alone
+ONBOARDING_HASH_WORKERS = env.int(
+    "ONBOARDING_HASH_WORKERS", min(4, os.cpu_count() or 1)
+)
+ONBOARDING_POOL_THRESHOLD = env.int("ONBOARDING_POOL_THRESHOLD", 32)
+
+# Throttle buckets and concurrency slots live in Redis when this is set,
+# otherwise in the memory of each worker: then every worker process has its own
+# buckets and its own CONCURRENCY_LIMITS, so set it with several workers
+THROTTLE_STORE_URL = env("THROTTLE_STORE_URL", "")
+
+# In-flight write requests per path prefix before shedding with 429, the
+# longest matching prefix wins. A slot not released within
+# CONCURRENCY_SLOT_TIMEOUT seconds (a killed worker) is freed.
+CONCURRENCY_LIMITS = {
+    "": env.int("CONCURRENCY_LIMIT_WRITES", 64),
+    "/product_order/": env.int("CONCURRENCY_LIMIT_ORDERS", 16),
+    "/sale_point/": env.int("CONCURRENCY_LIMIT_ORDERS", 16),
+    "/factory_warehouse/": env.int("CONCURRENCY_LIMIT_STOCK", 8),
+}
+CONCURRENCY_SLOT_TIMEOUT = env.int("CONCURRENCY_SLOT_TIMEOUT", 60)
+CONCURRENCY_RETRY_AFTER = env.int("CONCURRENCY_RETRY_AFTER", 1)
+
+# Admin changelists show the planner's row estimate above this many rows
+ADMIN_EXACT_COUNT_LIMIT = env.int("ADMIN_EXACT_COUNT_LIMIT", 10000)
+
+# Response compression, encodings in order of preference
+COMPRESSION_ENCODINGS = env.list("COMPRESSION_ENCODINGS", ["zstd", "br", "gzip"])
+COMPRESSION_MIN_SIZE = env.int("COMPRESSION_MIN_SIZE", 1024)
+COMPRESSION_LEVELS = {
+    "gzip": env.int("COMPRESSION_GZIP_LEVEL", 6),
+    "br": env.int("COMPRESSION_BROTLI_LEVEL", 4),
+    "zstd": env.int("COMPRESSION_ZSTD_LEVEL", 3),
+}
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOWED_ORIGINS = [
@@ -209,8 +379,15 @@ CORS_ALLOW_HEADERS = [
     "authorization",
     "content-type",
     "dnt",
+    "if-match",
     "origin",
     "user-agent",
     "x-csrftoken",
+    "x-profile",
     "x-requested-with",
 ]
+# Read by the frontend to send If-Match with its edits, and to link profiles
+CORS_EXPOSE_HEADERS = [
+    "etag",
+    "x-profile",
+]
@@ -1,3 +1,4 @@
+from django.contrib import admin
 from django.urls import path, include
 from rest_framework import routers
 from rest_framework.authtoken.views import obtain_auth_token
@@ -17,6 +18,9 @@ router.register(r"product_order", views.ProductOrderViewSet)
 router.register(r"sale_point", views.SalePointViewSet)
 router.register(r"carrier", views.CarrierViewSet)
 router.register(r"delivery", views.DeliveryViewSet)
+router.register(r"forecasts", views.DemandForecastViewSet)
+router.register(r"profiles", views.ProfileViewSet, basename="profiles")
+router.register(r"slow-queries", views.SlowQueryViewSet)
 router.register(
     r"products-with-quantity",
     views.ProductsWithQuantityViewSet,
@@ -25,7 +29,28 @@ router.register(
 
 urlpatterns = [
     path("", include(router.urls)),
+    path("admin/", admin.site.urls),
     path("api-auth/", include("rest_framework.urls", namespace="rest_framework")),
     path("api-token-auth/", obtain_auth_token, name="api_token_auth"),
     path("user-info/", views.UserInfoView.as_view(), name="user-info"),
+    path(
+        "bootstrap/factory/",
+        views.BootstrapView.as_view(role="factory"),
+        name="bootstrap-factory",
+    ),
+    path(
+        "bootstrap/sale_point/",
+        views.BootstrapView.as_view(role="sale_point"),
+        name="bootstrap-sale-point",
+    ),
+    path(
+        "bootstrap/carrier/",
+        views.BootstrapView.as_view(role="carrier"),
+        name="bootstrap-carrier",
+    ),
+    path(
+        "analytics/sales/",
+        views.SalesAnalyticsView.as_view(),
+        name="analytics-sales",
+    ),
 ]
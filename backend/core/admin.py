@@ -1,5 +1,440 @@
-from django.contrib import admin
+import json
+
+from django import forms
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
 from django.contrib.auth.admin import UserAdmin
-from .models import ExtendedUser
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+from . import sharding
+from .alerts import stock_changed
+from .models import (
+    Carrier,
+    DailySalesRollup,
+    Delivery,
+    DemandForecast,
+    ExtendedUser,
+    Factory,
+    FactoryWarehouse,
+    HourlySalesRollup,
+    Product,
+    ProductCategory,
+    ProductOrder,
+    ReorderThreshold,
+    SalePoint,
+    StockAlert,
+    StockMovement,
+    StockSnapshot,
+)
+
+
+def estimate_count(queryset):
+    # Planner estimate: pg_class statistics for a whole table (summed over the
+    # partitions), EXPLAIN for a filtered changelist.
+    with connections[queryset.db].cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute(
+                """
+                SELECT coalesce(sum(greatest(c.reltuples, 0)), 0)
+                FROM pg_class c
+                WHERE c.oid = %s::regclass
+                   OR c.oid IN (
+                       SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass
+                   )
+                """,
+                [queryset.model._meta.db_table] * 2,
+            )
+            return int(cursor.fetchone()[0])
+
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class EstimatedCountPaginator(Paginator):
+    # COUNT(*) over millions of rows takes seconds, so above
+    # ADMIN_EXACT_COUNT_LIMIT the changelist shows the planner's estimate
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate < settings.ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 100
+
+
+class ShardFilter(admin.SimpleListFilter):
+    # Picks the shard a changelist reads from; only shown with several shards
+    title = "shard"
+    parameter_name = "shard"
+
+    def lookups(self, request, model_admin):
+        if len(sharding.shards()) > 1:
+            return [(alias, alias) for alias in sharding.shards()]
+
+    def choices(self, changelist):
+        current = self.value() or DEFAULT_DB_ALIAS
+        for alias, title in self.lookup_choices:
+            yield {
+                "selected": alias == current,
+                "query_string": changelist.get_query_string(
+                    {self.parameter_name: alias}
+                ),
+                "display": title,
+            }
+
+    def queryset(self, request, queryset):
+        alias = self.value() or DEFAULT_DB_ALIAS
+        if alias not in sharding.shards():
+            raise IncorrectLookupParameters(f"Unknown shard {alias!r}.")
+        return queryset.using(alias)
+
+
+class ShardedAdmin(ScalableAdmin):
+    # Rows of sharded models are listed per shard, and read and written on
+    # the shard their changelist showed. The rows they refer to are on the
+    # default database, so list_select_related is prefetched instead of joined.
+    def get_list_filter(self, request):
+        return (ShardFilter, *super().get_list_filter(request))
+
+    def get_list_select_related(self, request):
+        return ()
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(*self.list_select_related)
+
+    def object_shard(self, request, object_id):
+        shard = request.GET.get(ShardFilter.parameter_name)
+        if shard is None:
+            preserved = QueryDict(request.GET.get("_changelist_filters", ""))
+            shard = preserved.get(ShardFilter.parameter_name)
+        return shard if shard in sharding.shards() else DEFAULT_DB_ALIAS
+
+    def get_object(self, request, object_id, from_field=None):
+        queryset = self.get_queryset(request).using(
+            self.object_shard(request, object_id)
+        )
+        model = queryset.model
+        field = (
+            model._meta.pk if from_field is None else model._meta.get_field(from_field)
+        )
+        try:
+            return queryset.get(**{field.name: field.to_python(object_id)})
+        except (model.DoesNotExist, ValidationError, ValueError):
+            return None
+
+
+class ReadOnlyAdmin(ScalableAdmin):
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class QuantityActionForm(admin.helpers.ActionForm):
+    quantity = forms.IntegerField(required=False)
+
+
+@admin.register(ExtendedUser)
+class ExtendedUserAdmin(UserAdmin):
+    fieldsets = UserAdmin.fieldsets + (
+        (
+            "Organisation",
+            {
+                "fields": (
+                    "address",
+                    "phone_number",
+                    "factories",
+                    "sale_points",
+                    "carriers",
+                )
+            },
+        ),
+    )
+    autocomplete_fields = ("factories", "sale_points", "carriers")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(ProductCategory)
+class ProductCategoryAdmin(ScalableAdmin):
+    list_display = ("id", "name")
+    search_fields = ("name",)
+
+
+@admin.register(Product)
+class ProductAdmin(ScalableAdmin):
+    list_display = ("id", "name", "category", "price", "weight")
+    list_select_related = ("category",)
+    autocomplete_fields = ("category",)
+    search_fields = ("name",)
+
+
+@admin.register(Factory)
+class FactoryAdmin(ScalableAdmin):
+    list_display = ("id", "name", "address")
+    autocomplete_fields = ("products",)
+    search_fields = ("name",)
+
+
+@admin.register(SalePoint)
+class SalePointAdmin(ScalableAdmin):
+    list_display = ("id", "name", "address")
+    search_fields = ("name",)
+
+
+@admin.register(Carrier)
+class CarrierAdmin(ScalableAdmin):
+    list_display = ("id", "name")
+    search_fields = ("name",)
+
+
+@admin.register(Delivery)
+class DeliveryAdmin(ScalableAdmin):
+    list_display = ("id", "carrier", "cost")
+    list_select_related = ("carrier",)
+    autocomplete_fields = ("carrier",)
+    search_fields = ("=id", "carrier__name")
+
+
+@admin.register(FactoryWarehouse)
+class FactoryWarehouseAdmin(ScalableAdmin):
+    list_display = ("id", "factory", "product", "quantity")
+    list_select_related = ("factory", "product")
+    list_filter = ("factory",)
+    autocomplete_fields = ("factory", "product")
+    search_fields = ("=product__id", "product__name")
+    action_form = QuantityActionForm
+    actions = ("add_quantity", "set_quantity")
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            previous = 0
+            if change:
+                previous = (
+                    FactoryWarehouse.objects.select_for_update()
+                    .values_list("quantity", flat=True)
+                    .get(pk=obj.pk)
+                )
+            super().save_model(request, obj, form, change)
+            if obj.quantity != previous:
+                StockMovement.record(
+                    obj.factory_id,
+                    obj.product_id,
+                    "adjustment" if change else "restock",
+                    obj.quantity - previous,
+                )
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            if obj.quantity:
+                StockMovement.record(
+                    obj.factory_id, obj.product_id, "adjustment", -obj.quantity
+                )
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            self.adjust(queryset, "0")
+            super().delete_queryset(request, queryset)
+
+    def adjust(self, queryset, new_quantity, params=()):
+        # One statement updates the selected rows and writes the ledger entries
+        # for them. The rows are locked first, in the order reservations lock
+        # them, so the deltas are taken against their latest quantities.
+        sql, select_params = queryset.values("id").order_by().query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH old AS (
+                    SELECT id, quantity
+                    FROM core_factorywarehouse
+                    WHERE id IN ({sql})
+                    ORDER BY product_id, factory_id
+                    FOR UPDATE
+                ), changed AS (
+                    UPDATE core_factorywarehouse w
+                    SET quantity = {new_quantity}
+                    FROM old
+                    WHERE old.id = w.id
+                    RETURNING w.factory_id, w.product_id,
+                              w.quantity - old.quantity AS delta
+                )
+                INSERT INTO core_stockmovement
+                    (factory_id, product_id, kind, delta, created_at)
+                SELECT factory_id, product_id, 'adjustment', delta, now()
+                FROM changed
+                WHERE delta <> 0
+                RETURNING factory_id, product_id
+                """,
+                [*select_params, *params],
+            )
+            touched = cursor.fetchall()
+        for factory_id, product_id in touched:
+            stock_changed(factory_id, product_id)
+        return len(touched)
+
+    def quantity_from(self, request):
+        field = self.action_form.base_fields["quantity"]
+        try:
+            quantity = field.clean(request.POST.get("quantity"))
+        except forms.ValidationError:
+            quantity = None
+        if quantity is None:
+            self.message_user(request, "Enter a quantity.", messages.ERROR)
+        return quantity
+
+    @admin.action(description="Add quantity to selected stock rows")
+    def add_quantity(self, request, queryset):
+        quantity = self.quantity_from(request)
+        if quantity is not None:
+            count = self.adjust(queryset, "greatest(w.quantity + %s, 0)", [quantity])
+            self.message_user(request, f"Adjusted {count} stock rows.")
+
+    @admin.action(description="Set quantity of selected stock rows")
+    def set_quantity(self, request, queryset):
+        quantity = self.quantity_from(request)
+        if quantity is not None:
+            count = self.adjust(queryset, "greatest(%s, 0)", [quantity])
+            self.message_user(request, f"Adjusted {count} stock rows.")
+
+
+@admin.register(ProductOrder)
+class ProductOrderAdmin(ShardedAdmin):
+    list_display = (
+        "id",
+        "order_date",
+        "status",
+        "sale_point",
+        "product",
+        "factory",
+        "quantity",
+    )
+    list_select_related = ("sale_point", "product", "factory")
+    list_filter = ("status",)
+    autocomplete_fields = ("sale_point", "product", "factory", "deliveries")
+    search_fields = ("=id",)
+    readonly_fields = ("order_date",)
+    ordering = ("-id",)
+    actions = ("mark_in_processing", "mark_delivery", "mark_delivered")
+
+    def object_shard(self, request, object_id):
+        return sharding.order_shard(object_id)
+
+    def set_status(self, request, queryset, status):
+        count = queryset.exclude(status=status).update(status=status)
+        self.message_user(request, f"Updated {count} orders.")
+
+    @admin.action(description="Mark selected orders as in processing")
+    def mark_in_processing(self, request, queryset):
+        self.set_status(request, queryset, "in_processing")
+
+    @admin.action(description="Mark selected orders as in delivery")
+    def mark_delivery(self, request, queryset):
+        self.set_status(request, queryset, "delivery")
+
+    @admin.action(description="Mark selected orders as delivered")
+    def mark_delivered(self, request, queryset):
+        self.set_status(request, queryset, "delivered")
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(ReadOnlyAdmin):
+    list_display = (
+        "id",
+        "created_at",
+        "factory",
+        "product",
+        "kind",
+        "delta",
+        "order_id",
+    )
+    list_select_related = ("factory", "product")
+    list_filter = ("kind", "factory")
+    search_fields = ("=product__id", "=order__id")
+    ordering = ("-id",)
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(ReadOnlyAdmin):
+    list_display = ("id", "taken_at", "factory", "product", "quantity")
+    list_select_related = ("factory", "product")
+    list_filter = ("factory",)
+    ordering = ("-id",)
+
+
+@admin.register(ReorderThreshold)
+class ReorderThresholdAdmin(ScalableAdmin):
+    list_display = (
+        "id",
+        "factory",
+        "product",
+        "threshold",
+        "reorder_quantity",
+        "alerted",
+    )
+    list_select_related = ("factory", "product")
+    list_filter = ("alerted", "factory")
+    autocomplete_fields = ("factory", "product")
+    readonly_fields = ("alerted",)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        stock_changed(obj.factory_id, obj.product_id)
+
+
+@admin.register(StockAlert)
+class StockAlertAdmin(ReadOnlyAdmin):
+    list_display = ("id", "created_at", "factory", "product", "kind", "quantity")
+    list_select_related = ("factory", "product")
+    list_filter = ("kind", "factory")
+    ordering = ("-id",)
+
+
+@admin.register(DemandForecast)
+class DemandForecastAdmin(ReadOnlyAdmin):
+    list_display = (
+        "id",
+        "product",
+        "factory",
+        "sale_point",
+        "total",
+        "safety_stock",
+        "reorder_point",
+    )
+    list_select_related = ("product", "factory", "sale_point")
+    list_filter = ("factory",)
+    ordering = ("id",)
+
+
+@admin.register(DailySalesRollup)
+class DailySalesRollupAdmin(ReadOnlyAdmin, ShardedAdmin):
+    list_display = ("day", "sale_point", "product", "factory", "status", "orders")
+    list_select_related = ("sale_point", "product", "factory")
+    list_filter = ("status",)
+    ordering = ("-day",)
+
 
-admin.site.register(ExtendedUser, UserAdmin)
+@admin.register(HourlySalesRollup)
+class HourlySalesRollupAdmin(ReadOnlyAdmin, ShardedAdmin):
+    list_display = ("hour", "sale_point", "product", "factory", "status", "orders")
+    list_select_related = ("sale_point", "product", "factory")
+    list_filter = ("status",)
+    ordering = ("-hour",)
@@ -0,0 +1,107 @@
+import logging
+import threading
+import weakref
+
+from django.db import transaction
+from django.db.models import Sum
+
+from core.models import FactoryWarehouse, ReorderThreshold, StockAlert
+
+logger = logging.getLogger(__name__)
+
+_pending = threading.local()
+
+
+def stock_changed(factory_id, product_id):
+    stocks_changed([(factory_id, product_id)])
+
+
+class PendingCheck:
+    # The on_commit callback of a transaction with the (factory, product)
+    # pairs written in it
+    def __init__(self):
+        self.pairs = set()
+        self.done = False
+
+    def __call__(self):
+        self.done = True
+        check_stock(self.pairs)
+
+
+def stocks_changed(pairs):
+    # Collects the pairs written in the current transaction and checks them
+    # all at once after commit, so the check does not hold the warehouse locks
+    # any longer. The thread only keeps a weak reference to the pending check:
+    # Django drops the callbacks of a transaction or savepoint that rolls
+    # back, and the pairs go away with them.
+    pending = _pending.check() if hasattr(_pending, "check") else None
+    if pending is None or pending.done:
+        pending = PendingCheck()
+        _pending.check = weakref.ref(pending)
+        pending.pairs.update(pairs)
+        transaction.on_commit(pending, robust=True)
+        return
+    pending.pairs.update(pairs)
+
+
+def check_stock(pairs):
+    # Evaluates only the given (factory, product) pairs, with two indexed
+    # queries, and returns the alerts that were raised
+    pairs = set(pairs)
+    factory_ids = {factory_id for factory_id, _ in pairs}
+    product_ids = {product_id for _, product_id in pairs}
+
+    with transaction.atomic():
+        # Row locks serialize concurrent checks of the same pair
+        thresholds = [
+            threshold
+            for threshold in ReorderThreshold.objects.select_for_update()
+            .filter(factory_id__in=factory_ids, product_id__in=product_ids)
+            .order_by("id")
+            if (threshold.factory_id, threshold.product_id) in pairs
+        ]
+        if not thresholds:
+            return []
+
+        stock = {
+            (row["factory_id"], row["product_id"]): row["quantity"]
+            for row in FactoryWarehouse.objects.filter(
+                factory_id__in=factory_ids, product_id__in=product_ids
+            )
+            .values("factory_id", "product_id")
+            .annotate(quantity=Sum("quantity"))
+        }
+
+        alerts = []
+        changed = []
+        for threshold in thresholds:
+            quantity = stock.get((threshold.factory_id, threshold.product_id), 0)
+            low = quantity <= threshold.threshold
+            if low == threshold.alerted:
+                continue
+            threshold.alerted = low
+            changed.append(threshold)
+            alerts.append(
+                StockAlert(
+                    factory_id=threshold.factory_id,
+                    product_id=threshold.product_id,
+                    kind="low_stock" if low else "restocked",
+                    quantity=quantity,
+                    threshold=threshold.threshold,
+                    reorder_quantity=threshold.reorder_quantity,
+                )
+            )
+
+        if alerts:
+            ReorderThreshold.objects.bulk_update(changed, ["alerted"])
+            StockAlert.objects.bulk_create(alerts)
+
+    for alert in alerts:
+        logger.info(
+            "Stock alert %s: product %s at factory %s, quantity %s",
+            alert.kind,
+            alert.product_id,
+            alert.factory_id,
+            alert.quantity,
+        )
+    return alerts
@@ -1,6 +1,24 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, pre_delete
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from core.querylog import install
+        from core.sharding import (
+            delete_shard_references,
+            reserve_id_block,
+            shard_relations,
+        )
+
+        post_migrate.connect(reserve_id_block, sender=self)
+        connection_created.connect(install)
+        # Only for the models orders refer to: a receiver keeps Django from
+        # deleting rows of its sender without loading them
+        for model in self.get_models():
+            if shard_relations(model):
+                pre_delete.connect(delete_shard_references, sender=model)
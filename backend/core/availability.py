@@ -0,0 +1,251 @@
+import logging
+import os
+import select
+import threading
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import Sum
+
+from core.models import FactoryWarehouse, Product
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "core_stock"
+
+LOAD_SQL = """
+SELECT product_id, factory_id, sum(quantity)
+FROM core_factorywarehouse
+WHERE quantity > 0 {condition}
+GROUP BY 1, 2
+"""
+
+
+class AvailabilityIndex:
+    # Per-process map of product id -> (total quantity, {factory id: quantity}),
+    # loaded once and then refreshed per product from the notifications sent by
+    # the triggers on core_factorywarehouse (migration 0018). A background
+    # thread holds its own connection for LISTEN; lookups are dictionary reads.
+    def __init__(self, using="default"):
+        self.using = using
+        self.products = {}
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+        self.thread = None
+        self.pid = None
+
+    def start(self):
+        self.stopping.clear()
+        self.pid = os.getpid()
+        self.thread = threading.Thread(
+            target=self.run, name="availability-index", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def alive(self):
+        # Threads do not survive a fork, e.g. gunicorn workers forked after
+        # the application was preloaded
+        return self.pid == os.getpid() and self.thread is not None
+
+    def lookup(self, product_id):
+        if not self.ready.is_set():
+            return None
+        return self.products.get(product_id, (0, {}))
+
+    def connect(self):
+        wrapper = connections[self.using]
+        conn = wrapper.get_new_connection(wrapper.get_connection_params())
+        conn.autocommit = True
+        return conn
+
+    def run(self):
+        while not self.stopping.is_set():
+            conn = None
+            try:
+                conn = self.connect()
+                with conn.cursor() as cursor:
+                    # Listen before the full load, so no change is missed
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                self.load(conn)
+                self.ready.set()
+                self.listen(conn)
+            except Exception:
+                logger.exception("Availability index lost its connection")
+            finally:
+                self.ready.clear()
+                if conn is not None:
+                    conn.close()
+            self.stopping.wait(settings.AVAILABILITY_RECONNECT_DELAY)
+
+    def listen(self, conn):
+        while not self.stopping.is_set():
+            if select.select([conn], [], [], 1) == ([], [], []):
+                continue
+            conn.poll()
+            payloads = {notify.payload for notify in conn.notifies}
+            conn.notifies.clear()
+            if "*" in payloads:
+                self.load(conn)
+            elif payloads:
+                self.load(conn, {int(payload) for payload in payloads})
+
+    def load(self, conn, product_ids=None):
+        with conn.cursor() as cursor:
+            if product_ids is None:
+                cursor.execute(LOAD_SQL.format(condition=""))
+            else:
+                cursor.execute(
+                    LOAD_SQL.format(condition="AND product_id = ANY(%s)"),
+                    [list(product_ids)],
+                )
+            rows = cursor.fetchall()
+
+        factories = {}
+        for product_id, factory_id, quantity in rows:
+            factories.setdefault(product_id, {})[factory_id] = int(quantity)
+        fresh = {
+            product_id: (sum(by_factory.values()), by_factory)
+            for product_id, by_factory in factories.items()
+        }
+
+        if product_ids is None:
+            self.products = fresh
+            return
+        for product_id in product_ids:
+            if product_id in fresh:
+                self.products[product_id] = fresh[product_id]
+            else:
+                self.products.pop(product_id, None)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if not settings.AVAILABILITY_INDEX:
+        return None
+    with _index_lock:
+        if _index is None:
+            _index = AvailabilityIndex()
+        if not _index.alive():
+            _index.start()
+        return _index
+
+
+def availability(product_id):
+    # (total, {factory id: quantity}) of a product for read-only checks. The
+    # index only knows committed data, so inside a transaction, or while the
+    # index is loading or reconnecting, the database is asked instead.
+    # Reservations always lock the warehouse row, see ProductOrder.create_order.
+    if not connection.in_atomic_block:
+        index = get_index()
+        if index is not None:
+            cached = index.lookup(product_id)
+            if cached is not None:
+                return cached
+
+    by_factory = dict(
+        FactoryWarehouse.objects.in_stock()
+        .filter(product_id=product_id)
+        .values("factory_id")
+        .annotate(quantity=Sum("quantity"))
+        .values_list("factory_id", "quantity")
+    )
+    return sum(by_factory.values()), by_factory
+
+
+def indexed_stock():
+    # (product id, factory id, quantity) of every in-stock warehouse row, in
+    # product and factory order, or None when the index cannot answer
+    if connection.in_atomic_block:
+        return None
+    index = get_index()
+    if index is None or not index.ready.is_set():
+        return None
+    products = dict(index.products)
+    return [
+        (product_id, factory_id, quantity)
+        for product_id, (_, by_factory) in sorted(products.items())
+        for factory_id, quantity in sorted(by_factory.items())
+    ]
+
+
+# Columns of indexed_stock() rows by values_list() source
+STOCK_COLUMNS = {"product_id": 0, "factory_id": 1, "quantity": 2}
+
+
+class IndexedStockRows:
+    # The rows FactoryWarehouse.values_list(*sources) would give for the
+    # in-stock rows, with the quantities from the index. Only the products of
+    # the rows taken are read, e.g. one page of them.
+    def __init__(self, sources, stock):
+        self.sources = sources
+        self.stock = stock
+
+    def __len__(self):
+        return len(self.stock)
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, key):
+        stock = self.stock[key]
+        if not isinstance(key, slice):
+            return self.rows([stock])[0]
+        return self.rows(stock)
+
+    def rows(self, stock):
+        fields = [
+            source.removeprefix("product__")
+            for source in self.sources
+            if source not in STOCK_COLUMNS
+        ]
+        products = {}
+        if fields:
+            products = {
+                row[0]: dict(zip(fields, row[1:]))
+                for row in Product.objects.filter(
+                    id__in={product_id for product_id, _, _ in stock}
+                ).values_list("id", *fields)
+            }
+            # Products deleted since the index was refreshed
+            stock = [row for row in stock if row[0] in products]
+        return [
+            tuple(
+                (
+                    row[STOCK_COLUMNS[source]]
+                    if source in STOCK_COLUMNS
+                    else products[row[0]][source.removeprefix("product__")]
+                )
+                for source in self.sources
+            )
+            for row in stock
+        ]
+
+
+def in_stock_rows(serializer):
+    # The product catalog: rows of a ProductsWithQuantityRowSerializer for the
+    # in-stock warehouse rows, which are unique per product and factory. The
+    # quantities come from the index like availability() does, from the
+    # database otherwise.
+    stock = indexed_stock()
+    if stock is None:
+        return serializer.values(
+            FactoryWarehouse.objects.in_stock().order_by("product_id", "factory_id")
+        )
+    return IndexedStockRows(serializer.sources, stock)
+
+
+def can_reserve(product_id, quantity):
+    # A reservation takes the whole quantity from one warehouse row, so at
+    # least one factory must hold it
+    _, by_factory = availability(product_id)
+    return max(by_factory.values(), default=0) >= quantity
@@ -0,0 +1,153 @@
+from django.urls import reverse
+from rest_framework.settings import api_settings
+
+from core import sharding
+from core.availability import in_stock_rows
+from core.models import (
+    Factory,
+    FactoryWarehouse,
+    Product,
+    ProductCategory,
+    ProductOrder,
+    SalePoint,
+)
+from core.serializers import (
+    FactoryRowSerializer,
+    FactoryWarehouseRowSerializer,
+    ProductCategoryRowSerializer,
+    ProductOrderRowSerializer,
+    ProductRowSerializer,
+    ProductsWithQuantityRowSerializer,
+    SalePointRowSerializer,
+)
+
+# Everything a role's page loads on start, in one response. Lists are the
+# first page of their list endpoint with the link to the next one, and the
+# rows a list refers to are loaded in batches, so the number of queries does
+# not depend on the number of rows.
+
+
+class Loader:
+    # DataLoader-style: rows are loaded by primary key with one query per
+    # batch of ids and kept for the rest of the response, so the rows that a
+    # list refers to cost one query per model however long the list is
+    def __init__(self, queryset, rows):
+        self.queryset = queryset
+        self.rows = rows
+        self.loaded = {}
+
+    def load_many(self, ids):
+        ids = [id for id in dict.fromkeys(ids) if id is not None]
+        missing = [id for id in ids if id not in self.loaded]
+        if missing:
+            self.loaded.update(dict.fromkeys(missing))
+            build = self.rows.build
+            for row in self.queryset.filter(pk__in=missing).values_list(
+                "pk", *self.rows.sources
+            ):
+                self.loaded[row[0]] = build(row[1:])
+        return [self.loaded[id] for id in ids if self.loaded[id] is not None]
+
+
+def ids(values):
+    return sorted(set(values) - {None})
+
+
+def user_info(user):
+    return {
+        "username": user.username,
+        "email": user.email,
+        "role": user.role,
+        "groups": user.groups_list,
+    }
+
+
+def first_page(request, rows, queryset, url_name):
+    size = api_settings.PAGE_SIZE
+    found = list(queryset[: size + 1])
+    next_url = None
+    if len(found) > size:
+        next_url = request.build_absolute_uri(f"{reverse(url_name)}?page=2")
+    return {"results": rows.to_representation(found[:size]), "next": next_url}
+
+
+def categories(request):
+    rows = ProductCategoryRowSerializer()
+    queryset = rows.values(ProductCategory.objects.order_by("name"))
+    return first_page(request, rows, queryset, "productcategory-list")
+
+
+def factory_page(request, factory):
+    products = ProductRowSerializer()
+    counts = FactoryWarehouseRowSerializer()
+    return {
+        "user": user_info(request.user),
+        "factory": {"id": factory.id, "name": factory.name, "address": factory.address},
+        "categories": categories(request),
+        "products": first_page(
+            request,
+            products,
+            products.values(Product.objects.order_by("name")),
+            "product-list",
+        ),
+        "product_counts": counts.to_representation(
+            counts.values(
+                FactoryWarehouse.objects.in_stock()
+                .filter(factory=factory)
+                .order_by("product_id")
+            )
+        ),
+    }
+
+
+def sale_point_page(request, sale_points):
+    rows = ProductsWithQuantityRowSerializer()
+    sale_point_rows = SalePointRowSerializer()
+    return {
+        "user": user_info(request.user),
+        "sale_points": sale_point_rows.to_representation(
+            sale_point_rows.values(sale_points)
+        ),
+        "categories": categories(request),
+        "products_with_quantity": first_page(
+            request,
+            rows,
+            in_stock_rows(rows),
+            "products-with-quantity-list",
+        ),
+    }
+
+
+def carrier_page(request):
+    # The first page of orders, then only the products, factories, sale
+    # points and categories they refer to
+    rows = ProductOrderRowSerializer()
+    ordering = ["order_date", "id"]
+    querysets = {
+        alias: ProductOrder.objects.using(alias).order_by(*ordering)
+        for alias in sharding.shards()
+    }
+    if len(querysets) == 1:
+        queryset = rows.values(*querysets.values())
+    else:
+        queryset = sharding.Scatter(querysets, rows.sources, ordering)
+    orders = first_page(request, rows, queryset, "productorder-list")
+
+    results = orders["results"]
+    products = Loader(Product.objects.all(), ProductRowSerializer()).load_many(
+        ids(order["product_id"] for order in results)
+    )
+    return {
+        "user": user_info(request.user),
+        "orders": orders,
+        "products": products,
+        "categories": Loader(
+            ProductCategory.objects.all(), ProductCategoryRowSerializer()
+        ).load_many(ids(row["category_id"] for row in products)),
+        "factories": Loader(Factory.objects.all(), FactoryRowSerializer()).load_many(
+            ids(order["factory_id"] for order in results)
+        ),
+        "sale_points": Loader(
+            SalePoint.objects.all(), SalePointRowSerializer()
+        ).load_many(ids(order["sale_point_id"] for order in results)),
+    }
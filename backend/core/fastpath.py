@@ -0,0 +1,99 @@
+from operator import itemgetter
+
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+
+def datetime_to_representation(value):
+    # Same output as rest_framework.fields.DateTimeField with ISO 8601 format
+    if not value:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def decimal_to_representation(value):
+    # Same output as rest_framework.fields.DecimalField coerced to string
+    if value is None:
+        return None
+    return "{:f}".format(value)
+
+
+class Field:
+    def __init__(self, source, convert=None):
+        self.source = source
+        self.convert = convert
+
+
+class RowSerializer:
+    # Read-only list serialization straight from .values_list() rows. `fields`
+    # maps output names to a Field, or to a dict of Fields for nested objects.
+    # Every distinct ?fields= selection is compiled once into nested functions
+    # that build the output dict from a row tuple.
+    fields = {}
+
+    def __init__(self, fields=None):
+        selected = self.parse_fields(fields)
+        cls = type(self)
+        if "_compiled" not in cls.__dict__:
+            cls._compiled = {}
+        if selected not in cls._compiled:
+            cls._compiled[selected] = self.compile(selected)
+        self.sources, self.build = cls._compiled[selected]
+
+    @classmethod
+    def parse_fields(cls, fields):
+        if not fields:
+            return None
+
+        selected = []
+        for name in fields.split(","):
+            path = tuple(part for part in name.strip().split(".") if part)
+            node = cls.fields
+            for part in path:
+                if not isinstance(node, dict) or part not in node:
+                    raise ValidationError({"fields": f"Unknown field '{name}'."})
+                node = node[part]
+            if path:
+                selected.append(path)
+        return tuple(sorted(set(selected))) or None
+
+    @classmethod
+    def compile(cls, selected):
+        sources = []
+
+        def is_selected(path):
+            return selected is None or any(
+                path[: len(chosen)] == chosen or chosen[: len(path)] == path
+                for chosen in selected
+            )
+
+        def column(index, convert):
+            get = itemgetter(index)
+            if convert is None:
+                return get
+            return lambda row: convert(get(row))
+
+        def build(node, prefix):
+            getters = []
+            for name, field in node.items():
+                path = prefix + (name,)
+                if not is_selected(path):
+                    continue
+                if isinstance(field, dict):
+                    getters.append((name, build(field, path)))
+                else:
+                    getters.append((name, column(len(sources), field.convert)))
+                    sources.append(field.source)
+            return lambda row: {name: get(row) for name, get in getters}
+
+        return sources, build(cls.fields, ())
+
+    def values(self, queryset):
+        return queryset.values_list(*self.sources)
+
+    def to_representation(self, rows):
+        build = self.build
+        return [build(row) for row in rows]
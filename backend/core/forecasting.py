@@ -0,0 +1,151 @@
+import datetime
+import math
+from statistics import NormalDist
+
+import numpy as np
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from core import sharding
+from core.models import DailySalesRollup, DemandForecast
+
+SEASON = 7
+PHI = 0.98
+
+# Smoothing parameters tried for every series, the combination with the
+# smallest one-step-ahead error is kept per series
+ALPHAS = (0.1, 0.3, 0.5)
+BETAS = (0.01, 0.1)
+GAMMAS = (0.05, 0.2)
+
+LOAD_SQL = """
+SELECT product_id, coalesce(factory_id, 0), sale_point_id, day - %s, sum(quantity)
+FROM {table}
+WHERE day >= %s AND day < %s
+GROUP BY 1, 2, 3, 4
+"""
+
+
+def load_history(start, days):
+    # Daily quantities per (product, factory, sale point) from the daily sales
+    # rollups. Returns the series keys (n x 3, factory 0 for orders without
+    # factory) and an n x days matrix.
+    chunks = []
+    # A sale point's series are all on its shard
+    for alias in sharding.shards():
+        with connections[alias].cursor() as cursor:
+            cursor.execute(
+                LOAD_SQL.format(table=DailySalesRollup._meta.db_table),
+                [start, start, start + datetime.timedelta(days=days)],
+            )
+            while rows := cursor.fetchmany(100000):
+                chunks.append(np.array(rows, dtype=np.int64))
+
+    if not chunks:
+        return np.empty((0, 3), dtype=np.int64), np.empty((0, days))
+    data = np.concatenate(chunks)
+    keys, index = np.unique(data[:, :3], axis=0, return_inverse=True)
+    history = np.zeros((len(keys), days))
+    np.add.at(history, (index.ravel(), data[:, 3]), data[:, 4])
+    return keys, history
+
+
+def smooth(history, alpha, beta, gamma):
+    # Additive Holt-Winters with damped trend in error-correction form, run for
+    # all series at once: one pass over the days on vectors of all series
+    days = history.shape[1]
+    level = history[:, :SEASON].mean(axis=1)
+    trend = (history[:, SEASON : 2 * SEASON].mean(axis=1) - level) / SEASON
+    seasonal = history[:, :SEASON] - level[:, None]
+    sse = np.zeros(len(history))
+
+    for day in range(SEASON, days):
+        position = day % SEASON
+        error = history[:, day] - (level + PHI * trend + seasonal[:, position])
+        sse += error * error
+        level = level + PHI * trend + alpha * error
+        trend = PHI * trend + alpha * beta * error
+        seasonal[:, position] += gamma * error
+
+    return level, trend, seasonal, sse / (days - SEASON)
+
+
+def fit(history):
+    best = None
+    for alpha in ALPHAS:
+        for beta in BETAS:
+            for gamma in GAMMAS:
+                result = smooth(history, alpha, beta, gamma)
+                if best is None:
+                    best = result
+                    continue
+                better = result[3] < best[3]
+                for current, candidate in zip(best, result):
+                    current[better] = candidate[better]
+    return best
+
+
+def forecast(history, horizon):
+    # Returns the daily forecasts (n x horizon) and the standard deviation of
+    # the one-step-ahead errors per series
+    level, trend, seasonal, mse = fit(history)
+    steps = np.arange(1, horizon + 1)
+    damping = np.cumsum(PHI**steps)
+    positions = (history.shape[1] + steps - 1) % SEASON
+    daily = level[:, None] + trend[:, None] * damping + seasonal[:, positions]
+    return np.maximum(daily, 0), np.sqrt(mse)
+
+
+def run_forecasts(
+    history_days=None, horizon=None, lead_time=None, service_level=None, today=None
+):
+    history_days = history_days or settings.FORECAST_HISTORY_DAYS
+    horizon = horizon or settings.FORECAST_HORIZON_DAYS
+    lead_time = lead_time or settings.FORECAST_LEAD_TIME_DAYS
+    service_level = service_level or settings.FORECAST_SERVICE_LEVEL
+    if history_days < 2 * SEASON:
+        raise ValueError(f"At least {2 * SEASON} days of history are needed.")
+    if not 0 < service_level < 1:
+        raise ValueError("The service level must be between 0 and 1.")
+
+    today = today or timezone.now().date()
+    keys, history = load_history(
+        today - datetime.timedelta(days=history_days), history_days
+    )
+    daily, sigma = forecast(history, horizon)
+
+    # Safety stock covers the forecast error over the replenishment lead time
+    z = NormalDist().inv_cdf(service_level)
+    safety_stock = z * sigma * math.sqrt(lead_time)
+    lead_time_demand = daily[:, :lead_time].sum(axis=1)
+    generated_at = timezone.now()
+
+    forecasts = [
+        DemandForecast(
+            product_id=int(product_id),
+            factory_id=int(factory_id) or None,
+            sale_point_id=int(sale_point_id),
+            generated_at=generated_at,
+            start=today,
+            daily=[round(value, 2) for value in row.tolist()],
+            total=float(row.sum()),
+            sigma=float(series_sigma),
+            lead_time_demand=float(series_demand),
+            safety_stock=float(series_safety),
+            reorder_point=float(series_demand + series_safety),
+        )
+        for (
+            product_id,
+            factory_id,
+            sale_point_id,
+        ), row, series_sigma, series_demand, series_safety in zip(
+            keys, daily, sigma, lead_time_demand, safety_stock
+        )
+    ]
+
+    # Only the latest run is kept
+    with transaction.atomic():
+        DemandForecast.objects.all().delete()
+        DemandForecast.objects.bulk_create(forecasts, batch_size=5000)
+    return len(forecasts)
@@ -0,0 +1,238 @@
+import copy
+import datetime
+import fcntl
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import weakref
+from collections import Counter
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+
+EXTRA_FIELDS = ["status_code", "method", "path", "duration", "sql"]
+
+_handlers = weakref.WeakSet()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.UTC
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    # Keeps only a fraction of the records below WARNING for the given logger
+    # prefixes, e.g. {"django.db.backends": 0.01}.
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = sorted((rates or {}).items(), key=lambda item: -len(item[0]))
+        self.cache = {}
+
+    def rate_for(self, name):
+        if name not in self.cache:
+            self.cache[name] = next(
+                (
+                    rate
+                    for prefix, rate in self.rates
+                    if name == prefix or name.startswith(prefix + ".")
+                ),
+                1.0,
+            )
+        return self.cache[name]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1 or random.random() < rate
+
+
+class SharedRollover:
+    # Lets processes forked from one server append to one file: the rollover
+    # is done by one process at a time under a lock file, and the others
+    # reopen the file once it has been moved, as WatchedFileHandler does. The
+    # backups stay at backup_count however many processes come and go.
+    file_id = None
+
+    def _open(self):
+        stream = super()._open()
+        stat = os.fstat(stream.fileno())
+        self.file_id = (stat.st_dev, stat.st_ino)
+        return stream
+
+    def moved(self):
+        try:
+            stat = os.stat(self.baseFilename)
+        except FileNotFoundError:
+            return True
+        return (stat.st_dev, stat.st_ino) != self.file_id
+
+    def reopen_if_moved(self):
+        if self.stream is not None and self.moved():
+            self.stream.close()
+            self.stream = self._open()
+
+    def shouldRollover(self, record):
+        self.reopen_if_moved()
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        with open(f"{self.baseFilename}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            if self.stream is None or not self.moved():
+                super().doRollover()
+                return
+            # Another process has just rotated the file
+            self.stream.close()
+            self.stream = self._open()
+            if hasattr(self, "rolloverAt"):
+                self.rolloverAt = self.computeRollover(int(time.time()))
+
+
+class SharedRotatingFileHandler(SharedRollover, RotatingFileHandler):
+    pass
+
+
+class SharedTimedRotatingFileHandler(SharedRollover, TimedRotatingFileHandler):
+    pass
+
+
+class AsyncFileHandler(QueueHandler):
+    # Puts records on a bounded queue and writes them as JSON lines from a
+    # background thread. Records are dropped and counted when the queue is full,
+    # so logging never blocks the calling thread. A filename of "-" writes to
+    # stdout.
+    def __init__(
+        self, filename, max_bytes=0, backup_count=5, when=None, queue_size=10000
+    ):
+        super().__init__(queue.Queue(queue_size))
+        self.filename = filename
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.when = when
+        self.dropped = Counter()
+        self.dropped_lock = threading.Lock()
+        self.unreported = 0
+        self.start()
+        _handlers.add(self)
+
+    def start(self):
+        filename = self.filename
+        if filename == "-":
+            self.target = logging.StreamHandler(sys.stdout)
+        elif self.when:
+            self.target = SharedTimedRotatingFileHandler(
+                filename, when=self.when, backupCount=self.backup_count, delay=True
+            )
+        else:
+            self.target = SharedRotatingFileHandler(
+                filename,
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                delay=True,
+            )
+        self.target.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+
+    def after_fork(self):
+        # The writer thread does not survive a fork, e.g. gunicorn workers
+        # forked after the application was preloaded, and the queue may have
+        # been locked by it. The child gets its own queue and thread, writing
+        # to the same file as the parent.
+        if self.listener is None:
+            return
+        self.target.close()
+        self.queue = queue.Queue(self.queue.maxsize)
+        self.dropped = Counter()
+        self.dropped_lock = threading.Lock()
+        self.unreported = 0
+        self.start()
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        # django.request records carry the request, which must not be shared
+        # with the writer thread
+        request = record.__dict__.pop("request", None)
+        if request is not None:
+            record.method = request.method
+            record.path = request.path
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped[record.name] += 1
+                self.unreported += 1
+            return
+        if self.unreported:
+            self.report_dropped()
+
+    def report_dropped(self):
+        with self.dropped_lock:
+            count, self.unreported = self.unreported, 0
+        record = logging.makeLogRecord(
+            {
+                "name": __name__,
+                "levelno": logging.WARNING,
+                "levelname": "WARNING",
+                "msg": f"Dropped {count} log records, the log queue was full",
+            }
+        )
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.dropped_lock:
+                self.unreported += count
+
+    def close(self):
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+            self.target.close()
+        super().close()
+
+
+def _after_fork():
+    for handler in list(_handlers):
+        handler.after_fork()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def dropped_records():
+    total = Counter()
+    for handler in list(_handlers):
+        with handler.dropped_lock:
+            total.update(handler.dropped)
+    return dict(total)
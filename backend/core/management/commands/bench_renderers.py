@@ -0,0 +1,81 @@
+import io
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import resolve, reverse
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core.parsers import MessagePackParser, ORJSONParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+ENDPOINTS = [
+    "productorder-list",
+    "products-with-quantity-list",
+    "factorywarehouse-product-counts",
+]
+
+FORMATS = [
+    ("json", JSONRenderer(), JSONParser()),
+    ("orjson", ORJSONRenderer(), ORJSONParser()),
+    ("msgpack", MessagePackRenderer(), MessagePackParser()),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare render and parse times and payload sizes of the JSON, orjson "
+        "and MessagePack formats on the list endpoints."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--username")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        users = get_user_model().objects.order_by("id")
+        if options["username"]:
+            user = users.filter(username=options["username"]).first()
+        else:
+            user = users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("No user to run the requests as.")
+
+        host = next((host for host in settings.ALLOWED_HOSTS if host != "*"), None)
+        factory = APIRequestFactory(HTTP_HOST=host or "localhost")
+
+        for name in ENDPOINTS:
+            url = reverse(name)
+            request = factory.get(url)
+            force_authenticate(request, user=user)
+            response = resolve(url).func(request)
+            if response.status_code != 200:
+                self.stderr.write(f"{url}: status {response.status_code}")
+                continue
+
+            self.stdout.write(url)
+            for label, renderer, parser in FORMATS:
+                payload = renderer.render(response.data)
+                render_time = self.measure(
+                    lambda: renderer.render(response.data), options["repeat"]
+                )
+                parse_time = self.measure(
+                    lambda: parser.parse(io.BytesIO(payload)), options["repeat"]
+                )
+                self.stdout.write(
+                    f"  {label:<8} {len(payload):>10} bytes  "
+                    f"render {render_time * 1000:8.2f} ms  "
+                    f"parse {parse_time * 1000:8.2f} ms"
+                )
+
+    def measure(self, func, repeat):
+        best = None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from core.stock import compact_warehouse
+
+
+class Command(BaseCommand):
+    help = "Delete factory warehouse rows at zero quantity in small batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause", type=float, default=0, help="Seconds to sleep between batches"
+        )
+
+    def handle(self, *args, **options):
+        deleted = compact_warehouse(options["batch_size"], options["pause"])
+        self.stdout.write(f"Deleted {deleted} empty warehouse rows")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.forecasting import run_forecasts
+
+
+class Command(BaseCommand):
+    help = (
+        "Forecast daily demand per product, factory and sale point from the daily "
+        "sales rollups and store forecasts with safety stock suggestions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--history-days", type=int)
+        parser.add_argument("--horizon", type=int)
+        parser.add_argument("--lead-time", type=int)
+        parser.add_argument("--service-level", type=float)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        try:
+            count = run_forecasts(
+                history_days=options["history_days"],
+                horizon=options["horizon"],
+                lead_time=options["lead_time"],
+                service_level=options["service_level"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(
+            f"Forecast {count} series in {time.monotonic() - started:.1f}s"
+        )
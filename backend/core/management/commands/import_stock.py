@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Factory
+from core.stock_import import MODES, StockImportError, import_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Import warehouse counts of a factory from a CSV file with product and "
+        "quantity columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("factory", type=int, help="Factory id")
+        parser.add_argument("path", help="CSV file")
+        parser.add_argument(
+            "--mode",
+            choices=list(MODES),
+            default="set",
+            help="Replace the counts (set) or add them to the current ones (add).",
+        )
+
+    def handle(self, *args, **options):
+        if not Factory.objects.filter(id=options["factory"]).exists():
+            raise CommandError(f"Factory {options['factory']} does not exist.")
+
+        with open(options["path"], "rb") as stream:
+            try:
+                result = import_stock(options["factory"], stream, options["mode"])
+            except StockImportError as exc:
+                for error in exc.errors:
+                    line = f"Line {error['line']}: " if "line" in error else ""
+                    self.stderr.write(f"{line}{error['error']}")
+                raise CommandError("Nothing was imported.")
+
+        self.stdout.write(
+            "Imported {rows} lines: {created} created, {updated} updated, "
+            "{unchanged} unchanged".format(**result)
+        )
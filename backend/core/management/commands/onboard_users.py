@@ -0,0 +1,48 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.onboarding import UsernameConflict, create_users, read_csv, validate_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users in bulk from a CSV or JSON file with username, email, role, "
+        "entity_id and optionally password. Generated passwords are printed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["csv", "json"])
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or ("json" if path.endswith(".json") else "csv")
+        with open(path, encoding="utf-8-sig") as source:
+            if file_format == "json":
+                rows = json.load(source)
+            else:
+                rows = read_csv(source.read())
+
+        if not isinstance(rows, list) or not rows:
+            raise CommandError("The file contains no users.")
+
+        rows, errors = validate_rows(rows)
+        if not errors:
+            try:
+                users = create_users(rows)
+            except UsernameConflict as exc:
+                errors = exc.errors
+        if errors:
+            for index, row_errors in sorted(errors.items()):
+                self.stderr.write(f"Row {index + 1}: {row_errors}")
+            raise CommandError(f"{len(errors)} invalid rows, no users were created.")
+
+        generated = [row for row in rows if "generated_password" in row]
+        if generated:
+            writer = csv.writer(self.stdout)
+            writer.writerow(["username", "password"])
+            for row in generated:
+                writer.writerow([row["username"], row["generated_password"]])
+        self.stderr.write(f"Created {len(users)} users.")
@@ -0,0 +1,78 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import sharding
+from core.partitions import (
+    add_months,
+    archive_partitions,
+    ensure_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly partitions of the product order table and "
+        "archive old partitions that only contain delivered orders."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead", type=int, default=settings.ORDER_PARTITION_MONTHS_AHEAD
+        )
+        parser.add_argument(
+            "--archive-after-months",
+            type=int,
+            default=settings.ORDER_ARCHIVE_AFTER_MONTHS,
+            help="Archive partitions older than this many months (0 disables).",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=settings.ORDER_ARCHIVE_DIR,
+            help="Dump archived partitions as gzipped CSV here and drop them.",
+        )
+        parser.add_argument(
+            "--tablespace",
+            default=settings.ORDER_ARCHIVE_TABLESPACE,
+            help="Move detached partitions to this tablespace.",
+        )
+
+    def handle(self, *args, **options):
+        for alias in sharding.shards():
+            self.maintain(alias, options)
+
+    def maintain(self, alias, options):
+        prefix = f"{alias}: " if len(sharding.shards()) > 1 else ""
+        for name in ensure_partitions(
+            "core_productorder",
+            "order_date",
+            months_ahead=options["months_ahead"],
+            using=alias,
+        ):
+            self.stdout.write(f"{prefix}Created partition {name}")
+
+        if options["archive_after_months"] <= 0:
+            return
+
+        before = add_months(
+            month_start(timezone.now()), -options["archive_after_months"]
+        )
+        archive_dir = options["archive_dir"] or None
+        if archive_dir and prefix:
+            # Every shard has partitions of the same names
+            archive_dir = os.path.join(archive_dir, alias)
+            os.makedirs(archive_dir, exist_ok=True)
+        archived = archive_partitions(
+            "core_productorder",
+            before,
+            keep_condition="status <> 'delivered'",
+            archive_dir=archive_dir,
+            tablespace=options["tablespace"] or None,
+            related=[("core_productorder_deliveries", "productorder_id")],
+            using=alias,
+        )
+        for name in archived:
+            self.stdout.write(f"{prefix}Archived partition {name}")
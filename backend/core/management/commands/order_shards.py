@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from core import sharding
+from core.models import ProductOrder, SalePointShard
+
+
+class Command(BaseCommand):
+    help = (
+        "Pin sale points that have orders in the default database but no shard "
+        "yet to the default database, then list the sale points and orders per "
+        "shard. Run it before adding the first shard to ORDER_SHARDS."
+    )
+
+    def handle(self, *args, **options):
+        placed = SalePointShard.objects.values_list("sale_point_id", flat=True)
+        unplaced = (
+            ProductOrder.objects.using("default")
+            .exclude(sale_point_id__in=list(placed))
+            .values_list("sale_point_id", flat=True)
+            .distinct()
+        )
+        pinned = SalePointShard.objects.bulk_create(
+            [
+                SalePointShard(sale_point_id=sale_point_id, database="default")
+                for sale_point_id in unplaced
+            ],
+            ignore_conflicts=True,
+        )
+        if pinned:
+            self.stdout.write(f"Pinned {len(pinned)} sale points to default")
+
+        sale_points = dict(
+            SalePointShard.objects.values_list("database").annotate(Count("pk"))
+        )
+        orders = sharding.gather(
+            lambda alias: ProductOrder.objects.using(alias).count()
+        )
+        for alias, count in zip(sharding.shards(), orders):
+            self.stdout.write(
+                f"{alias}: {sale_points.get(alias, 0)} sale points, {count} orders"
+            )
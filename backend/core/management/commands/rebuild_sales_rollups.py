@@ -0,0 +1,27 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute daily and hourly sales rollups from product orders. Orders of "
+        "archived partitions are no longer available, so pass --since to keep "
+        "their rollups."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="First day to rebuild (YYYY-MM-DD).")
+
+    def handle(self, *args, **options):
+        since = datetime.date.min
+        if options["since"]:
+            try:
+                since = datetime.date.fromisoformat(options["since"])
+            except ValueError:
+                raise CommandError("--since must be in YYYY-MM-DD format.")
+
+        rebuild_rollups(datetime.datetime.combine(since, datetime.time(), datetime.UTC))
+        self.stdout.write("Sales rollups rebuilt.")
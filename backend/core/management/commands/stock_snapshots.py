@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Factory
+from core.stock import reconcile, take_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Take a stock snapshot per factory from the stock movement ledger and "
+        "optionally compare the ledger against the factory warehouses."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--factory", type=int, action="append")
+        parser.add_argument("--reconcile", action="store_true")
+
+    def handle(self, *args, **options):
+        factories = Factory.objects.order_by("id")
+        if options["factory"]:
+            factories = factories.filter(id__in=options["factory"])
+
+        for factory_id in factories.values_list("id", flat=True):
+            taken_at = take_snapshot(factory_id)
+            self.stdout.write(f"Factory {factory_id}: snapshot at {taken_at}")
+
+            if options["reconcile"]:
+                for product_id, (ledger, actual) in reconcile(factory_id).items():
+                    self.stderr.write(
+                        f"Factory {factory_id}, product {product_id}: "
+                        f"ledger {ledger}, warehouse {actual}"
+                    )
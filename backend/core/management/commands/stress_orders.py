@@ -0,0 +1,238 @@
+import random
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Sum
+
+from core.models import (
+    Factory,
+    FactoryWarehouse,
+    Product,
+    ProductOrder,
+    SalePoint,
+    StockMovement,
+)
+from core.retry import ConflictRetriesExhausted, retry_stats
+from core.sharding import shard_for
+from core.stock import reconcile
+
+PREFIX = "Stress test"
+
+
+def _init_worker():
+    django.setup()
+
+
+def _percentile(values, percent):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def run_worker(seed, carts, cart_size, max_quantity, product_ids, sale_point_id):
+    # Reserves random carts with the products in random order, timing every
+    # cart and every row-locking statement, which is where lock waits show up
+    rng = random.Random(seed)
+    products = list(Product.objects.filter(id__in=product_ids))
+    sale_point = SalePoint.objects.get(id=sale_point_id)
+    lock_waits = []
+
+    def time_locks(execute, sql, params, many, context):
+        if "FOR UPDATE" not in sql:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            lock_waits.append(time.perf_counter() - start)
+
+    retries_before = retry_stats()
+    result = {"created": 0, "rejected": 0, "failed": 0, "latencies": []}
+    with connection.execute_wrapper(time_locks):
+        for _ in range(carts):
+            items = [
+                (product, rng.randint(1, max_quantity), sale_point)
+                for product in rng.sample(products, min(cart_size, len(products)))
+            ]
+            start = time.perf_counter()
+            try:
+                ProductOrder.create_orders(items)
+                result["created"] += len(items)
+            except ValidationError:
+                result["rejected"] += 1
+            except ConflictRetriesExhausted:
+                result["failed"] += 1
+            result["latencies"].append(time.perf_counter() - start)
+
+    result["lock_waits"] = lock_waits
+    # The pool may run several tasks in one process, so only this task's share
+    # of the process-wide counters is returned
+    result["retries"] = {
+        key: value - retries_before.get(key, 0) for key, value in retry_stats().items()
+    }
+    connection.close()
+    return result
+
+
+class Command(BaseCommand):
+    help = (
+        "Reserve random multi-product carts from several processes at once "
+        "against dedicated test rows, then check that no stock went negative "
+        "and that the ledger matches the warehouse. Writes to the configured "
+        "database; the test rows are removed afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--carts", type=int, default=200, help="Per worker")
+        parser.add_argument("--cart-size", type=int, default=3)
+        parser.add_argument("--max-quantity", type=int, default=5)
+        parser.add_argument("--products", type=int, default=5)
+        parser.add_argument("--factories", type=int, default=2)
+        parser.add_argument("--stock", type=int, default=500)
+        parser.add_argument("--keep", action="store_true")
+
+    def handle(self, *args, **options):
+        factories, products, sale_point = self.create_rows(options)
+        try:
+            initial = self.total(factories)
+            # Forked workers must not share the parent's connection
+            connections.close_all()
+            start = time.perf_counter()
+            with ProcessPoolExecutor(
+                options["workers"], initializer=_init_worker
+            ) as executor:
+                results = list(
+                    executor.map(
+                        run_worker,
+                        range(options["workers"]),
+                        [options["carts"]] * options["workers"],
+                        [options["cart_size"]] * options["workers"],
+                        [options["max_quantity"]] * options["workers"],
+                        [[product.id for product in products]] * options["workers"],
+                        [sale_point.id] * options["workers"],
+                    )
+                )
+            elapsed = time.perf_counter() - start
+            self.report(results, elapsed)
+            self.verify(factories, sale_point, initial)
+        finally:
+            if not options["keep"]:
+                self.delete_rows(factories, products, sale_point)
+
+    def create_rows(self, options):
+        factories = [
+            Factory.objects.create(name=f"{PREFIX} factory {index}", address="-")
+            for index in range(options["factories"])
+        ]
+        products = [
+            Product.objects.create(name=f"{PREFIX} product {index}", price=1, weight=1)
+            for index in range(options["products"])
+        ]
+        FactoryWarehouse.objects.bulk_create(
+            FactoryWarehouse(
+                factory=factory, product=product, quantity=options["stock"]
+            )
+            for factory in factories
+            for product in products
+        )
+        # Keeps the ledger in step with the rows created above
+        StockMovement.objects.bulk_create(
+            StockMovement(
+                factory=factory, product=product, kind="restock", delta=options["stock"]
+            )
+            for factory in factories
+            for product in products
+        )
+        sale_point = SalePoint.objects.create(name=f"{PREFIX} sale point", address="-")
+        return factories, products, sale_point
+
+    def delete_rows(self, factories, products, sale_point):
+        ProductOrder.objects.using(shard_for(sale_point.id)).filter(
+            sale_point=sale_point
+        ).delete()
+        sale_point.delete()
+        Factory.objects.filter(id__in=[factory.id for factory in factories]).delete()
+        Product.objects.filter(id__in=[product.id for product in products]).delete()
+
+    def total(self, factories):
+        return (
+            FactoryWarehouse.objects.filter(factory__in=factories).aggregate(
+                total=Sum("quantity")
+            )["total"]
+            or 0
+        )
+
+    def report(self, results, elapsed):
+        latencies = [value for result in results for value in result["latencies"]]
+        lock_waits = [value for result in results for value in result["lock_waits"]]
+        carts = len(latencies)
+        retries = {}
+        for result in results:
+            for key, value in result["retries"].items():
+                retries[key] = retries.get(key, 0) + value
+        retried = sum(
+            retries.get(reason, 0) for reason in ["deadlock", "serialization"]
+        )
+
+        self.stdout.write(
+            f"{carts} carts in {elapsed:.2f}s ({carts / elapsed:.0f}/s): "
+            f"{sum(result['created'] for result in results)} orders, "
+            f"{sum(result['rejected'] for result in results)} carts rejected for "
+            f"stock, {sum(result['failed'] for result in results)} failed"
+        )
+        self.stdout.write(
+            "Cart latency: mean {:.1f}ms, p95 {:.1f}ms, max {:.1f}ms".format(
+                statistics.fmean(latencies) * 1000 if latencies else 0,
+                _percentile(latencies, 95) * 1000,
+                max(latencies, default=0) * 1000,
+            )
+        )
+        self.stdout.write(
+            "Row lock statements: {}, mean {:.1f}ms, p95 {:.1f}ms, total {:.2f}s".format(
+                len(lock_waits),
+                statistics.fmean(lock_waits) * 1000 if lock_waits else 0,
+                _percentile(lock_waits, 95) * 1000,
+                sum(lock_waits),
+            )
+        )
+        self.stdout.write(
+            f"Retries: {retries} "
+            f"({retried / max(retries.get('transactions', 0), 1):.2%} of transactions)"
+        )
+
+    def verify(self, factories, sale_point, initial):
+        negative = FactoryWarehouse.objects.filter(
+            factory__in=factories, quantity__lt=0
+        ).count()
+        reserved = (
+            ProductOrder.objects.using(shard_for(sale_point.id))
+            .filter(sale_point=sale_point)
+            .aggregate(total=Sum("quantity"))["total"]
+            or 0
+        )
+        remaining = self.total(factories)
+        mismatched = {
+            factory.id: difference
+            for factory in factories
+            if (difference := reconcile(factory.id))
+        }
+
+        problems = []
+        if negative:
+            problems.append(f"{negative} warehouse rows went negative")
+        if initial - remaining != reserved:
+            problems.append(
+                f"stock fell by {initial - remaining} but orders reserve {reserved}"
+            )
+        if mismatched:
+            problems.append(f"ledger does not match the warehouse: {mismatched}")
+        if problems:
+            raise CommandError("; ".join(problems))
+        self.stdout.write(self.style.SUCCESS("Stock checks passed"))
@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.partitions import (
+    add_months,
+    archive_partitions,
+    ensure_partitions,
+    month_start,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Create upcoming monthly partitions of the delivery tracking table and "
+        "drop partitions past the retention period."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--months-ahead",
+            type=int,
+            default=settings.TRACKING_PARTITION_MONTHS_AHEAD,
+        )
+        parser.add_argument(
+            "--archive-after-months",
+            type=int,
+            default=settings.TRACKING_ARCHIVE_AFTER_MONTHS,
+            help="Drop partitions older than this many months (0 disables).",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=settings.TRACKING_ARCHIVE_DIR,
+            help="Dump partitions as gzipped CSV here before dropping them.",
+        )
+
+    def handle(self, *args, **options):
+        for name in ensure_partitions(
+            "core_trackingevent", "recorded_at", months_ahead=options["months_ahead"]
+        ):
+            self.stdout.write(f"Created partition {name}")
+
+        if options["archive_after_months"] <= 0:
+            return
+
+        before = add_months(
+            month_start(timezone.now()), -options["archive_after_months"]
+        )
+        archived = archive_partitions(
+            "core_trackingevent",
+            before,
+            archive_dir=options["archive_dir"] or None,
+            drop=True,
+        )
+        for name in archived:
+            self.stdout.write(f"Archived partition {name}")
@@ -0,0 +1,184 @@
+import zlib
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+re_accept_encoding = _lazy_re_compile(r"\s*([^\s;,]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?")
+
+# Payloads in these formats are already compressed
+COMPRESSED_CONTENT_TYPES = (
+    "image/",
+    "video/",
+    "audio/",
+    "font/woff",
+    "application/zip",
+    "application/gzip",
+    "application/x-gzip",
+    "application/zstd",
+    "application/x-bzip2",
+    "application/x-7z-compressed",
+    "application/pdf",
+)
+
+# Pages that carry CSRF tokens next to reflected input would leak the tokens
+# through their compressed length (BREACH), so they are sent as they are
+UNCOMPRESSED_CONTENT_TYPES = ("text/html",)
+
+
+class GzipCompressor:
+    def __init__(self, level):
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+class BrotliCompressor:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+class ZstdCompressor:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self.compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH)
+
+
+def available_compressors():
+    compressors = {}
+    if zstandard is not None:
+        compressors["zstd"] = ZstdCompressor
+    if brotli is not None:
+        compressors["br"] = BrotliCompressor
+    compressors["gzip"] = GzipCompressor
+    return compressors
+
+
+def choose_encoding(accept_encoding, encodings):
+    # Highest q-value wins, ties go to the first encoding in `encodings`
+    weights = {}
+    for name, quality in re_accept_encoding.findall(accept_encoding.lower()):
+        try:
+            weights[name] = float(quality) if quality else 1.0
+        except ValueError:
+            continue
+
+    best, best_weight = None, 0
+    for encoding in encodings:
+        weight = weights.get(encoding, weights.get("*", 0))
+        if weight > best_weight:
+            best, best_weight = encoding, weight
+    return best
+
+
+class CompressionMiddleware:
+    # Like django.middleware.gzip.GZipMiddleware, with zstd and brotli and
+    # configurable levels. Streaming responses are compressed chunk by chunk
+    # and flushed after every chunk, so clients still get data as it is produced.
+    def __init__(self, get_response):
+        self.get_response = get_response
+        compressors = available_compressors()
+        self.encodings = [
+            encoding
+            for encoding in settings.COMPRESSION_ENCODINGS
+            if encoding in compressors
+        ]
+        self.compressors = compressors
+        self.levels = settings.COMPRESSION_LEVELS
+        self.min_size = settings.COMPRESSION_MIN_SIZE
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+        content_type = response.get("Content-Type", "").lower()
+        if content_type.startswith(COMPRESSED_CONTENT_TYPES):
+            return response
+        if content_type.startswith(UNCOMPRESSED_CONTENT_TYPES):
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        encoding = choose_encoding(
+            request.META.get("HTTP_ACCEPT_ENCODING", ""), self.encodings
+        )
+        if encoding is None:
+            return response
+        compressor = self.compressors[encoding](self.levels.get(encoding))
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self.compress_async(
+                    compressor, response.streaming_content
+                )
+            else:
+                response.streaming_content = self.compress_sequence(
+                    compressor, response.streaming_content
+                )
+            del response.headers["Content-Length"]
+        else:
+            content = compressor.compress(response.content) + compressor.finish()
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers["Content-Length"] = str(len(content))
+
+        # The compressed body differs from the one the ETag was computed for
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def compress_sequence(self, compressor, sequence):
+        for chunk in sequence:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+
+    async def compress_async(self, compressor, sequence):
+        async for chunk in sequence:
+            data = compressor.compress(chunk) + compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
@@ -0,0 +1,103 @@
+from django.db import migrations, models
+
+from core.partitions import (
+    create_default_partition,
+    ensure_partitions,
+)
+
+TABLE = "core_productorder"
+
+
+def partition_productorder(apps, schema_editor):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+            """,
+            [TABLE],
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            """
+            SELECT indexname, indexdef
+            FROM pg_indexes
+            WHERE tablename = %s AND indexname <> %s
+            """,
+            [TABLE, f"{TABLE}_pkey"],
+        )
+        indexes = cursor.fetchall()
+        # A partitioned table cannot have a unique key on "id" alone, so the
+        # m2m table can no longer reference it with a foreign key.
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, conname
+            FROM pg_constraint
+            WHERE confrelid = %s::regclass AND contype = 'f'
+            """,
+            [TABLE],
+        )
+        for table, name in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE "{table}" DROP CONSTRAINT "{name}"')
+
+        cursor.execute("SELECT min(order_date) FROM core_productorder")
+        first_order_date = cursor.fetchone()[0]
+
+        cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_old")
+        cursor.execute(
+            f"CREATE TABLE {TABLE} "
+            f"(LIKE {TABLE}_old INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            f"PARTITION BY RANGE (order_date)"
+        )
+
+    ensure_partitions(
+        TABLE, "order_date", start=first_order_date, using=connection.alias
+    )
+    create_default_partition(TABLE, using=connection.alias)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {TABLE} SELECT * FROM {TABLE}_old")
+        cursor.execute(f"DROP TABLE {TABLE}_old")
+
+        cursor.execute(f"CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id")
+        cursor.execute(
+            f"SELECT setval('{TABLE}_id_seq', coalesce(max(id), 0) + 1, false) "
+            f"FROM {TABLE}"
+        )
+        cursor.execute(
+            f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')"
+        )
+        cursor.execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, order_date)")
+
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT "{name}" {definition}')
+        for name, definition in indexes:
+            cursor.execute(definition.replace(f"{TABLE}_old", TABLE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0012_productorder_delivery_cost"),
+    ]
+
+    operations = [
+        # The partition key must not change on every save, which would move
+        # updated orders into the current month's partition
+        migrations.AlterField(
+            model_name="productorder",
+            name="order_date",
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.RunPython(partition_productorder),
+        migrations.AddIndex(
+            model_name="productorder",
+            index=models.Index(
+                condition=models.Q(("status", "delivered"), _negated=True),
+                fields=["order_date"],
+                name="productorder_active_date_idx",
+            ),
+        ),
+    ]
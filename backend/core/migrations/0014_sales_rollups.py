@@ -0,0 +1,148 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+ROLLUP_FUNCTIONS = """
+CREATE FUNCTION core_sales_rollup_add(
+    _order_date timestamptz,
+    _sale_point_id bigint,
+    _product_id bigint,
+    _factory_id bigint,
+    _status varchar,
+    _quantity bigint,
+    _sign integer
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO core_dailysalesrollup AS r
+        (day, sale_point_id, product_id, factory_id, status, orders, quantity)
+    VALUES (
+        (_order_date AT TIME ZONE 'UTC')::date, _sale_point_id, _product_id,
+        _factory_id, _status, _sign, _sign * _quantity
+    )
+    ON CONFLICT (day, sale_point_id, product_id, factory_id, status) DO UPDATE
+    SET orders = r.orders + EXCLUDED.orders, quantity = r.quantity + EXCLUDED.quantity;
+
+    INSERT INTO core_hourlysalesrollup AS r
+        (hour, sale_point_id, product_id, factory_id, status, orders, quantity)
+    VALUES (
+        date_trunc('hour', _order_date, 'UTC'), _sale_point_id, _product_id,
+        _factory_id, _status, _sign, _sign * _quantity
+    )
+    ON CONFLICT (hour, sale_point_id, product_id, factory_id, status) DO UPDATE
+    SET orders = r.orders + EXCLUDED.orders, quantity = r.quantity + EXCLUDED.quantity;
+END
+$$;
+
+CREATE FUNCTION core_productorder_rollup() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM core_sales_rollup_add(
+            OLD.order_date, OLD.sale_point_id, OLD.product_id, OLD.factory_id,
+            OLD.status, OLD.quantity, -1
+        );
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM core_sales_rollup_add(
+            NEW.order_date, NEW.sale_point_id, NEW.product_id, NEW.factory_id,
+            NEW.status, NEW.quantity, 1
+        );
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+CREATE TRIGGER core_productorder_rollup_insert_delete
+AFTER INSERT OR DELETE ON core_productorder
+FOR EACH ROW EXECUTE FUNCTION core_productorder_rollup();
+
+CREATE TRIGGER core_productorder_rollup_update
+AFTER UPDATE ON core_productorder
+FOR EACH ROW
+WHEN (
+    (OLD.order_date, OLD.sale_point_id, OLD.product_id, OLD.factory_id, OLD.status, OLD.quantity)
+    IS DISTINCT FROM
+    (NEW.order_date, NEW.sale_point_id, NEW.product_id, NEW.factory_id, NEW.status, NEW.quantity)
+)
+EXECUTE FUNCTION core_productorder_rollup();
+"""
+
+DROP_ROLLUP_FUNCTIONS = """
+DROP TRIGGER core_productorder_rollup_update ON core_productorder;
+DROP TRIGGER core_productorder_rollup_insert_delete ON core_productorder;
+DROP FUNCTION core_productorder_rollup();
+DROP FUNCTION core_sales_rollup_add(timestamptz, bigint, bigint, bigint, varchar, bigint, integer);
+"""
+
+BACKFILL = """
+UPDATE core_productorder o
+SET factory_id = (
+    SELECT w.factory_id FROM core_factorywarehouse w
+    WHERE w.product_id = o.product_id ORDER BY w.id LIMIT 1
+)
+WHERE factory_id IS NULL;
+
+INSERT INTO core_dailysalesrollup
+    (day, sale_point_id, product_id, factory_id, status, orders, quantity)
+SELECT (order_date AT TIME ZONE 'UTC')::date, sale_point_id, product_id, factory_id,
+    status, count(*), sum(quantity)
+FROM core_productorder GROUP BY 1, 2, 3, 4, 5;
+
+INSERT INTO core_hourlysalesrollup
+    (hour, sale_point_id, product_id, factory_id, status, orders, quantity)
+SELECT date_trunc('hour', order_date, 'UTC'), sale_point_id, product_id, factory_id,
+    status, count(*), sum(quantity)
+FROM core_productorder GROUP BY 1, 2, 3, 4, 5;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_partition_productorder'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productorder',
+            name='factory',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.factory'),
+        ),
+        migrations.CreateModel(
+            name='DailySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('in_processing', 'In Processing'), ('delivery', 'Delivery'), ('delivered', 'Delivered')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('day', models.DateField()),
+                ('factory', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.factory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+                ('sale_point', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.salepoint')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='HourlySalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('in_processing', 'In Processing'), ('delivery', 'Delivery'), ('delivered', 'Delivered')], max_length=20)),
+                ('orders', models.IntegerField(default=0)),
+                ('quantity', models.BigIntegerField(default=0)),
+                ('hour', models.DateTimeField()),
+                ('factory', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.factory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+                ('sale_point', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.salepoint')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='dailysalesrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'sale_point', 'product', 'factory', 'status'), name='daily_sales_rollup_key', nulls_distinct=False),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysalesrollup',
+            constraint=models.UniqueConstraint(fields=('hour', 'sale_point', 'product', 'factory', 'status'), name='hourly_sales_rollup_key', nulls_distinct=False),
+        ),
+        migrations.RunSQL(BACKFILL, migrations.RunSQL.noop),
+        migrations.RunSQL(ROLLUP_FUNCTIONS, DROP_ROLLUP_FUNCTIONS),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+OPENING_BALANCE = """
+INSERT INTO core_stockmovement (factory_id, product_id, kind, delta, created_at)
+SELECT factory_id, product_id, 'adjustment', quantity, now()
+FROM core_factorywarehouse
+WHERE quantity <> 0
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+                ('factory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.factory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('reservation', 'Reservation'), ('restock', 'Restock'), ('adjustment', 'Adjustment'), ('cancel', 'Cancel')], max_length=20)),
+                ('delta', models.IntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('factory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.factory')),
+                ('order', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='stock_movements', to='core.productorder')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['factory', 'created_at'], name='core_stockm_factory_6b292b_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('factory', 'taken_at', 'product'), name='stock_snapshot_key'),
+        ),
+        migrations.RunSQL(OPENING_BALANCE, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:55
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_stock_movements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReorderThreshold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('threshold', models.PositiveIntegerField()),
+                ('reorder_quantity', models.PositiveIntegerField(default=0)),
+                ('alerted', models.BooleanField(default=False)),
+                ('factory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.factory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('low_stock', 'Low stock'), ('restocked', 'Restocked')], max_length=20)),
+                ('quantity', models.IntegerField()),
+                ('threshold', models.PositiveIntegerField()),
+                ('reorder_quantity', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('factory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.factory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='reorderthreshold',
+            constraint=models.UniqueConstraint(fields=('factory', 'product'), name='reorder_threshold_key'),
+        ),
+        migrations.AddIndex(
+            model_name='stockalert',
+            index=models.Index(fields=['factory', 'id'], name='core_stocka_factory_41f3a6_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-19 16:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_reorder_alerts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DemandForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('generated_at', models.DateTimeField()),
+                ('start', models.DateField()),
+                ('daily', models.JSONField()),
+                ('total', models.FloatField()),
+                ('sigma', models.FloatField()),
+                ('lead_time_demand', models.FloatField()),
+                ('safety_stock', models.FloatField()),
+                ('reorder_point', models.FloatField()),
+                ('factory', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='core.factory')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.product')),
+                ('sale_point', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.salepoint')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['factory', 'product'], name='core_demand_factory_cbff7d_idx'), models.Index(fields=['sale_point', 'product'], name='core_demand_sale_po_781373_idx')],
+            },
+        ),
+    ]
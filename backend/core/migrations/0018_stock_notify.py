@@ -0,0 +1,58 @@
+from django.db import migrations
+
+
+NOTIFY = """
+CREATE FUNCTION core_factorywarehouse_notify() RETURNS trigger AS $$
+BEGIN
+    -- Payloads are product ids, '*' asks listeners to reload everything.
+    -- Equal notifications in one transaction are delivered once.
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('core_stock', '*');
+        RETURN NULL;
+    END IF;
+    IF TG_OP <> 'INSERT' THEN
+        PERFORM pg_notify('core_stock', OLD.product_id::text);
+    END IF;
+    IF TG_OP <> 'DELETE' THEN
+        PERFORM pg_notify('core_stock', NEW.product_id::text);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_factorywarehouse_notify_insert_delete
+AFTER INSERT OR DELETE ON core_factorywarehouse
+FOR EACH ROW EXECUTE FUNCTION core_factorywarehouse_notify();
+
+CREATE TRIGGER core_factorywarehouse_notify_update
+AFTER UPDATE ON core_factorywarehouse
+FOR EACH ROW
+WHEN (
+    OLD.quantity IS DISTINCT FROM NEW.quantity
+    OR OLD.product_id IS DISTINCT FROM NEW.product_id
+    OR OLD.factory_id IS DISTINCT FROM NEW.factory_id
+)
+EXECUTE FUNCTION core_factorywarehouse_notify();
+
+CREATE TRIGGER core_factorywarehouse_notify_truncate
+AFTER TRUNCATE ON core_factorywarehouse
+FOR EACH STATEMENT EXECUTE FUNCTION core_factorywarehouse_notify();
+"""
+
+DROP_NOTIFY = """
+DROP TRIGGER core_factorywarehouse_notify_truncate ON core_factorywarehouse;
+DROP TRIGGER core_factorywarehouse_notify_update ON core_factorywarehouse;
+DROP TRIGGER core_factorywarehouse_notify_insert_delete ON core_factorywarehouse;
+DROP FUNCTION core_factorywarehouse_notify();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_demand_forecasts'),
+    ]
+
+    operations = [
+        migrations.RunSQL(NOTIFY, DROP_NOTIFY),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:01
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Build the indexes without blocking stock writes
+    atomic = False
+
+    dependencies = [
+        ('core', '0018_stock_notify'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='factorywarehouse',
+            index=models.Index(condition=models.Q(('quantity__gt', 0)), fields=['product', 'factory'], name='factorywarehouse_in_stock_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='factorywarehouse',
+            index=models.Index(condition=models.Q(('quantity', 0)), fields=['id'], name='factorywarehouse_empty_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_warehouse_in_stock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productorder',
+            index=models.Index(fields=['order_date'], name='order_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productorder',
+            index=models.Index(fields=['status', 'order_date'], name='order_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productorder',
+            index=models.Index(fields=['product', 'order_date'], name='order_product_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productorder',
+            index=models.Index(fields=['factory', 'order_date'], name='order_factory_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='productorder',
+            index=models.Index(fields=['sale_point', 'order_date'], name='order_sale_point_date_idx'),
+        ),
+    ]
@@ -0,0 +1,83 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:06
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+# The text search configuration must match core.search.CONFIG
+SEARCH_VECTOR = """
+CREATE FUNCTION core_product_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('simple', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(
+            (SELECT name FROM core_productcategory WHERE id = NEW.category_id), ''
+        )), 'B')
+        || setweight(to_tsvector('simple', coalesce(NEW.description, '')), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_product_search_vector
+BEFORE INSERT OR UPDATE OF name, description, category_id ON core_product
+FOR EACH ROW EXECUTE FUNCTION core_product_search_vector();
+
+CREATE FUNCTION core_productcategory_search_vector() RETURNS trigger AS $$
+BEGIN
+    UPDATE core_product SET name = name WHERE category_id = NEW.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_productcategory_search_vector
+AFTER UPDATE OF name ON core_productcategory
+FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+EXECUTE FUNCTION core_productcategory_search_vector();
+
+UPDATE core_product SET name = name;
+"""
+
+DROP_SEARCH_VECTOR = """
+DROP TRIGGER core_productcategory_search_vector ON core_productcategory;
+DROP FUNCTION core_productcategory_search_vector();
+DROP TRIGGER core_product_search_vector ON core_product;
+DROP FUNCTION core_product_search_vector();
+"""
+
+# Typo tolerance needs pg_trgm, which ships with the PostgreSQL contrib
+# modules. Without it search falls back to exact word matches.
+TRIGRAM = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+        CREATE INDEX IF NOT EXISTS product_name_trgm_idx
+        ON core_product USING gin (name gin_trgm_ops);
+    END IF;
+END;
+$$;
+"""
+
+DROP_TRIGRAM = "DROP INDEX IF EXISTS product_name_trgm_idx;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_order_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(SEARCH_VECTOR, DROP_SEARCH_VECTOR),
+        migrations.AddIndex(
+            model_name='product',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='product_search_idx'),
+        ),
+        migrations.RunSQL(TRIGRAM, DROP_TRIGRAM),
+    ]
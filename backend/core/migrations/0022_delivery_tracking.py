@@ -0,0 +1,75 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:09
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.db import migrations, models
+
+from core.partitions import create_default_partition, ensure_partitions
+
+# Range-partitioned by month like core_productorder. The id comes from a plain
+# sequence because identity columns are not supported on partitioned tables.
+CREATE_TABLE = """
+CREATE TABLE core_trackingevent (
+    id bigserial NOT NULL,
+    delivery_id bigint NOT NULL,
+    status varchar(20) NOT NULL,
+    latitude double precision NOT NULL,
+    longitude double precision NOT NULL,
+    recorded_at timestamp with time zone NOT NULL,
+    PRIMARY KEY (id, recorded_at)
+) PARTITION BY RANGE (recorded_at);
+
+CREATE INDEX tracking_delivery_time_idx
+ON core_trackingevent (delivery_id, recorded_at);
+
+CREATE INDEX tracking_recorded_at_brin
+ON core_trackingevent USING brin (recorded_at);
+"""
+
+
+def create_partitions(apps, schema_editor):
+    alias = schema_editor.connection.alias
+    ensure_partitions("core_trackingevent", "recorded_at", using=alias)
+    create_default_partition("core_trackingevent", using=alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_product_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryPosition',
+            fields=[
+                ('delivery', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='position', serialize=False, to='core.delivery')),
+                ('status', models.CharField(choices=[('picked_up', 'Picked Up'), ('in_transit', 'In Transit'), ('delayed', 'Delayed'), ('arrived', 'Arrived')], max_length=20)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('recorded_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='TrackingEvent',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('status', models.CharField(choices=[('picked_up', 'Picked Up'), ('in_transit', 'In Transit'), ('delayed', 'Delayed'), ('arrived', 'Arrived')], max_length=20)),
+                        ('latitude', models.FloatField()),
+                        ('longitude', models.FloatField()),
+                        ('recorded_at', models.DateTimeField()),
+                        ('delivery', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, db_index=False, related_name='tracking_events', to='core.delivery')),
+                    ],
+                    options={
+                        'indexes': [models.Index(fields=['delivery', 'recorded_at'], name='tracking_delivery_time_idx'), django.contrib.postgres.indexes.BrinIndex(fields=['recorded_at'], name='tracking_recorded_at_brin')],
+                    },
+                ),
+            ],
+            database_operations=[
+                migrations.RunSQL(CREATE_TABLE, "DROP TABLE core_trackingevent"),
+                migrations.RunPython(create_partitions, migrations.RunPython.noop),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:13
+
+from django.db import migrations, models
+
+
+# Posting counts used to add a row per post, so the same product may have
+# several rows in a factory. They are merged into the oldest row; the total
+# stays the same, so the ledger still reconciles.
+MERGE_DUPLICATES = """
+WITH duplicates AS (
+    SELECT factory_id, product_id, min(id) AS keep, sum(quantity) AS total
+    FROM core_factorywarehouse
+    GROUP BY factory_id, product_id
+    HAVING count(*) > 1
+), merged AS (
+    UPDATE core_factorywarehouse w
+    SET quantity = d.total
+    FROM duplicates d
+    WHERE w.id = d.keep
+)
+DELETE FROM core_factorywarehouse w
+USING duplicates d
+WHERE w.factory_id = d.factory_id
+AND w.product_id = d.product_id
+AND w.id <> d.keep
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_delivery_tracking'),
+    ]
+
+    operations = [
+        migrations.RunSQL(MERGE_DUPLICATES, migrations.RunSQL.noop),
+        migrations.AddConstraint(
+            model_name='factorywarehouse',
+            constraint=models.UniqueConstraint(fields=('factory', 'product'), name='factorywarehouse_unique_product'),
+        ),
+    ]
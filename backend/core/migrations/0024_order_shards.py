@@ -0,0 +1,85 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Orders written so far are in the default database, so every existing sale
+# point stays there. The map itself only exists in the default database, see
+# core.sharding.OrderShardRouter.allow_migrate.
+PIN_SALE_POINTS = """
+INSERT INTO core_salepointshard (sale_point_id, database)
+SELECT id, 'default' FROM core_salepoint
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_warehouse_unique_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalePointShard',
+            fields=[
+                ('sale_point', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard', serialize=False, to='core.salepoint')),
+                ('database', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.RunSQL(
+            PIN_SALE_POINTS,
+            migrations.RunSQL.noop,
+            hints={'model_name': 'salepointshard'},
+        ),
+        migrations.AlterField(
+            model_name='dailysalesrollup',
+            name='factory',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.factory'),
+        ),
+        migrations.AlterField(
+            model_name='dailysalesrollup',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.product'),
+        ),
+        migrations.AlterField(
+            model_name='dailysalesrollup',
+            name='sale_point',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.salepoint'),
+        ),
+        migrations.AlterField(
+            model_name='hourlysalesrollup',
+            name='factory',
+            field=models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.factory'),
+        ),
+        migrations.AlterField(
+            model_name='hourlysalesrollup',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.product'),
+        ),
+        migrations.AlterField(
+            model_name='hourlysalesrollup',
+            name='sale_point',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='core.salepoint'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='deliveries',
+            field=models.ManyToManyField(blank=True, db_constraint=False, related_name='product_orders', to='core.delivery'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='factory',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to='core.factory'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, to='core.product'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='sale_point',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.PROTECT, to='core.salepoint'),
+        ),
+    ]
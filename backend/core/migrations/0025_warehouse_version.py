@@ -0,0 +1,39 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:34
+
+from django.db import migrations, models
+
+
+VERSION = """
+CREATE FUNCTION core_factorywarehouse_version() RETURNS trigger AS $$
+BEGIN
+    -- Every update moves the version on, including writes that do not go
+    -- through the application and saves of instances holding an old version
+    NEW.version := OLD.version + 1;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_factorywarehouse_version
+BEFORE UPDATE ON core_factorywarehouse
+FOR EACH ROW EXECUTE FUNCTION core_factorywarehouse_version();
+"""
+
+DROP_VERSION = """
+DROP TRIGGER core_factorywarehouse_version ON core_factorywarehouse;
+DROP FUNCTION core_factorywarehouse_version();
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_order_shards'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='factorywarehouse',
+            name='version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunSQL(VERSION, DROP_VERSION),
+    ]
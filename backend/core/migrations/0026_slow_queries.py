@@ -0,0 +1,32 @@
+# Generated by Django 5.0.6 on 2026-10-19 17:43
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_warehouse_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fingerprint', models.CharField(max_length=32, unique=True)),
+                ('database', models.CharField(max_length=100)),
+                ('sql', models.TextField()),
+                ('calls', models.BigIntegerField(default=0)),
+                ('total_ms', models.FloatField(default=0)),
+                ('max_ms', models.FloatField(default=0)),
+                ('view', models.CharField(blank=True, max_length=200)),
+                ('frame', models.CharField(blank=True, max_length=300)),
+                ('first_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_seen', models.DateTimeField(default=django.utils.timezone.now)),
+                ('plan', models.TextField(blank=True, null=True)),
+                ('plan_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:03
+
+import core.sharding
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_slow_queries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productorder',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=core.sharding.protect_on_shards, to='core.product'),
+        ),
+        migrations.AlterField(
+            model_name='productorder',
+            name='sale_point',
+            field=models.ForeignKey(db_constraint=False, on_delete=core.sharding.protect_on_shards, to='core.salepoint'),
+        ),
+    ]
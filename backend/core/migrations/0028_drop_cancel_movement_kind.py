@@ -0,0 +1,18 @@
+# Generated by Django 5.0.6 on 2026-10-19 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0027_order_references_on_shards'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('reservation', 'Reservation'), ('restock', 'Restock'), ('adjustment', 'Adjustment')], max_length=20),
+        ),
+    ]
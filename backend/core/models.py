@@ -1,8 +1,16 @@
+import logging
+
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import BrinIndex, GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.exceptions import ValidationError
 from django.db import models
-from django.db.models.query import transaction
-from django.utils.timezone import datetime, timezone
+from django.utils import timezone
+
+from core import sharding
+from core.retry import atomic_with_retry
+
+logger = logging.getLogger(__name__)
 
 
 class ExtendedUser(AbstractUser):
@@ -52,6 +60,13 @@ class Product(models.Model):
     )
     weight = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.CharField(max_length=255, blank=True, null=True)
+    # Maintained by database triggers from the name, description and category
+    # name. The trigram index on name is created in migration 0021 when the
+    # pg_trgm extension is available, see core.search
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [GinIndex(fields=["search_vector"], name="product_search_idx")]
 
 
 class Factory(models.Model):
@@ -62,10 +77,40 @@ class Factory(models.Model):
     )  # Replaces FactoryProducts
 
 
+class FactoryWarehouseQuerySet(models.QuerySet):
+    def in_stock(self):
+        # Rows at zero are kept until `manage.py compact_warehouse` removes them
+        return self.filter(quantity__gt=0)
+
+
 class FactoryWarehouse(models.Model):
     factory = models.ForeignKey(Factory, on_delete=models.CASCADE)
     quantity = models.IntegerField(default=0)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # Raised by a trigger on every update (migration 0025), whatever the update
+    # writes, for compare-and-swap updates, see core/stock.py
+    version = models.IntegerField(default=0)
+
+    objects = FactoryWarehouseQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["factory", "product"], name="factorywarehouse_unique_product"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["product", "factory"],
+                condition=models.Q(quantity__gt=0),
+                name="factorywarehouse_in_stock_idx",
+            ),
+            models.Index(
+                fields=["id"],
+                condition=models.Q(quantity=0),
+                name="factorywarehouse_empty_idx",
+            ),
+        ]
 
 
 class SalePoint(models.Model):
@@ -73,6 +118,14 @@ class SalePoint(models.Model):
     address = models.CharField(max_length=255)
 
 
+class SalePointShard(models.Model):
+    # The database holding a sale point's orders, see core/sharding.py
+    sale_point = models.OneToOneField(
+        SalePoint, on_delete=models.CASCADE, primary_key=True, related_name="shard"
+    )
+    database = models.CharField(max_length=100)
+
+
 class ProductOrder(models.Model):
     STATUS_CHOICES = [
         ("in_processing", "In Processing"),
@@ -80,51 +133,181 @@ class ProductOrder(models.Model):
         ("delivered", "Delivered"),
     ]
 
-    sale_point = models.ForeignKey(SalePoint, on_delete=models.PROTECT)
-    product = models.ForeignKey(Product, on_delete=models.PROTECT)
+    # Orders live on the shard of their sale point, away from the tables these
+    # refer to, so the database cannot check the references
+    sale_point = models.ForeignKey(
+        SalePoint, on_delete=sharding.protect_on_shards, db_constraint=False
+    )
+    product = models.ForeignKey(
+        Product, on_delete=sharding.protect_on_shards, db_constraint=False
+    )
+    factory = models.ForeignKey(
+        Factory, on_delete=models.SET_NULL, null=True, blank=True, db_constraint=False
+    )
     quantity = models.PositiveIntegerField()
-    order_date = models.DateTimeField(auto_now=True)
+    # Set once: it is the partition key, and the rollups and order listings
+    # rely on it not moving when an order changes
+    order_date = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         max_length=20, choices=STATUS_CHOICES, default="in_processing"
     )
     deliveries = models.ManyToManyField(
-        "Delivery", related_name="product_orders", blank=True
+        "Delivery", related_name="product_orders", blank=True, db_constraint=False
     )
     delivery_cost = models.DecimalField(max_digits=10, decimal_places=2)
 
+    class Meta:
+        # The table is range-partitioned by order_date (see migration 0013),
+        # so the primary key in the database is (id, order_date).
+        indexes = [
+            models.Index(
+                fields=["order_date"],
+                condition=~models.Q(status="delivered"),
+                name="productorder_active_date_idx",
+            ),
+            # Order list filters, see core/filters.py
+            models.Index(fields=["order_date"], name="order_date_idx"),
+            models.Index(fields=["status", "order_date"], name="order_status_date_idx"),
+            models.Index(
+                fields=["product", "order_date"], name="order_product_date_idx"
+            ),
+            models.Index(
+                fields=["factory", "order_date"], name="order_factory_date_idx"
+            ),
+            models.Index(
+                fields=["sale_point", "order_date"], name="order_sale_point_date_idx"
+            ),
+        ]
+
+    @staticmethod
+    def create_order(self, product, quantity, sale_point):
+        return ProductOrder.create_orders([(product, quantity, sale_point)])[0]
+
+    @staticmethod
+    def create_orders(items):
+        # Sale points are placed on a shard before the reservation, so a
+        # retried reservation does not place them again
+        shards = sharding.placements(sale_point.id for _, _, sale_point in items)
+        orders = ProductOrder.reserve(items, shards)
+        for order in orders:
+            logger.info(
+                "Order %s reserved %s of product %s at factory %s",
+                order.id,
+                order.quantity,
+                order.product_id,
+                order.factory_id,
+            )
+        return orders
+
     @staticmethod
-    def create_order(self, product, quantity):
-        with transaction.atomic():
-            logger.debug("Logging from models.py (DEBUG level)")
-            logger.info("Logging from models.py (INFO level)")
-            factory_warehouse = (
-                FactoryWarehouse.objects.select_for_update()
-                .filter(product=product)
-                .first()
+    @atomic_with_retry
+    def reserve(items, shards):
+        # Reserves a cart of (product, quantity, sale point) items in one
+        # transaction. The warehouse rows of all products are locked up front in
+        # (product, factory) order, so concurrent carts cannot deadlock on them.
+        # The orders are written to the shards of their sale points, which
+        # commit just before the stock.
+        used = set(shards.values())
+        with sharding.atomic(
+            [alias for alias in sharding.shards()[1:] if alias in used]
+        ):
+            return ProductOrder._reserve(items, shards)
+
+    @staticmethod
+    def _reserve(items, shards):
+        warehouses = {}
+        for warehouse in (
+            FactoryWarehouse.objects.select_for_update()
+            .in_stock()
+            .filter(product__in={product.id for product, _, _ in items})
+            .order_by("product_id", "factory_id")
+        ):
+            warehouses.setdefault(warehouse.product_id, []).append(warehouse)
+
+        orders = []
+        for product, quantity, sale_point in items:
+            factory_warehouse = next(
+                (
+                    warehouse
+                    for warehouse in warehouses.get(product.id, [])
+                    if warehouse.quantity >= quantity
+                ),
+                None,
             )
-            if not factory_warehouse or factory_warehouse.quantity < quantity:
+            if factory_warehouse is None:
                 raise ValidationError(
                     "Insufficient product quantity in the factory warehouse."
                 )
 
-            order = ProductOrder.objects.create(
+            order = ProductOrder.objects.using(shards[sale_point.id]).create(
+                sale_point=sale_point,
                 product=product,
+                factory=factory_warehouse.factory,
                 quantity=quantity,
                 status="in_processing",
             )
 
-            logger.info(f"In models")
-
             factory_warehouse.quantity -= quantity
-            factory_warehouse.save()
-
-            return order
+            factory_warehouse.save(update_fields=["quantity"])
+            StockMovement.record(
+                factory_warehouse.factory_id,
+                product.id,
+                "reservation",
+                -quantity,
+                order=order,
+            )
+            orders.append(order)
+        return orders
 
     @staticmethod
     def calculate_delivery_cost(self, product, quantity):
         pass
 
 
+class SalesRollup(models.Model):
+    # Maintained by database triggers on core_productorder, see core/rollups.py,
+    # so rollups live on the same shard as the orders
+    sale_point = models.ForeignKey(
+        SalePoint, on_delete=models.CASCADE, db_constraint=False
+    )
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_constraint=False)
+    factory = models.ForeignKey(
+        Factory, on_delete=models.CASCADE, null=True, db_constraint=False
+    )
+    status = models.CharField(max_length=20, choices=ProductOrder.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    quantity = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class DailySalesRollup(SalesRollup):
+    day = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "sale_point", "product", "factory", "status"],
+                name="daily_sales_rollup_key",
+                nulls_distinct=False,
+            ),
+        ]
+
+
+class HourlySalesRollup(SalesRollup):
+    hour = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["hour", "sale_point", "product", "factory", "status"],
+                name="hourly_sales_rollup_key",
+                nulls_distinct=False,
+            ),
+        ]
+
+
 class Carrier(models.Model):
     name = models.CharField(max_length=100)
 
@@ -132,3 +315,184 @@ class Carrier(models.Model):
 class Delivery(models.Model):
     carrier = models.ForeignKey(Carrier, on_delete=models.PROTECT)
     cost = models.DecimalField(max_digits=10, decimal_places=2)
+
+
+class TrackingEvent(models.Model):
+    # Append-only pings reported by carriers, written with COPY by
+    # core/tracking.py. The table is range-partitioned by recorded_at (see
+    # migration 0022), so the primary key in the database is (id, recorded_at)
+    # and the delivery is not a database foreign key.
+    STATUS_CHOICES = [
+        ("picked_up", "Picked Up"),
+        ("in_transit", "In Transit"),
+        ("delayed", "Delayed"),
+        ("arrived", "Arrived"),
+    ]
+
+    delivery = models.ForeignKey(
+        Delivery,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        db_index=False,
+        related_name="tracking_events",
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["delivery", "recorded_at"], name="tracking_delivery_time_idx"
+            ),
+            BrinIndex(fields=["recorded_at"], name="tracking_recorded_at_brin"),
+        ]
+
+
+class DeliveryPosition(models.Model):
+    # Latest tracking event of each delivery, upserted with every ingested batch
+    delivery = models.OneToOneField(
+        Delivery, on_delete=models.CASCADE, primary_key=True, related_name="position"
+    )
+    status = models.CharField(max_length=20, choices=TrackingEvent.STATUS_CHOICES)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    recorded_at = models.DateTimeField()
+
+
+class StockMovement(models.Model):
+    # Append-only: every change of FactoryWarehouse.quantity is recorded here in
+    # the same transaction, see core/stock.py for snapshots and reports.
+    KIND_CHOICES = [
+        ("reservation", "Reservation"),
+        ("restock", "Restock"),
+        ("adjustment", "Adjustment"),
+    ]
+
+    factory = models.ForeignKey(Factory, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    delta = models.IntegerField()
+    # Product orders are partitioned and cannot be referenced by a foreign key
+    order = models.ForeignKey(
+        ProductOrder,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        null=True,
+        blank=True,
+        related_name="stock_movements",
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["factory", "created_at"]),
+        ]
+
+    @classmethod
+    def record(cls, factory_id, product_id, kind, delta, order=None):
+        from core.alerts import stock_changed
+
+        movement = cls.objects.create(
+            factory_id=factory_id,
+            product_id=product_id,
+            kind=kind,
+            delta=delta,
+            order=order,
+        )
+        stock_changed(factory_id, product_id)
+        return movement
+
+
+class StockSnapshot(models.Model):
+    factory = models.ForeignKey(Factory, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["factory", "taken_at", "product"],
+                name="stock_snapshot_key",
+            ),
+        ]
+
+
+class ReorderThreshold(models.Model):
+    # An alert is raised when the stock of the product at the factory falls to
+    # `threshold` or below; `alerted` is set until the stock recovers.
+    factory = models.ForeignKey(Factory, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    threshold = models.PositiveIntegerField()
+    reorder_quantity = models.PositiveIntegerField(default=0)
+    alerted = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["factory", "product"], name="reorder_threshold_key"
+            ),
+        ]
+
+
+class StockAlert(models.Model):
+    # Append-only event feed, written by core/alerts.py
+    KIND_CHOICES = [
+        ("low_stock", "Low stock"),
+        ("restocked", "Restocked"),
+    ]
+
+    factory = models.ForeignKey(Factory, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    quantity = models.IntegerField()
+    threshold = models.PositiveIntegerField()
+    reorder_quantity = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["factory", "id"]),
+        ]
+
+
+class DemandForecast(models.Model):
+    # Latest run of `manage.py forecast_demand` per series, see core/forecasting.py
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    factory = models.ForeignKey(Factory, on_delete=models.CASCADE, null=True)
+    sale_point = models.ForeignKey(SalePoint, on_delete=models.CASCADE)
+    generated_at = models.DateTimeField()
+    start = models.DateField()
+    # Forecast quantity for every day from `start` on
+    daily = models.JSONField()
+    total = models.FloatField()
+    sigma = models.FloatField()
+    lead_time_demand = models.FloatField()
+    safety_stock = models.FloatField()
+    reorder_point = models.FloatField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["factory", "product"]),
+            models.Index(fields=["sale_point", "product"]),
+        ]
+
+
+class SlowQuery(models.Model):
+    # Statements slower than SLOW_QUERY_MS, aggregated per normalized statement,
+    # see core/querylog.py
+    fingerprint = models.CharField(max_length=32, unique=True)
+    database = models.CharField(max_length=100)
+    sql = models.TextField()
+    calls = models.BigIntegerField(default=0)
+    total_ms = models.FloatField(default=0)
+    max_ms = models.FloatField(default=0)
+    # The view and the innermost frame of this app of the latest call
+    view = models.CharField(max_length=200, blank=True)
+    frame = models.CharField(max_length=300, blank=True)
+    first_seen = models.DateTimeField(default=timezone.now)
+    last_seen = models.DateTimeField(default=timezone.now)
+    plan = models.TextField(null=True, blank=True)
+    plan_at = models.DateTimeField(null=True, blank=True)
@@ -0,0 +1,176 @@
+import csv
+import io
+import multiprocessing
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+
+from core.models import Carrier, Factory, SalePoint
+
+# role -> (ExtendedUser m2m field, entity model)
+ROLES = {
+    "factory": ("factories", Factory),
+    "carrier": ("carriers", Carrier),
+    "sale_point": ("sale_points", SalePoint),
+}
+
+CSV_FIELDS = ["username", "email", "role", "entity_id", "password"]
+
+
+class UsernameConflict(Exception):
+    # Usernames taken by a concurrent request after the rows were validated
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class OnboardingRowSerializer(serializers.Serializer):
+    username = serializers.CharField(max_length=150)
+    email = serializers.EmailField()
+    role = serializers.ChoiceField(choices=list(ROLES))
+    entity_id = serializers.IntegerField()
+    password = serializers.CharField(required=False, allow_blank=True)
+
+
+def read_csv(text):
+    rows = []
+    for row in csv.DictReader(io.StringIO(text)):
+        rows.append(
+            {key.strip(): (value or "").strip() for key, value in row.items() if key}
+        )
+    return rows
+
+
+def validate_rows(rows):
+    # Per-row field validation, then the checks against the database with one
+    # query per table. Returns (validated rows, {row index: errors}).
+    serializer = OnboardingRowSerializer(data=rows, many=True)
+    if not serializer.is_valid():
+        return [], {
+            index: errors for index, errors in enumerate(serializer.errors) if errors
+        }
+    rows = serializer.validated_data
+
+    User = get_user_model()
+    errors = {}
+    usernames = [User.normalize_username(row["username"]) for row in rows]
+    existing = set(
+        User.objects.filter(username__in=usernames).values_list("username", flat=True)
+    )
+    entities = {}
+    for role, (_, model) in ROLES.items():
+        ids = {row["entity_id"] for row in rows if row["role"] == role}
+        if ids:
+            entities[role] = set(
+                model.objects.filter(id__in=ids).values_list("id", flat=True)
+            )
+
+    groups = set(
+        Group.objects.filter(name__in=list(ROLES)).values_list("name", flat=True)
+    )
+
+    seen = set()
+    for index, (row, username) in enumerate(zip(rows, usernames)):
+        row["username"] = username
+        if username in existing or username in seen:
+            errors[index] = {"username": ["A user with that username already exists."]}
+        elif row["role"] not in groups:
+            errors[index] = {"role": [f"Group '{row['role']}' does not exist."]}
+        elif row["entity_id"] not in entities.get(row["role"], ()):
+            errors[index] = {"entity_id": [f"Unknown {row['role']} id."]}
+        seen.add(username)
+    return rows, errors
+
+
+def hash_passwords(passwords):
+    # PBKDF2 is CPU bound, so large batches are hashed in a process pool that
+    # lives for the batch. Its workers are spawned rather than forked: a fork
+    # of a threaded server process copies locks held by its other threads
+    # (logging, LISTEN, shard pool). They only import the hashers, so they set
+    # up neither Django nor its logging.
+    workers = settings.ONBOARDING_HASH_WORKERS
+    if workers <= 1 or len(passwords) < settings.ONBOARDING_POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(
+        workers, mp_context=multiprocessing.get_context("spawn")
+    ) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def create_users(rows):
+    # Rows must come from validate_rows(). Rows without a password get a random
+    # one, which is returned in the row under "generated_password". Raises
+    # UsernameConflict when a username was taken since the validation.
+    User = get_user_model()
+    for row in rows:
+        if not row.get("password"):
+            row["password"] = row["generated_password"] = secrets.token_urlsafe(12)
+    hashes = hash_passwords([row["password"] for row in rows])
+    groups = dict(
+        Group.objects.filter(name__in={row["role"] for row in rows}).values_list(
+            "name", "id"
+        )
+    )
+
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [
+                    User(
+                        username=row["username"],
+                        email=User.objects.normalize_email(row["email"]),
+                        password=password,
+                    )
+                    for row, password in zip(rows, hashes)
+                ],
+                batch_size=1000,
+            )
+
+            link(
+                User.groups,
+                [(user.id, groups[row["role"]]) for user, row in zip(users, rows)],
+            )
+            for role, (field, _) in ROLES.items():
+                link(
+                    getattr(User, field),
+                    [
+                        (user.id, row["entity_id"])
+                        for user, row in zip(users, rows)
+                        if row["role"] == role
+                    ],
+                )
+    except IntegrityError:
+        # A concurrent request created some of the usernames
+        taken = set(
+            User.objects.filter(
+                username__in=[row["username"] for row in rows]
+            ).values_list("username", flat=True)
+        )
+        if not taken:
+            raise
+        raise UsernameConflict(
+            {
+                index: {"username": ["A user with that username already exists."]}
+                for index, row in enumerate(rows)
+                if row["username"] in taken
+            }
+        )
+    return users
+
+
+def link(descriptor, pairs):
+    field = descriptor.field
+    through = descriptor.through
+    source = field.m2m_field_name() + "_id"
+    target = field.m2m_reverse_field_name() + "_id"
+    through.objects.bulk_create(
+        [through(**{source: left, target: right}) for left, right in pairs],
+        batch_size=1000,
+    )
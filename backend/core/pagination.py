@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+from rest_framework.pagination import PageNumberPagination
+
+
+class CappedCountPaginator(Paginator):
+    # Counts at most ORDER_COUNT_LIMIT rows, so the count stays as cheap as
+    # reading one more page however many rows match
+    @cached_property
+    def count(self):
+        return self.object_list[: settings.ORDER_COUNT_LIMIT].count()
+
+
+class CappedCountPagination(PageNumberPagination):
+    django_paginator_class = CappedCountPaginator
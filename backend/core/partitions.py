@@ -0,0 +1,183 @@
+import datetime
+import gzip
+import os
+import re
+
+from django.db import connections, transaction
+from django.utils import timezone
+
+PARTITION_SUFFIX = re.compile(r"_p(\d{4})_(\d{2})$")
+
+
+def month_start(value):
+    return datetime.date(value.year, value.month, 1)
+
+
+def add_months(value, months):
+    month = value.month - 1 + months
+    return datetime.date(value.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month.year:04d}_{month.month:02d}"
+
+
+def default_partition_name(table):
+    return f"{table}_default"
+
+
+def _bound(month):
+    return f"{month.isoformat()} 00:00:00+00"
+
+
+def _table_exists(cursor, table):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+    return cursor.fetchone()[0]
+
+
+def list_partitions(table, using="default"):
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [table],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_SUFFIX.search(name)
+        if match:
+            partitions[datetime.date(int(match[1]), int(match[2]), 1)] = name
+    return dict(sorted(partitions.items()))
+
+
+def create_default_partition(table, using="default"):
+    qn = connections[using].ops.quote_name
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {qn(default_partition_name(table))} "
+            f"PARTITION OF {qn(table)} DEFAULT"
+        )
+
+
+def create_partition(table, column, month, using="default"):
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    name = partition_name(table, month)
+    default = default_partition_name(table)
+    lower, upper = _bound(month), _bound(add_months(month, 1))
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {qn(name)} "
+            f"(LIKE {qn(table)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+        # Rows of this month that fell into the default partition must be moved
+        # out first, otherwise attaching the new partition fails.
+        if _table_exists(cursor, default):
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {qn(default)} "
+                f"WHERE {qn(column)} >= %s AND {qn(column)} < %s RETURNING *) "
+                f"INSERT INTO {qn(name)} SELECT * FROM moved",
+                [lower, upper],
+            )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} "
+            f"FOR VALUES FROM ('{lower}') TO ('{upper}')"
+        )
+    return name
+
+
+def ensure_partitions(table, column, months_ahead=3, start=None, using="default"):
+    qn = connections[using].ops.quote_name
+    current = month_start(timezone.now())
+    months = set()
+
+    month = month_start(start) if start else current
+    while month <= add_months(current, months_ahead):
+        months.add(month)
+        month = add_months(month, 1)
+
+    with connections[using].cursor() as cursor:
+        default = default_partition_name(table)
+        if _table_exists(cursor, default):
+            cursor.execute(
+                f"SELECT DISTINCT date_trunc('month', {qn(column)} AT TIME ZONE 'UTC') "
+                f"FROM {qn(default)}"
+            )
+            months.update(month_start(row[0]) for row in cursor.fetchall())
+
+    existing = list_partitions(table, using)
+    return [
+        create_partition(table, column, month, using)
+        for month in sorted(months)
+        if month not in existing
+    ]
+
+
+def _dump_table(cursor, query, path):
+    with gzip.open(path, "wb") as archive:
+        cursor.copy_expert(
+            f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", archive
+        )
+
+
+def archive_partitions(
+    table,
+    before,
+    keep_condition=None,
+    archive_dir=None,
+    tablespace=None,
+    related=(),
+    drop=False,
+    using="default",
+):
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    archived = []
+
+    for month, name in list_partitions(table, using).items():
+        if add_months(month, 1) > before:
+            continue
+
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(f"LOCK TABLE {qn(name)} IN SHARE MODE")
+            if keep_condition:
+                cursor.execute(
+                    f"SELECT EXISTS (SELECT 1 FROM {qn(name)} WHERE {keep_condition})"
+                )
+                if cursor.fetchone()[0]:
+                    continue
+
+            cursor.execute(f"ALTER TABLE {qn(table)} DETACH PARTITION {qn(name)}")
+
+            if archive_dir:
+                _dump_table(
+                    cursor,
+                    f"SELECT * FROM {qn(name)}",
+                    os.path.join(archive_dir, f"{name}.csv.gz"),
+                )
+                for related_table, column in related:
+                    condition = f"{qn(column)} IN (SELECT id FROM {qn(name)})"
+                    _dump_table(
+                        cursor,
+                        f"SELECT * FROM {qn(related_table)} WHERE {condition}",
+                        os.path.join(archive_dir, f"{name}_{related_table}.csv.gz"),
+                    )
+                    cursor.execute(f"DELETE FROM {qn(related_table)} WHERE {condition}")
+                cursor.execute(f"DROP TABLE {qn(name)}")
+            elif tablespace:
+                cursor.execute(
+                    f"ALTER TABLE {qn(name)} SET TABLESPACE {qn(tablespace)}"
+                )
+            elif drop:
+                cursor.execute(f"DROP TABLE {qn(name)}")
+
+        archived.append(name)
+    return archived
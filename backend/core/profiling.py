@@ -0,0 +1,191 @@
+import datetime
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from core.permissions import IsAdminUser
+
+# Profiles are stored as collapsed stacks, one "frame;frame;frame count" line
+# per distinct stack with the outermost frame first, which flamegraph.pl and
+# speedscope read as they are. The file name carries what the list needs.
+NAME = re.compile(
+    r"^(?P<created>\d{8}T\d{12})_(?P<method>[a-z]+)_(?P<duration>\d+)ms_"
+    r"(?P<route>[\w.-]+)\.collapsed$"
+)
+
+
+def frame_name(frame):
+    return f"{frame.f_globals.get('__name__', '?')}:{frame.f_code.co_qualname}"
+
+
+class Sampler:
+    # Records the stack of one thread below `root` every `interval` seconds
+    # from a thread of its own. The profiled thread runs unchanged, unlike with
+    # sys.setprofile, but only gives up the GIL every few milliseconds
+    # (sys.getswitchinterval()), so shorter intervals add no samples.
+    def __init__(self, thread_id, interval, root=None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.root = root
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None and frame is not self.root:
+                frames.append(frame_name(frame))
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def collapsed(self):
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+def profile_dir():
+    return settings.PROFILE_DIR
+
+
+def save(route, method, duration, content):
+    directory = profile_dir()
+    os.makedirs(directory, exist_ok=True)
+    name = "{:%Y%m%dT%H%M%S%f}_{}_{}ms_{}.collapsed".format(
+        timezone.now(),
+        method.lower(),
+        round(duration * 1000),
+        re.sub(r"[^\w.-]", ".", route),
+    )
+    path = os.path.join(directory, name)
+    with open(path + ".tmp", "w") as file:
+        file.write(content)
+    os.replace(path + ".tmp", path)
+    prune(directory)
+    return name
+
+
+def prune(directory):
+    # Keeps the newest PROFILE_KEEP profiles; names start with their time
+    names = sorted(name for name in os.listdir(directory) if NAME.match(name))
+    for name in names[: max(len(names) - settings.PROFILE_KEEP, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def profiles(route=None):
+    # The stored profiles, newest first
+    try:
+        names = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+    found = []
+    for name in sorted(names, reverse=True):
+        match = NAME.match(name)
+        if match is None or (route is not None and match["route"] != route):
+            continue
+        found.append(
+            {
+                "name": name,
+                "route": match["route"],
+                "method": match["method"].upper(),
+                "duration_ms": int(match["duration"]),
+                "created_at": datetime.datetime.strptime(
+                    match["created"], "%Y%m%dT%H%M%S%f"
+                ).replace(tzinfo=datetime.timezone.utc),
+            }
+        )
+    return found
+
+
+def profile_path(name):
+    # None for names that are not profiles, e.g. "../settings.py"
+    if not NAME.match(name):
+        return None
+    path = os.path.join(profile_dir(), name)
+    return path if os.path.isfile(path) else None
+
+
+def is_admin(request):
+    # Runs before the view: session users are known from
+    # AuthenticationMiddleware, token users are authenticated here the way the
+    # view will. Sessions are left out of that to keep the CSRF check, which
+    # reads the body, in the view.
+    if request.user.is_authenticated:
+        return IsAdminUser().has_permission(request, None)
+    authenticators = [
+        authentication()
+        for authentication in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+        if not issubclass(authentication, SessionAuthentication)
+    ]
+    try:
+        return IsAdminUser().has_permission(
+            Request(request, authenticators=authenticators), None
+        )
+    except APIException:
+        return False
+
+
+class ProfilingMiddleware:
+    # Samples the stacks of the requests that admins send with the
+    # PROFILE_HEADER header, and of PROFILE_SAMPLE_RATE of all requests, and
+    # saves them per route, see `profiles/`. Profiled admin requests get the
+    # name of their profile back in the same header. Other requests only pay
+    # for a header lookup, and a random number when sampling is on.
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        header = settings.PROFILE_HEADER
+        admin = bool(header) and request.headers.get(header) is not None
+        # The header of anyone else is ignored before anything is sampled
+        admin = admin and is_admin(request)
+        rate = settings.PROFILE_SAMPLE_RATE
+        sampled = rate > 0 and random.random() < rate
+        if not admin and not sampled:
+            return self.get_response(request)
+
+        sampler = Sampler(
+            threading.get_ident(), settings.PROFILE_INTERVAL, sys._getframe()
+        )
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            sampler.stop()
+        duration = time.perf_counter() - started
+
+        match = request.resolver_match
+        name = save(
+            match.view_name if match else "unresolved",
+            request.method,
+            duration,
+            sampler.collapsed(),
+        )
+        if admin:
+            response[header] = name
+        return response
@@ -0,0 +1,221 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Literals and placeholders become "?", lists of them "(...)", so statements
+# that differ only in their values share a fingerprint
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%s|%\(\w+\)s")
+LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*")
+SPACE = re.compile(r"\s+")
+
+UPSERT = """
+INSERT INTO core_slowquery AS q
+    (fingerprint, database, sql, calls, total_ms, max_ms, view, frame,
+     first_seen, last_seen, plan, plan_at)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+ON CONFLICT (fingerprint) DO UPDATE SET
+    database = EXCLUDED.database,
+    calls = q.calls + EXCLUDED.calls,
+    total_ms = q.total_ms + EXCLUDED.total_ms,
+    max_ms = greatest(q.max_ms, EXCLUDED.max_ms),
+    view = EXCLUDED.view,
+    frame = EXCLUDED.frame,
+    last_seen = EXCLUDED.last_seen,
+    plan = coalesce(EXCLUDED.plan, q.plan),
+    plan_at = coalesce(EXCLUDED.plan_at, q.plan_at)
+"""
+
+_local = threading.local()
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def normalize(sql):
+    sql = LITERALS.sub("?", sql)
+    sql = LISTS.sub("(...)", sql)
+    return SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(sql):
+    normalized = normalize(sql)
+    return hashlib.md5(normalized.encode()).hexdigest()[:16], normalized
+
+
+def caller():
+    # The innermost frame of this app's code that led to the statement
+    frame = sys._getframe()
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith("core.") and module != __name__:
+            return f"{module}:{frame.f_code.co_qualname}:{frame.f_lineno}"
+        frame = frame.f_back
+    return ""
+
+
+class Recorder:
+    # Collects the slow statements of one process and writes them to
+    # SlowQuery from a background thread every SLOW_QUERY_FLUSH_INTERVAL
+    # seconds, together with the EXPLAIN output of a sample: each fingerprint
+    # is explained at most every SLOW_QUERY_EXPLAIN_INTERVAL seconds.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.explains = []
+        self.explained = {}
+        self.thread = None
+        self.pid = os.getpid()
+
+    def record(self, alias, sql, params, many, duration):
+        key, normalized = fingerprint(sql)
+        now = time.monotonic()
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                entry = self.pending[key] = {
+                    "database": alias,
+                    "sql": normalized,
+                    "calls": 0,
+                    "total_ms": 0,
+                    "max_ms": 0,
+                    "first_seen": timezone.now(),
+                }
+            entry["calls"] += 1
+            entry["total_ms"] += duration
+            entry["max_ms"] = max(entry["max_ms"], duration)
+            entry["view"] = getattr(_local, "view", "")
+            entry["frame"] = caller()
+            entry["last_seen"] = timezone.now()
+
+            last = self.explained.get(key)
+            interval = settings.SLOW_QUERY_EXPLAIN_INTERVAL
+            if not many and (last is None or now - last >= interval):
+                self.explained[key] = now
+                self.explains.append((key, alias, sql, params))
+
+        if self.thread is None and settings.SLOW_QUERY_FLUSH_INTERVAL > 0:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(
+                        target=self.run, name="querylog", daemon=True
+                    )
+                    self.thread.start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.SLOW_QUERY_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not save slow queries")
+            finally:
+                connections.close_all()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            explains, self.explains = self.explains, []
+        if not pending:
+            return 0
+
+        _local.quiet = True
+        try:
+            plans = {
+                key: explain(alias, sql, params) for key, alias, sql, params in explains
+            }
+            explained_at = timezone.now()
+            with connections["default"].cursor() as cursor:
+                cursor.executemany(
+                    UPSERT,
+                    [
+                        (
+                            key,
+                            entry["database"],
+                            entry["sql"],
+                            entry["calls"],
+                            entry["total_ms"],
+                            entry["max_ms"],
+                            entry["view"][:200],
+                            entry["frame"][:300],
+                            entry["first_seen"],
+                            entry["last_seen"],
+                            plans.get(key),
+                            explained_at if key in plans else None,
+                        )
+                        for key, entry in sorted(pending.items())
+                    ],
+                )
+        finally:
+            _local.quiet = False
+        return len(pending)
+
+
+def explain(alias, sql, params):
+    # Reads are run again with EXPLAIN ANALYZE in a transaction that is rolled
+    # back, with a time limit; writes are only planned, never run twice
+    analyze = sql.lstrip().upper().startswith("SELECT")
+    command = "EXPLAIN (ANALYZE, BUFFERS)" if analyze else "EXPLAIN"
+    try:
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('statement_timeout', %s, true)",
+                [str(settings.SLOW_QUERY_EXPLAIN_TIMEOUT)],
+            )
+            cursor.execute(f"{command} {sql}", params)
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+            transaction.set_rollback(True, using=alias)
+    except DatabaseError as exc:
+        plan = f"EXPLAIN failed: {exc}"
+    return plan
+
+
+def recorder():
+    # Threads do not survive a fork, so every process gets its own recorder
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None or _recorder.pid != os.getpid():
+            _recorder = Recorder()
+        return _recorder
+
+
+def log_slow_queries(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - started) * 1000
+        threshold = settings.SLOW_QUERY_MS
+        if threshold and duration >= threshold and not getattr(_local, "quiet", False):
+            recorder().record(context["connection"].alias, sql, params, many, duration)
+
+
+def install(sender, connection, **kwargs):
+    # connection_created: the wrapper goes first, so it also times the other
+    # wrappers and stays when they remove themselves
+    if log_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, log_slow_queries)
+
+
+class QueryLogMiddleware:
+    # Names the view of the request for the statements it runs
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            return self.get_response(request)
+        finally:
+            _local.view = ""
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _local.view = request.resolver_match.view_name
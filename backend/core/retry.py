@@ -0,0 +1,99 @@
+import functools
+import logging
+import random
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+# SQLSTATE codes of errors where rolling back and running the transaction
+# again may succeed
+RETRYABLE = {
+    "40P01": "deadlock",
+    "40001": "serialization",
+}
+
+_counters = Counter()
+_counters_lock = threading.Lock()
+
+
+class ConflictRetriesExhausted(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "The request kept conflicting with concurrent updates, try again."
+    default_code = "conflict"
+
+
+def _count(*keys):
+    with _counters_lock:
+        _counters.update(keys)
+
+
+def retry_stats():
+    # Transactions run, retries per error and transactions given up on, summed
+    # over the threads of this process
+    with _counters_lock:
+        return dict(_counters)
+
+
+def retryable_error(exc):
+    return RETRYABLE.get(getattr(exc.__cause__, "pgcode", None))
+
+
+def backoff(attempt):
+    # Full jitter: a random delay up to an exponentially growing cap
+    cap = min(settings.DB_RETRY_MAX_DELAY, settings.DB_RETRY_BASE_DELAY * 2**attempt)
+    return random.uniform(0, cap)
+
+
+def atomic_with_retry(func=None, *, using="default", attempts=None):
+    # Runs the function in its own transaction and runs it again when the
+    # transaction is chosen as a deadlock victim or fails serialization. Inside
+    # an outer transaction the error is raised unchanged, since only the
+    # outermost transaction can be retried.
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if connections[using].in_atomic_block:
+                with transaction.atomic(using=using):
+                    return func(*args, **kwargs)
+
+            tries = attempts or settings.DB_RETRY_ATTEMPTS
+            _count("transactions")
+            for attempt in range(tries):
+                try:
+                    with transaction.atomic(using=using):
+                        return func(*args, **kwargs)
+                except DatabaseError as exc:
+                    reason = retryable_error(exc)
+                    if reason is None:
+                        raise
+                    if attempt + 1 == tries:
+                        _count("exhausted")
+                        logger.error(
+                            "%s failed after %s attempts: %s",
+                            func.__qualname__,
+                            tries,
+                            reason,
+                        )
+                        raise ConflictRetriesExhausted() from exc
+                    _count(reason)
+                    delay = backoff(attempt)
+                    logger.warning(
+                        "%s hit a %s, retrying in %.3fs",
+                        func.__qualname__,
+                        reason,
+                        delay,
+                    )
+                    time.sleep(delay)
+
+        return wrapper
+
+    if func is not None:
+        return decorator(func)
+    return decorator
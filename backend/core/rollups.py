@@ -0,0 +1,103 @@
+from decimal import Decimal
+
+from django.db import connections, transaction
+from django.db.models import Sum
+
+from core import sharding
+from core.models import DailySalesRollup, HourlySalesRollup, Product
+
+GRANULARITIES = {
+    "day": (DailySalesRollup, "day"),
+    "hour": (HourlySalesRollup, "hour"),
+}
+
+GROUP_BY_FIELDS = {
+    "product": "product_id",
+    "sale_point": "sale_point_id",
+    "factory": "factory_id",
+    "status": "status",
+}
+
+REBUILD_SQL = """
+INSERT INTO {table} ({bucket}, sale_point_id, product_id, factory_id, status, orders, quantity)
+SELECT {expression}, sale_point_id, product_id, factory_id, status, count(*), sum(quantity)
+FROM core_productorder
+WHERE order_date >= %s
+GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def rebuild_rollups(since):
+    # Orders from detached partitions are gone from core_productorder, so only
+    # the buckets starting at `since` are recomputed, on every shard.
+    for alias in sharding.shards():
+        rebuild_shard_rollups(since, alias)
+
+
+def rebuild_shard_rollups(since, using):
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute("LOCK TABLE core_productorder IN SHARE MODE")
+        for table, bucket, expression in [
+            (
+                DailySalesRollup._meta.db_table,
+                "day",
+                "(order_date AT TIME ZONE 'UTC')::date",
+            ),
+            (
+                HourlySalesRollup._meta.db_table,
+                "hour",
+                "date_trunc('hour', order_date, 'UTC')",
+            ),
+        ]:
+            cursor.execute(f"DELETE FROM {table} WHERE {bucket} >= %s", [since])
+            cursor.execute(
+                REBUILD_SQL.format(table=table, bucket=bucket, expression=expression),
+                [since],
+            )
+
+
+def sales_report(start, end, granularity="day", group_by=(), scope=None):
+    # Sums the rollups of every shard per bucket and group. Products live in
+    # the default database, so revenue is added up here from their prices.
+    model, bucket = GRANULARITIES[granularity]
+    fields = [bucket] + [GROUP_BY_FIELDS[name] for name in group_by]
+
+    def shard_rows(alias):
+        queryset = model.objects.using(alias).filter(
+            **{f"{bucket}__gte": start, f"{bucket}__lt": end}
+        )
+        if scope is not None:
+            queryset = queryset.filter(scope)
+        return list(
+            queryset.values_list(*fields, "product_id")
+            .annotate(order_count=Sum("orders"), units=Sum("quantity"))
+            .order_by()
+        )
+
+    rows = [row for rows in sharding.gather(shard_rows) for row in rows]
+    prices = dict(
+        Product.objects.filter(id__in={row[-3] for row in rows}).values_list(
+            "id", "price"
+        )
+    )
+
+    totals = {}
+    for *key, product_id, order_count, units in rows:
+        total = totals.setdefault(tuple(key), [0, 0, Decimal("0.00")])
+        total[0] += order_count
+        total[1] += units
+        total[2] += units * prices[product_id]
+
+    return [
+        {
+            **dict(zip(fields, key)),
+            "order_count": order_count,
+            "units": units,
+            "revenue": revenue,
+        }
+        for key, (order_count, units, revenue) in sorted(
+            totals.items(),
+            key=lambda item: [(value is None, value) for value in item[0]],
+        )
+        if order_count > 0
+    ]
@@ -0,0 +1,95 @@
+import functools
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import Count, Exists, F, OuterRef, Q
+from django.db.models.functions import Length
+
+from core.models import FactoryWarehouse
+
+# Must match the configuration used by the triggers in migration 0021. The
+# simple configuration does not stem, so it works for names in any language
+# and keeps prefix matches predictable.
+CONFIG = "simple"
+
+WORD = re.compile(r"[^\W_]+")
+
+
+def terms(text):
+    return WORD.findall(text.lower())
+
+
+@functools.cache
+def trigram_available():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+        )
+        return cursor.fetchone()[0]
+
+
+def in_stock():
+    return Exists(FactoryWarehouse.objects.in_stock().filter(product=OuterRef("pk")))
+
+
+def matching(queryset, text):
+    query = SearchQuery(text, search_type="websearch", config=CONFIG)
+    matches = Q(search_vector=query)
+    rank = SearchRank(F("search_vector"), query)
+    if trigram_available():
+        # `name %> text` is served by the trigram index and tolerates typos
+        matches |= Q(name__trigram_word_similar=text)
+        rank = rank + TrigramWordSimilarity(text, "name")
+    return queryset.filter(matches).annotate(rank=rank, in_stock=in_stock())
+
+
+def facets(queryset, categories=None, available=None):
+    # Each facet is counted with the other facet's filter applied, so picking a
+    # category still shows the counts of the other categories
+    by_category = queryset.order_by()
+    if available is not None:
+        by_category = by_category.filter(in_stock=available)
+    by_availability = queryset.order_by()
+    if categories:
+        by_availability = by_availability.filter(category__in=categories)
+
+    availability = by_availability.aggregate(
+        in_stock=Count("id", filter=in_stock()), total=Count("id")
+    )
+    return {
+        "categories": [
+            {
+                "id": row["category"],
+                "name": row["category__name"],
+                "count": row["count"],
+            }
+            for row in by_category.values("category", "category__name")
+            .annotate(count=Count("id"))
+            .order_by("-count", "category__name")
+        ],
+        "availability": {
+            "in_stock": availability["in_stock"],
+            "out_of_stock": availability["total"] - availability["in_stock"],
+        },
+    }
+
+
+def autocomplete(queryset, text, limit):
+    words = terms(text)
+    if not words:
+        return []
+    # Every word must be a word of the product name, the last one may still be
+    # incomplete. Shorter names are the closer completions.
+    query = " & ".join([f"'{word}':A" for word in words[:-1]] + [f"'{words[-1]}':*A"])
+    return list(
+        queryset.filter(
+            search_vector=SearchQuery(query, search_type="raw", config=CONFIG)
+        )
+        .order_by(Length("name"), "name", "id")
+        .values("id", "name")[:limit]
+    )
@@ -3,8 +3,20 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.models import Group
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from rest_framework import serializers
 
+from core import stock
+from core.availability import can_reserve
+from core.fastpath import (
+    Field,
+    RowSerializer,
+    datetime_to_representation,
+    decimal_to_representation,
+)
+
 from core.models import (
     Factory,
     Product,
@@ -14,6 +26,13 @@ from core.models import (
     SalePoint,
     Carrier,
     Delivery,
+    DeliveryPosition,
+    DemandForecast,
+    ReorderThreshold,
+    SlowQuery,
+    StockAlert,
+    StockMovement,
+    TrackingEvent,
 )
 
 ExtendedUser = get_user_model()
@@ -147,18 +166,54 @@ class ProductSerializer(serializers.HyperlinkedModelSerializer):
         fields = ["id", "name", "price", "category_id", "weight", "description"]
 
 
+class ProductCategoryRowSerializer(RowSerializer):
+    fields = {
+        "id": Field("id"),
+        "name": Field("name"),
+        "description": Field("description"),
+    }
+
+
+class ProductRowSerializer(RowSerializer):
+    fields = {
+        "id": Field("id"),
+        "name": Field("name"),
+        "price": Field("price", decimal_to_representation),
+        "category_id": Field("category_id"),
+        "weight": Field("weight", decimal_to_representation),
+        "description": Field("description"),
+    }
+
+
+class ProductSearchSerializer(ProductSerializer):
+    rank = serializers.FloatField()
+    in_stock = serializers.BooleanField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ["rank", "in_stock"]
+
+
 class FactorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Factory
         fields = ["id", "name", "address"]
 
 
+class FactoryRowSerializer(RowSerializer):
+    fields = {
+        "id": Field("id"),
+        "name": Field("name"),
+        "address": Field("address"),
+    }
+
+
 class FactoryWarehouseSerializer(serializers.ModelSerializer):
     product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
 
     class Meta:
         model = FactoryWarehouse
-        fields = ["product", "quantity"]
+        fields = ["product", "quantity", "version"]
+        read_only_fields = ["version"]
 
     def validate_quantity(self, value):
         if value < 0:
@@ -168,14 +223,61 @@ class FactoryWarehouseSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         factory = self.context["factory"]  # Получаем фабрику из контекста
         validated_data["factory"] = factory
-        return super().create(validated_data)
+        quantity = validated_data.get("quantity", 0)
+        with transaction.atomic():
+            # There is one row per factory and product, possibly emptied earlier
+            # and not compacted yet; posting a count restocks it
+            instance = (
+                FactoryWarehouse.objects.select_for_update()
+                .filter(factory=factory, product=validated_data["product"])
+                .first()
+            )
+            if instance is None:
+                instance = super().create(validated_data)
+            else:
+                instance.quantity += quantity
+                instance.save(update_fields=["quantity"])
+                instance.refresh_from_db(fields=["version"])
+            if quantity:
+                StockMovement.record(
+                    factory.id, instance.product_id, "restock", quantity
+                )
+        return instance
 
     def update(self, instance, validated_data):
-        instance.quantity = validated_data.get("quantity", instance.quantity)
-        instance.save()
+        # Compare-and-swap against context["version"] when the client sent
+        # one, see stock.set_counts
+        quantity = validated_data.get("quantity", instance.quantity)
+        versions = stock.set_counts(
+            instance.factory_id,
+            {instance.product_id: (quantity, self.context.get("version"))},
+        )
+        instance.quantity = quantity
+        instance.version = versions[instance.product_id]
         return instance
 
 
+class FactoryWarehouseRowSerializer(RowSerializer):
+    fields = {
+        "product": Field("product_id"),
+        "quantity": Field("quantity"),
+        "version": Field("version"),
+    }
+
+
+class ProductCountSerializer(serializers.Serializer):
+    # One row of a stock sync; with a version the row is only written if it
+    # has not changed since the client read it
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField()
+    version = serializers.IntegerField(required=False, allow_null=True)
+
+    def validate_quantity(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Quantity cannot be negative.")
+        return value
+
+
 class ProductOrderSerializer(serializers.ModelSerializer):
     factory_id = serializers.SerializerMethodField()
 
@@ -193,21 +295,54 @@ class ProductOrderSerializer(serializers.ModelSerializer):
         ]
 
     def get_factory_id(self, obj):
+        if obj.factory_id:
+            return obj.factory_id
         factory_warehouse = FactoryWarehouse.objects.filter(product=obj.product).first()
         if factory_warehouse:
             return factory_warehouse.factory.id
         return None
 
 
+class ProductOrderRowSerializer(RowSerializer):
+    fields = {
+        "id": Field("id"),
+        "product_id": Field("product_id"),
+        "quantity": Field("quantity"),
+        "order_date": Field("order_date", datetime_to_representation),
+        "status": Field("status"),
+        # Same fallback as ProductOrderSerializer.get_factory_id
+        "factory_id": Field(
+            Coalesce(
+                "factory_id",
+                Subquery(
+                    FactoryWarehouse.objects.filter(product=OuterRef("product"))
+                    .order_by("id")
+                    .values("factory_id")[:1]
+                ),
+                output_field=models.BigIntegerField(),
+            )
+        ),
+        "sale_point_id": Field("sale_point_id"),
+        "delivery_cost": Field("delivery_cost", decimal_to_representation),
+    }
+
+
 class CreateOrderSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField()
 
     def validate(self, data):
-        product = Product.objects.get(id=data["product_id"])
+        product = Product.objects.filter(id=data["product_id"]).first()
         if not product:
             raise serializers.ValidationError("Product does not exist.")
 
+        if data["quantity"] <= 0:
+            raise serializers.ValidationError("Quantity must be positive.")
+        if not can_reserve(product.id, data["quantity"]):
+            raise serializers.ValidationError(
+                "Insufficient product quantity in the factory warehouse."
+            )
+
         sale_point = self.context["request"].user.sale_points.first()
         if not sale_point:
             raise serializers.ValidationError(
@@ -224,7 +359,7 @@ class CreateOrderSerializer(serializers.Serializer):
         quantity = validated_data["quantity"]
         sale_point = validated_data["sale_point"]
 
-        order = sale_point.create_order(product, quantity)
+        order = ProductOrder.create_order(ProductOrder, product, quantity, sale_point)
 
         return order
 
@@ -235,12 +370,35 @@ class SalePointSerializer(serializers.ModelSerializer):
         fields = ["id", "name", "address"]
 
 
+class SalePointRowSerializer(RowSerializer):
+    fields = {
+        "id": Field("id"),
+        "name": Field("name"),
+        "address": Field("address"),
+    }
+
+
 class ProductsWithQuantitySerializer(serializers.Serializer):
     product = ProductSerializer()
     factory_id = serializers.IntegerField(source="factory.id")
     quantity = serializers.IntegerField()
 
 
+class ProductsWithQuantityRowSerializer(RowSerializer):
+    fields = {
+        "product": {
+            "id": Field("product_id"),
+            "name": Field("product__name"),
+            "price": Field("product__price", decimal_to_representation),
+            "category_id": Field("product__category_id"),
+            "weight": Field("product__weight", decimal_to_representation),
+            "description": Field("product__description"),
+        },
+        "factory_id": Field("factory_id"),
+        "quantity": Field("quantity"),
+    }
+
+
 class CarrierSerializer(serializers.ModelSerializer):
     class Meta:
         model = Carrier
@@ -251,3 +409,92 @@ class DeliverySerializer(serializers.ModelSerializer):
     class Meta:
         model = Delivery
         fields = ["id", "carrier", "delivery_cost", "date", "priority"]
+
+
+class TrackingEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TrackingEvent
+        fields = ["status", "latitude", "longitude", "recorded_at"]
+
+
+class DeliveryPositionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeliveryPosition
+        fields = ["delivery", "status", "latitude", "longitude", "recorded_at"]
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockMovement
+        fields = ["id", "product", "kind", "delta", "order", "created_at"]
+
+
+class ReorderThresholdSerializer(serializers.ModelSerializer):
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+
+    class Meta:
+        model = ReorderThreshold
+        fields = ["product", "threshold", "reorder_quantity", "alerted"]
+        read_only_fields = ["alerted"]
+
+
+class StockAlertSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockAlert
+        fields = [
+            "id",
+            "product",
+            "kind",
+            "quantity",
+            "threshold",
+            "reorder_quantity",
+            "created_at",
+        ]
+
+
+class DemandForecastSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DemandForecast
+        fields = [
+            "id",
+            "product",
+            "factory",
+            "sale_point",
+            "generated_at",
+            "start",
+            "daily",
+            "total",
+            "sigma",
+            "lead_time_demand",
+            "safety_stock",
+            "reorder_point",
+        ]
+
+
+class SlowQuerySerializer(serializers.ModelSerializer):
+    mean_ms = serializers.SerializerMethodField()
+
+    class Meta:
+        model = SlowQuery
+        fields = [
+            "id",
+            "fingerprint",
+            "database",
+            "sql",
+            "calls",
+            "total_ms",
+            "mean_ms",
+            "max_ms",
+            "view",
+            "frame",
+            "first_seen",
+            "last_seen",
+        ]
+
+    def get_mean_ms(self, obj):
+        return obj.total_ms / obj.calls if obj.calls else 0
+
+
+class SlowQueryDetailSerializer(SlowQuerySerializer):
+    class Meta(SlowQuerySerializer.Meta):
+        fields = SlowQuerySerializer.Meta.fields + ["plan", "plan_at"]
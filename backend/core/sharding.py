@@ -0,0 +1,304 @@
+import contextlib
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import CASCADE, SET_NULL, Count, ProtectedError
+from django.db.models.deletion import get_candidate_relations_to_delete
+
+# Product orders are spread over the databases in settings.ORDER_SHARDS by sale
+# point. The default database is the first shard and holds everything else,
+# including the map of sale points to shards (SalePointShard). Order ids are
+# allocated from a separate block per shard, so an id alone tells which shard
+# holds the order; a shard's position in ORDER_SHARDS must therefore never
+# change.
+ID_BLOCK = 2**40
+
+# Models whose rows live on the shard of their sale point. The delivery links
+# follow their order and the rollups are written by triggers on the orders.
+SHARDED = {
+    "core.productorder",
+    "core.productorder_deliveries",
+    "core.dailysalesrollup",
+    "core.hourlysalesrollup",
+}
+
+_placements = {}
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def shards():
+    return settings.ORDER_SHARDS
+
+
+def order_shard(order_id):
+    try:
+        index = int(order_id) // ID_BLOCK
+    except (TypeError, ValueError):
+        return DEFAULT_DB_ALIAS
+    if 0 <= index < len(shards()):
+        return shards()[index]
+    return DEFAULT_DB_ALIAS
+
+
+def placements(sale_point_ids):
+    # {sale point id: shard}. A sale point seen for the first time is placed
+    # on the shard with the fewest sale points, so new shards take the new
+    # load. Placements are cached per process once committed; moving a sale
+    # point means moving its rows and restarting the workers.
+    from core.models import SalePointShard
+
+    sale_point_ids = set(sale_point_ids)
+    if len(shards()) == 1:
+        return dict.fromkeys(sale_point_ids, DEFAULT_DB_ALIAS)
+
+    found = {id: _placements[id] for id in sale_point_ids if id in _placements}
+    missing = sale_point_ids - found.keys()
+    if missing:
+        found.update(
+            SalePointShard.objects.using(DEFAULT_DB_ALIAS)
+            .filter(sale_point_id__in=missing)
+            .values_list("sale_point_id", "database")
+        )
+    for sale_point_id in sorted(sale_point_ids - found.keys()):
+        counts = dict(
+            SalePointShard.objects.using(DEFAULT_DB_ALIAS)
+            .values_list("database")
+            .annotate(Count("pk"))
+        )
+        placement, _ = SalePointShard.objects.using(DEFAULT_DB_ALIAS).get_or_create(
+            sale_point_id=sale_point_id,
+            defaults={
+                "database": min(shards(), key=lambda alias: counts.get(alias, 0))
+            },
+        )
+        found[sale_point_id] = placement.database
+
+    fresh = {id: found[id] for id in missing}
+    transaction.on_commit(lambda: _placements.update(fresh), using=DEFAULT_DB_ALIAS)
+    return found
+
+
+def shard_for(sale_point_id):
+    return placements([sale_point_id])[sale_point_id]
+
+
+def shards_for(sale_point_ids):
+    # The shards holding the orders of these sale points, in shard order
+    used = set(placements(sale_point_ids).values())
+    return [alias for alias in shards() if alias in used]
+
+
+@contextlib.contextmanager
+def atomic(aliases):
+    # One transaction per shard, committed in reverse order when the block
+    # ends. Without two-phase commit a failure between two commits leaves the
+    # earlier one in place, so callers commit the shards before the database
+    # holding the stock they account for.
+    with contextlib.ExitStack() as stack:
+        for alias in aliases:
+            stack.enter_context(transaction.atomic(using=alias))
+        yield
+
+
+def _executor_for_process():
+    # Pool threads do not survive a fork, e.g. gunicorn workers forked after
+    # the application was preloaded
+    global _executor, _executor_pid
+    with _executor_lock:
+        if _executor is None or _executor_pid != os.getpid():
+            _executor = ThreadPoolExecutor(
+                settings.ORDER_SHARD_THREADS, thread_name_prefix="shard"
+            )
+            _executor_pid = os.getpid()
+        return _executor
+
+
+def _call(func, alias):
+    # Pool threads outlive requests, so their connections are recycled the way
+    # Django does at the start of a request
+    connections[alias].close_if_unusable_or_obsolete()
+    return func(alias)
+
+
+def gather(func, aliases=None):
+    # Calls func(alias) for every shard, concurrently from a thread pool, and
+    # returns the results in shard order. While a transaction is open on one
+    # of the shards everything runs on the calling thread, since only its
+    # connection sees the transaction's rows.
+    aliases = list(shards() if aliases is None else aliases)
+    if len(aliases) < 2 or any(connections[alias].in_atomic_block for alias in aliases):
+        return [func(alias) for alias in aliases]
+    executor = _executor_for_process()
+    return list(executor.map(_call, itertools.repeat(func), aliases))
+
+
+class Scatter:
+    # The rows of one queryset per shard merged in `ordering` order, read as
+    # values_list() tuples of `fields`. Supports what pagination needs:
+    # count(), slicing and iteration. Every shard is asked for all rows up to
+    # the end of the slice, so deep pages cost more than on one database.
+    ordered = True
+
+    def __init__(self, querysets, fields, ordering, start=0, stop=None):
+        self.querysets = querysets
+        self.fields = list(fields)
+        self.ordering = list(ordering)
+        self.start = start
+        self.stop = stop
+        self._rows = None
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self.rows()[key]
+        start = self.start + (key.start or 0)
+        stop = self.stop
+        if key.stop is not None:
+            stop = (
+                self.start + key.stop
+                if stop is None
+                else min(stop, self.start + key.stop)
+            )
+        return Scatter(self.querysets, self.fields, self.ordering, start, stop)
+
+    def __iter__(self):
+        return iter(self.rows())
+
+    def __len__(self):
+        return len(self.rows())
+
+    def count(self):
+        def count(alias):
+            return self.querysets[alias].order_by()[: self.stop].count()
+
+        total = sum(gather(count, self.querysets))
+        if self.stop is not None:
+            total = min(total, self.stop)
+        return max(total - self.start, 0)
+
+    def rows(self):
+        if self._rows is None:
+            width = len(self.fields)
+            names = [name.lstrip("-") for name in self.ordering]
+
+            def fetch(alias):
+                queryset = self.querysets[alias].order_by(*self.ordering)
+                return list(queryset.values_list(*self.fields, *names)[: self.stop])
+
+            merged = heapq.merge(
+                *gather(fetch, self.querysets),
+                key=lambda row: row[width:],
+                reverse=self.ordering[0].startswith("-"),
+            )
+            self._rows = [
+                row[:width] for row in itertools.islice(merged, self.start, self.stop)
+            ]
+        return self._rows
+
+
+def shard_relations(model):
+    # Relations from rows of SHARDED models to rows of model. They span
+    # databases, so neither the database nor Django's delete collector, which
+    # only looks at the database it deletes from, enforces them on the other
+    # shards.
+    if model._meta.label_lower in SHARDED:
+        return []
+    return [
+        relation
+        for relation in get_candidate_relations_to_delete(model._meta)
+        if relation.related_model._meta.label_lower in SHARDED
+    ]
+
+
+def protect_on_shards(collector, field, sub_objs, using):
+    # on_delete=PROTECT for references from orders, checked on every shard
+    # rather than only on the database the delete runs on. Joins would look
+    # for the referenced rows on the shard, so they are dropped.
+    def find(alias):
+        return list(sub_objs.using(alias).select_related(None))
+
+    aliases = [using, *(alias for alias in shards() if alias != using)]
+    protected = [row for rows in gather(find, aliases) for row in rows]
+    if protected:
+        raise ProtectedError(
+            f"Cannot delete some instances of model "
+            f"'{field.remote_field.model.__name__}' because they are referenced "
+            f"through a protected foreign key: '{field.model.__name__}.{field.name}'",
+            protected,
+        )
+
+
+# Called even when no rows refer to the objects on the collector's database
+protect_on_shards.lazy_sub_objs = True
+
+
+def delete_shard_references(sender, instance, using, **kwargs):
+    # pre_delete: applies SET_NULL and CASCADE to the rows referring to
+    # instance from the other shards (protect_on_shards covers PROTECT). Runs
+    # before the delete on `using` commits, without two-phase commit, so a
+    # delete that fails afterwards leaves them changed.
+    aliases = [alias for alias in shards() if alias != using]
+    for relation in shard_relations(sender) if aliases else []:
+        for alias in aliases:
+            rows = relation.related_model._base_manager.using(alias).filter(
+                **{relation.field.name: instance}
+            )
+            if relation.on_delete is SET_NULL:
+                rows.update(**{relation.field.name: None})
+            elif relation.on_delete is CASCADE:
+                rows.delete()
+
+
+def reserve_id_block(using, **kwargs):
+    # post_migrate: starts a shard's order ids at the beginning of its block
+    if using not in shards() or shards().index(using) == 0:
+        return
+    start = shards().index(using) * ID_BLOCK
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT last_value FROM core_productorder_id_seq")
+        if cursor.fetchone()[0] < start:
+            cursor.execute(
+                "SELECT setval('core_productorder_id_seq', %s, false)", [start]
+            )
+
+
+class OrderShardRouter:
+    # Rows of SHARDED models are written to the shard of their sale point and
+    # read from the database their instance came from. Queries without an
+    # instance go to the default database; use .using() with the shard from
+    # order_shard() or shards_for(), or gather() over all shards.
+
+    def _db(self, model, instance):
+        if model._meta.label_lower not in SHARDED or instance is None:
+            return DEFAULT_DB_ALIAS
+        if instance._state.db:
+            return instance._state.db
+        sale_point_id = getattr(instance, "sale_point_id", None)
+        if sale_point_id is None:
+            return DEFAULT_DB_ALIAS
+        return shard_for(sale_point_id)
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints.get("instance"))
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints.get("instance"))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if {obj1._meta.label_lower, obj2._meta.label_lower} & SHARDED:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Every shard gets the full schema, so the order tables keep their
+        # partitions and triggers; only the shard map stays in one place
+        if app_label == "core" and model_name == "salepointshard":
+            return db == DEFAULT_DB_ALIAS
+        return None
@@ -0,0 +1,224 @@
+import datetime
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Sum
+from django.utils import timezone
+
+from core.alerts import stocks_changed
+from core.models import FactoryWarehouse, StockMovement, StockSnapshot
+from core.retry import atomic_with_retry
+
+
+def stock_at(factory_id, at):
+    taken_at = StockSnapshot.objects.filter(
+        factory_id=factory_id, taken_at__lte=at
+    ).aggregate(taken_at=Max("taken_at"))["taken_at"]
+
+    stock = {}
+    movements = StockMovement.objects.filter(factory_id=factory_id, created_at__lte=at)
+    if taken_at is not None:
+        stock.update(
+            StockSnapshot.objects.filter(
+                factory_id=factory_id, taken_at=taken_at
+            ).values_list("product_id", "quantity")
+        )
+        movements = movements.filter(created_at__gt=taken_at)
+
+    for product_id, delta in (
+        movements.values("product_id")
+        .annotate(delta=Sum("delta"))
+        .values_list("product_id", "delta")
+    ):
+        stock[product_id] = stock.get(product_id, 0) + delta
+    return stock
+
+
+def take_snapshot(factory_id, at=None):
+    # Movements get their timestamp before the transaction commits, so the
+    # snapshot lags behind to make sure no older movement is still in flight.
+    if at is None:
+        at = timezone.now() - datetime.timedelta(seconds=settings.STOCK_SNAPSHOT_LAG)
+
+    stock = stock_at(factory_id, at)
+    with transaction.atomic():
+        StockSnapshot.objects.filter(factory_id=factory_id, taken_at=at).delete()
+        StockSnapshot.objects.bulk_create(
+            StockSnapshot(
+                factory_id=factory_id,
+                product_id=product_id,
+                taken_at=at,
+                quantity=quantity,
+            )
+            for product_id, quantity in stock.items()
+        )
+    return at
+
+
+def reconcile(factory_id):
+    ledger = stock_at(factory_id, timezone.now())
+    actual = dict(
+        FactoryWarehouse.objects.filter(factory_id=factory_id)
+        .values("product_id")
+        .annotate(quantity=Sum("quantity"))
+        .values_list("product_id", "quantity")
+    )
+    return {
+        product_id: (ledger.get(product_id, 0), actual.get(product_id, 0))
+        for product_id in ledger.keys() | actual.keys()
+        if ledger.get(product_id, 0) != actual.get(product_id, 0)
+    }
+
+
+COMPACT_SQL = """
+DELETE FROM core_factorywarehouse
+WHERE id IN (
+    SELECT id FROM core_factorywarehouse
+    WHERE quantity = 0
+    ORDER BY id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+)
+"""
+
+
+def compact_warehouse(batch_size=1000, pause=0):
+    # Deletes empty warehouse rows in short transactions of at most
+    # `batch_size` rows. Rows locked by a running stock sync or reservation are
+    # skipped and picked up by a later run.
+    deleted = 0
+    while True:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(COMPACT_SQL, [batch_size])
+            count = cursor.rowcount
+        deleted += count
+        if count < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+class StockConflict(Exception):
+    # Raised with the current {"product", "quantity", "version"} of the rows
+    # that changed since the client read them
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.rows = rows
+
+
+def current(row):
+    return {"product": row.product_id, "quantity": row.quantity, "version": row.version}
+
+
+SWAP_SQL = """
+UPDATE core_factorywarehouse AS warehouse
+SET quantity = input.quantity
+FROM unnest(%s::bigint[], %s::integer[], %s::integer[])
+    AS input(id, quantity, version)
+WHERE warehouse.id = input.id AND warehouse.version = input.version
+RETURNING warehouse.product_id, warehouse.version
+"""
+
+
+@atomic_with_retry
+def _swap(factory_id, changes):
+    # Writes [(row, quantity)] if none of the rows changed since they were
+    # read, with one UPDATE, and records the differences. Returns the new
+    # versions or None, having written nothing, if a row was changed.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            SWAP_SQL,
+            [
+                [row.id for row, _ in changes],
+                [quantity for _, quantity in changes],
+                [row.version for row, _ in changes],
+            ],
+        )
+        versions = dict(cursor.fetchall())
+    if len(versions) < len(changes):
+        transaction.set_rollback(True)
+        return None
+
+    StockMovement.objects.bulk_create(
+        StockMovement(
+            factory_id=factory_id,
+            product_id=row.product_id,
+            kind="adjustment",
+            delta=quantity - row.quantity,
+        )
+        for row, quantity in changes
+    )
+    stocks_changed((factory_id, row.product_id) for row, _ in changes)
+    return versions
+
+
+def set_counts(factory_id, counts):
+    # Sets the factory's counts, given as {product id: (quantity, version)},
+    # with compare-and-swap instead of row locks held across the request, so a
+    # stock sync never blocks reservations for longer than one UPDATE. A row
+    # is only written while it still has the given version; rows without one
+    # are written at the version read just before and read again if they were
+    # changed meanwhile. Either every row is written or none, raising
+    # StockConflict for stale versions and FactoryWarehouse.DoesNotExist for
+    # products the factory has no row for. Returns {product id: version}.
+    attempts = settings.DB_RETRY_ATTEMPTS
+    for attempt in range(attempts):
+        rows = {
+            row.product_id: row
+            for row in FactoryWarehouse.objects.filter(
+                factory_id=factory_id, product_id__in=list(counts)
+            )
+        }
+        missing = [product_id for product_id in counts if product_id not in rows]
+        if missing:
+            raise FactoryWarehouse.DoesNotExist(missing[0])
+        stale = [
+            current(rows[product_id])
+            for product_id, (_, version) in counts.items()
+            if version is not None and version != rows[product_id].version
+        ]
+        if stale:
+            raise StockConflict(stale)
+
+        changes = [
+            (rows[product_id], quantity)
+            for product_id, (quantity, _) in counts.items()
+            if quantity != rows[product_id].quantity
+        ]
+        versions = {product_id: row.version for product_id, row in rows.items()}
+        swapped = _swap(factory_id, changes) if changes else {}
+        if swapped is not None:
+            versions.update(swapped)
+            return versions
+
+    raise StockConflict(
+        [
+            current(row)
+            for row in FactoryWarehouse.objects.filter(
+                pk__in=[row.pk for row, _ in changes]
+            )
+        ]
+    )
+
+
+DELETE_SQL = """
+DELETE FROM core_factorywarehouse
+WHERE id = %s AND (%s::integer IS NULL OR version = %s)
+RETURNING quantity
+"""
+
+
+def delete_count(row, version=None):
+    # Deletes the row if it still has `version` (any version if None) and
+    # records the count it held when it was deleted
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(DELETE_SQL, [row.id, version, version])
+        deleted = cursor.fetchone()
+        if deleted is None:
+            row = FactoryWarehouse.objects.get(pk=row.pk)
+            raise StockConflict([current(row)])
+        if deleted[0]:
+            StockMovement.record(
+                row.factory_id, row.product_id, "adjustment", -deleted[0]
+            )
@@ -0,0 +1,186 @@
+import codecs
+import csv
+
+import psycopg2
+from django.conf import settings
+from django.db import connections, transaction
+
+from core.alerts import stocks_changed
+from core.retry import ConflictRetriesExhausted
+
+MODES = {
+    # mode: (new quantity of an existing row, ledger movement kind)
+    "set": ("EXCLUDED.quantity", "adjustment"),
+    "add": ("w.quantity + EXCLUDED.quantity", "restock"),
+}
+
+# Ids and quantities are cast only after matching these, so that a bad line is
+# reported instead of failing the statement
+PARSE = """
+CREATE TEMPORARY TABLE stock_import ON COMMIT DROP AS
+SELECT
+    line,
+    trim({product}) AS product,
+    CASE WHEN {product} ~ '^\\s*[0-9]{{1,18}}\\s*$'
+        THEN trim({product})::bigint END AS product_id,
+    CASE WHEN {quantity} ~ '^\\s*[0-9]{{1,10}}\\s*$' THEN
+        CASE WHEN trim({quantity})::bigint <= 2147483647
+            THEN trim({quantity})::integer END
+    END AS quantity
+FROM stock_import_raw
+"""
+
+# Line numbers count the header as line 1
+ERRORS = """
+SELECT line + 1, error FROM (
+    SELECT line,
+        CASE
+            WHEN product_id IS NULL THEN 'Product must be a product id.'
+            WHEN known IS NULL THEN 'Product ' || product || ' does not exist.'
+            WHEN first_line < line THEN
+                'Product ' || product || ' is already on line ' || first_line + 1 || '.'
+            WHEN quantity IS NULL THEN 'Quantity must be a non-negative integer.'
+        END AS error
+    FROM (
+        SELECT s.*, p.id AS known,
+            min(s.line) OVER (PARTITION BY s.product_id) AS first_line
+        FROM stock_import s
+        LEFT JOIN core_product p ON p.id = s.product_id
+    ) joined
+) checked
+WHERE error IS NOT NULL
+ORDER BY line
+LIMIT %s
+"""
+
+# The existing rows are locked in product order, as reservations lock them,
+# and read at their latest committed quantity, so the ledger deltas are taken
+# against the quantities the statement replaces. A row created by another
+# transaction while the statement runs is updated without having been read;
+# such rows are counted as "raced" and the statement is run again.
+MERGE = """
+WITH old AS (
+    SELECT w.product_id, w.quantity
+    FROM core_factorywarehouse w
+    JOIN stock_import USING (product_id)
+    WHERE w.factory_id = %(factory)s
+    ORDER BY w.product_id
+    FOR UPDATE OF w
+), merged AS (
+    INSERT INTO core_factorywarehouse AS w (factory_id, product_id, quantity, version)
+    SELECT %(factory)s, s.product_id, s.quantity, 0
+    FROM stock_import s
+    LEFT JOIN old USING (product_id)
+    -- Products without a row need none for a zero count
+    WHERE s.quantity > 0 OR old.product_id IS NOT NULL
+    ORDER BY s.product_id
+    ON CONFLICT (factory_id, product_id) DO UPDATE
+    SET quantity = {quantity}
+    WHERE w.quantity <> {quantity}
+    RETURNING w.product_id, w.quantity, w.xmax <> 0 AS updated
+), moved AS (
+    INSERT INTO core_stockmovement (factory_id, product_id, kind, delta, created_at)
+    SELECT %(factory)s, m.product_id, %(kind)s,
+        m.quantity - coalesce(old.quantity, 0), now()
+    FROM merged m
+    LEFT JOIN old USING (product_id)
+    WHERE m.quantity <> coalesce(old.quantity, 0)
+)
+SELECT
+    count(old.product_id),
+    count(*) - count(old.product_id),
+    coalesce(array_agg(m.product_id), '{{}}'),
+    count(*) FILTER (WHERE m.updated AND old.product_id IS NULL)
+FROM merged m
+LEFT JOIN old USING (product_id)
+"""
+
+
+class StockImportError(Exception):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+def read_header(stream):
+    # Reads the header line of a binary CSV stream and leaves the stream at the
+    # first data line, which COPY then reads directly
+    line = codecs.decode(stream.readline(), "utf-8-sig")
+    columns = [name.strip().lower() for name in next(csv.reader([line]), [])]
+    missing = [name for name in ["product", "quantity"] if name not in columns]
+    if missing:
+        raise StockImportError(
+            [{"line": 1, "error": f"Missing column {', '.join(missing)}."}]
+        )
+    return columns
+
+
+def copy_error(exc):
+    # e.g. "extra data after last expected column (line 12)"
+    message = exc.diag.message_primary or str(exc)
+    context = exc.diag.context or ""
+    if ", line " in context:
+        line = context.split(", line ", 1)[1].split(":")[0].split(",")[0]
+        if line.isdigit():
+            message = f"{message} (line {int(line) + 1})"
+    return message
+
+
+def import_stock(factory_id, stream, mode="set", using="default"):
+    # Streams a CSV with at least `product` and `quantity` columns into a
+    # temporary table with COPY, validates all lines with one query and merges
+    # them into the factory's warehouse rows with one statement that also
+    # writes the ledger. Nothing is written if any line is invalid.
+    quantity, kind = MODES[mode]
+    columns = read_header(stream)
+    staging = [f"c{index}" for index in range(len(columns))]
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE stock_import_raw "
+            f"(line bigserial, {', '.join(f'{name} text' for name in staging)}) "
+            f"ON COMMIT DROP"
+        )
+        try:
+            cursor.copy_expert(
+                f"COPY stock_import_raw ({', '.join(staging)}) "
+                f"FROM STDIN WITH (FORMAT csv, ENCODING 'UTF8')",
+                stream,
+            )
+        except psycopg2.DataError as exc:
+            raise StockImportError([{"error": copy_error(exc)}])
+        cursor.execute(
+            PARSE.format(
+                product=staging[columns.index("product")],
+                quantity=staging[columns.index("quantity")],
+            )
+        )
+        rows = cursor.rowcount
+        cursor.execute("ANALYZE stock_import")
+
+        cursor.execute(ERRORS, [settings.STOCK_IMPORT_MAX_ERRORS])
+        errors = [{"line": line, "error": error} for line, error in cursor.fetchall()]
+        if errors:
+            raise StockImportError(errors)
+
+        for attempt in range(settings.DB_RETRY_ATTEMPTS):
+            with transaction.atomic(using=using):
+                cursor.execute(
+                    MERGE.format(quantity=quantity),
+                    {"factory": factory_id, "kind": kind},
+                )
+                updated, created, products, raced = cursor.fetchone()
+                if raced:
+                    transaction.set_rollback(True, using=using)
+            if not raced:
+                break
+        else:
+            raise ConflictRetriesExhausted()
+        stocks_changed((factory_id, product_id) for product_id in products)
+
+    return {
+        "rows": rows,
+        "created": created,
+        "updated": updated,
+        "unchanged": rows - created - updated,
+    }
@@ -0,0 +1,152 @@
+import threading
+import time
+
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.admin import EstimatedCountPaginator, FactoryWarehouseAdmin
+from core.models import (
+    Factory,
+    FactoryWarehouse,
+    Product,
+    ProductOrder,
+    SalePoint,
+    StockMovement,
+)
+
+
+class AdminTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        self.rows = []
+        for index in range(3):
+            product = Product.objects.create(name=f"Product {index}", price=1, weight=1)
+            self.rows.append(
+                FactoryWarehouse.objects.create(
+                    factory=self.factory, product=product, quantity=5
+                )
+            )
+            ProductOrder.objects.create(
+                sale_point=self.sale_point,
+                product=product,
+                factory=self.factory,
+                quantity=1,
+                delivery_cost=1,
+            )
+        admin_user = get_user_model().objects.create_superuser(
+            username="admin", password="password"
+        )
+        self.client.force_login(admin_user)
+
+    def test_changelists_use_constant_queries(self):
+        for name in ["core_productorder", "core_factorywarehouse"]:
+            url = reverse(f"admin:{name}_changelist")
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+            ProductOrder.objects.create(
+                sale_point=self.sale_point,
+                product=self.rows[0].product,
+                quantity=1,
+                delivery_cost=1,
+            )
+            FactoryWarehouse.objects.create(
+                factory=self.factory,
+                product=Product.objects.create(name=name, price=1, weight=1),
+                quantity=1,
+            )
+            with self.assertNumQueries(len(queries)):
+                self.client.get(url)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=0)
+    def test_estimated_count(self):
+        paginator = EstimatedCountPaginator(
+            FactoryWarehouse.objects.filter(factory=self.factory), 10
+        )
+        self.assertGreater(paginator.count, 0)
+
+    def test_set_quantity_action_writes_movements(self):
+        response = self.client.post(
+            reverse("admin:core_factorywarehouse_changelist"),
+            {
+                "action": "set_quantity",
+                "index": 0,
+                "quantity": 2,
+                ACTION_CHECKBOX_NAME: [row.id for row in self.rows[:2]],
+            },
+        )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            sorted(FactoryWarehouse.objects.values_list("quantity", flat=True)),
+            [2, 2, 5],
+        )
+        self.assertEqual(
+            list(StockMovement.objects.values_list("kind", "delta")),
+            [("adjustment", -3), ("adjustment", -3)],
+        )
+
+    def test_mark_delivered_action(self):
+        orders = ProductOrder.objects.order_by("id")
+        self.client.post(
+            reverse("admin:core_productorder_changelist"),
+            {
+                "action": "mark_delivered",
+                "index": 0,
+                ACTION_CHECKBOX_NAME: [orders[0].id],
+            },
+        )
+
+        self.assertEqual(
+            list(orders.values_list("status", flat=True)),
+            ["delivered", "in_processing", "in_processing"],
+        )
+
+
+class ConcurrentAdjustmentTest(TransactionTestCase):
+
+    def test_ledger_follows_a_reservation_committed_during_the_adjustment(self):
+        factory = Factory.objects.create(name="Factory", address="A")
+        product = Product.objects.create(name="Product", price=1, weight=1)
+        row = FactoryWarehouse.objects.create(
+            factory=factory, product=product, quantity=10
+        )
+        StockMovement.record(factory.id, product.id, "restock", 10)
+        locked = threading.Event()
+
+        def reserve():
+            try:
+                with transaction.atomic():
+                    reserved = FactoryWarehouse.objects.select_for_update().get(
+                        id=row.id
+                    )
+                    locked.set()
+                    # The adjustment reads the row while it is locked here
+                    time.sleep(0.3)
+                    reserved.quantity -= 3
+                    reserved.save(update_fields=["quantity"])
+                    StockMovement.record(factory.id, product.id, "reservation", -3)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=reserve)
+        thread.start()
+        locked.wait(timeout=5)
+        FactoryWarehouseAdmin(FactoryWarehouse, admin.site).adjust(
+            FactoryWarehouse.objects.filter(id=row.id), "greatest(%s, 0)", [4]
+        )
+        thread.join()
+
+        self.assertEqual(
+            list(StockMovement.objects.order_by("id").values_list("kind", "delta")),
+            [("restock", 10), ("reservation", -3), ("adjustment", -3)],
+        )
@@ -0,0 +1,133 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.db import DatabaseError, transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core import alerts
+from core.models import (
+    Factory,
+    FactoryWarehouse,
+    Product,
+    ProductOrder,
+    ReorderThreshold,
+    SalePoint,
+    StockAlert,
+)
+
+
+@override_settings(STOCK_ALERT_FEED_LAG=0)
+class StockAlertTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.product = Product.objects.create(name="Product", price=1, weight=1)
+        self.other = Product.objects.create(name="Other", price=1, weight=1)
+        for product in [self.product, self.other]:
+            FactoryWarehouse.objects.create(
+                factory=self.factory, product=product, quantity=10
+            )
+        self.user = get_user_model().objects.create_user(
+            username="factory", password="password"
+        )
+        self.user.groups.add(Group.objects.get(name="factory"))
+        self.user.factories.add(self.factory)
+        self.client.force_authenticate(self.user)
+
+    def set_threshold(self, threshold):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put(
+                reverse("factorywarehouse-thresholds"),
+                [{"product": self.product.id, "threshold": threshold}],
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_reservation_raises_and_restock_clears_alert(self):
+        self.set_threshold(5)
+        sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductOrder.create_order(ProductOrder, self.product, 6, sale_point)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProductOrder.create_order(ProductOrder, self.product, 1, sale_point)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                reverse("factorywarehouse-product-counts"),
+                [{"product": self.product.id, "quantity": 20}],
+                format="json",
+            )
+
+        response = self.client.get(reverse("factorywarehouse-alerts"))
+        self.assertEqual(
+            [(alert["kind"], alert["quantity"]) for alert in response.data],
+            [("low_stock", 4), ("restocked", 20)],
+        )
+        after = self.client.get(
+            reverse("factorywarehouse-alerts"), {"after": response.data[0]["id"]}
+        )
+        self.assertEqual([alert["kind"] for alert in after.data], ["restocked"])
+
+    def test_only_touched_pairs_are_checked(self):
+        ReorderThreshold.objects.create(
+            factory=self.factory, product=self.other, threshold=50
+        )
+        self.set_threshold(5)
+
+        self.assertEqual(StockAlert.objects.count(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(
+                reverse("factorywarehouse-product-counts"),
+                [{"product": self.other.id, "quantity": 9}],
+                format="json",
+            )
+
+        alert = StockAlert.objects.get()
+        self.assertEqual((alert.product, alert.quantity), (self.other, 9))
+
+    def test_rolled_back_pairs_are_not_checked(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    alerts.stock_changed(self.factory.id, self.product.id)
+                    raise DatabaseError
+            except DatabaseError:
+                pass
+            alerts.stock_changed(self.factory.id, self.other.id)
+            with transaction.atomic():
+                alerts.stock_changed(self.factory.id, self.product.id)
+
+        self.assertEqual(
+            [callback.pairs for callback in callbacks],
+            [{(self.factory.id, self.other.id), (self.factory.id, self.product.id)}],
+        )
+
+    @override_settings(STOCK_ALERT_FEED_LAG=60)
+    def test_feed_stops_before_alerts_that_may_still_be_committing(self):
+        now = timezone.now()
+        ids = [
+            StockAlert.objects.create(
+                factory=self.factory,
+                product=self.product,
+                kind="low_stock",
+                quantity=1,
+                threshold=5,
+                created_at=created_at,
+            ).id
+            for created_at in [
+                now - datetime.timedelta(minutes=5),
+                now,
+                now - datetime.timedelta(minutes=5),
+            ]
+        ]
+
+        response = self.client.get(reverse("factorywarehouse-alerts"))
+
+        self.assertEqual([alert["id"] for alert in response.data], ids[:1])
@@ -52,6 +52,7 @@ class UserRegistrationAPITest(APITestCase):
 
 
 class SalePointOrderTest(APITestCase):
+    databases = "__all__"
 
     def setUp(self):
         # Создаем фабрику и продукт
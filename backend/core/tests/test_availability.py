@@ -0,0 +1,118 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework.test import APIClient, APITestCase
+
+from core.availability import AvailabilityIndex, availability
+from core.models import Factory, FactoryWarehouse, Product
+
+
+class AvailabilityIndexTest(TransactionTestCase):
+    # The index reads committed data over its own connection
+
+    def wait_for(self, condition):
+        deadline = time.monotonic() + 10
+        while not condition():
+            if time.monotonic() > deadline:
+                self.fail("The availability index did not catch up.")
+            time.sleep(0.05)
+
+    def test_index_follows_notifications(self):
+        factories = [
+            Factory.objects.create(name=f"Factory {index}", address="A")
+            for index in range(2)
+        ]
+        product = Product.objects.create(name="Product", price=1, weight=1)
+        row = FactoryWarehouse.objects.create(
+            factory=factories[0], product=product, quantity=5
+        )
+
+        index = AvailabilityIndex()
+        index.start()
+        try:
+            self.wait_for(index.ready.is_set)
+            self.assertEqual(index.lookup(product.id), (5, {factories[0].id: 5}))
+
+            FactoryWarehouse.objects.create(
+                factory=factories[1], product=product, quantity=7
+            )
+            FactoryWarehouse.objects.filter(id=row.id).update(quantity=2)
+            self.wait_for(lambda: index.lookup(product.id)[0] == 9)
+            self.assertEqual(
+                index.lookup(product.id)[1], {factories[0].id: 2, factories[1].id: 7}
+            )
+
+            FactoryWarehouse.objects.filter(product=product).delete()
+            self.wait_for(lambda: index.lookup(product.id) == (0, {}))
+        finally:
+            index.stop()
+
+    def test_catalog_quantities_come_from_the_index(self):
+        factories = [
+            Factory.objects.create(name=f"Factory {index}", address="A")
+            for index in range(2)
+        ]
+        products = [
+            Product.objects.create(name=f"Product {index}", price=1, weight=1)
+            for index in range(2)
+        ]
+        for quantity, (product, factory) in enumerate(
+            [(products[1], factories[0]), (products[0], factories[1])]
+        ):
+            FactoryWarehouse.objects.create(
+                factory=factory, product=product, quantity=quantity + 1
+            )
+        FactoryWarehouse.objects.create(
+            factory=factories[0], product=products[0], quantity=0
+        )
+        client = APIClient()
+        client.force_authenticate(
+            get_user_model().objects.create_user(username="user", password="x")
+        )
+        url = reverse("products-with-quantity-list")
+        with mock.patch("core.availability.get_index", return_value=None):
+            expected = client.get(url).json()
+            expected_page = client.get(url, {"page": 1, "fields": "quantity"}).json()
+
+        index = AvailabilityIndex()
+        index.start()
+        self.addCleanup(index.stop)
+        self.wait_for(index.ready.is_set)
+        with mock.patch("core.availability.get_index", return_value=index):
+            with self.assertNumQueries(1):
+                response = client.get(url)
+            with self.assertNumQueries(0):
+                page = client.get(url, {"page": 1, "fields": "quantity"})
+
+        self.assertEqual(response.json(), expected)
+        self.assertEqual(page.json(), expected_page)
+        self.assertEqual([row["quantity"] for row in expected_page["results"]], [2, 1])
+
+
+class AvailabilityEndpointTest(APITestCase):
+
+    def test_availability_inside_transaction_reads_database(self):
+        factory = Factory.objects.create(name="Factory", address="A")
+        product = Product.objects.create(name="Product", price=1, weight=1)
+        FactoryWarehouse.objects.create(factory=factory, product=product, quantity=3)
+        user = get_user_model().objects.create_user(username="user", password="x")
+        self.client.force_authenticate(user)
+
+        self.assertEqual(availability(product.id), (3, {factory.id: 3}))
+        response = self.client.get(
+            reverse("product-availability"), {"ids": f"{product.id},0"}
+        )
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    "product": product.id,
+                    "quantity": 3,
+                    "factories": [{"factory": factory.id, "quantity": 3}],
+                },
+                {"product": 0, "quantity": 0, "factories": []},
+            ],
+        )
@@ -0,0 +1,158 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APITestCase
+
+from core.models import (
+    Carrier,
+    Factory,
+    FactoryWarehouse,
+    Product,
+    ProductCategory,
+    ProductOrder,
+    SalePoint,
+)
+
+
+class BootstrapTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.category = ProductCategory.objects.create(name="Category")
+        self.sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        self.user = get_user_model().objects.create_user(
+            username="user", password="password"
+        )
+        self.client.force_authenticate(self.user)
+
+    def add_products(self, count):
+        for index in range(count):
+            product = Product.objects.create(
+                name=f"Product {Product.objects.count()}",
+                price="12.50",
+                weight="0.25",
+                category=ProductCategory.objects.create(name=f"Category {index}"),
+            )
+            FactoryWarehouse.objects.create(
+                factory=self.factory, product=product, quantity=index + 1
+            )
+            ProductOrder.objects.create(
+                sale_point=SalePoint.objects.create(name=f"Point {index}", address="C"),
+                product=product,
+                quantity=1,
+            )
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(queries)
+
+    def test_factory_page_matches_the_list_endpoints(self):
+        self.user.groups.add(Group.objects.get(name="factory"))
+        self.user.factories.add(self.factory)
+        self.add_products(2)
+
+        response = self.client.get(reverse("bootstrap-factory"))
+
+        self.assertEqual(response.data["user"]["role"], "factory")
+        self.assertEqual(response.data["factory"]["id"], self.factory.id)
+        self.assertEqual(
+            response.json()["products"]["results"],
+            self.client.get(reverse("product-list")).json()["results"],
+        )
+        self.assertEqual(
+            response.json()["categories"]["results"],
+            self.client.get(reverse("productcategory-list")).json()["results"],
+        )
+        self.assertEqual(
+            [row["quantity"] for row in response.data["product_counts"]], [1, 2]
+        )
+        self.assertIsNone(response.data["products"]["next"])
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.user.factories.add(self.factory)
+        self.user.sale_points.add(self.sale_point)
+        self.user.carriers.add(Carrier.objects.create(name="Carrier"))
+        urls = [
+            reverse("bootstrap-factory"),
+            reverse("bootstrap-sale-point"),
+            reverse("bootstrap-carrier"),
+        ]
+        self.add_products(1)
+        few = [self.count_queries(url) for url in urls]
+
+        self.add_products(5)
+
+        self.assertEqual([self.count_queries(url) for url in urls], few)
+
+    def test_carrier_page_loads_what_orders_refer_to(self):
+        self.user.carriers.add(Carrier.objects.create(name="Carrier"))
+        self.add_products(2)
+        Product.objects.create(name="Unordered", price=1, weight=1)
+
+        response = self.client.get(reverse("bootstrap-carrier"))
+
+        orders = response.data["orders"]["results"]
+        self.assertEqual(len(orders), 2)
+        self.assertEqual(
+            [product["id"] for product in response.data["products"]],
+            sorted(order["product_id"] for order in orders),
+        )
+        self.assertEqual(
+            [row["id"] for row in response.data["sale_points"]],
+            sorted(order["sale_point_id"] for order in orders),
+        )
+        self.assertEqual(
+            [row["id"] for row in response.data["factories"]], [self.factory.id]
+        )
+        self.assertEqual(len(response.data["categories"]), 2)
+
+    def test_sale_point_page(self):
+        self.user.sale_points.add(self.sale_point)
+        self.add_products(2)
+
+        response = self.client.get(reverse("bootstrap-sale-point"))
+
+        self.assertEqual(
+            response.data["sale_points"],
+            [{"id": self.sale_point.id, "name": "Sale Point", "address": "B"}],
+        )
+        self.assertEqual(
+            response.json()["products_with_quantity"]["results"],
+            self.client.get(reverse("products-with-quantity-list"), {"page": 1}).json()[
+                "results"
+            ],
+        )
+        self.assertIsNone(response.data["products_with_quantity"]["next"])
+
+    def test_users_without_the_role_are_refused(self):
+        for name in ["bootstrap-factory", "bootstrap-sale-point", "bootstrap-carrier"]:
+            response = self.client.get(reverse(name))
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "PAGE_SIZE": 1})
+    @mock.patch.object(PageNumberPagination, "page_size", 1)
+    def test_sale_point_page_links_the_rest_of_the_products(self):
+        self.user.sale_points.add(self.sale_point)
+        self.add_products(2)
+
+        rows = self.client.get(reverse("bootstrap-sale-point")).json()[
+            "products_with_quantity"
+        ]
+        rest = self.client.get(rows["next"]).json()
+
+        self.assertEqual(len(rows["results"]), 1)
+        self.assertEqual(
+            rows["results"] + rest["results"],
+            self.client.get(reverse("products-with-quantity-list")).json(),
+        )
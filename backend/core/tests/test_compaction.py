@@ -0,0 +1,63 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from core.models import Factory, FactoryWarehouse, Product
+from core.stock import compact_warehouse
+
+
+class WarehouseCompactionTest(APITestCase):
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.products = [
+            Product.objects.create(name=f"Product {index}", price=1, weight=1)
+            for index in range(3)
+        ]
+        for product in self.products:
+            FactoryWarehouse.objects.create(
+                factory=self.factory, product=product, quantity=5
+            )
+        self.user = get_user_model().objects.create_user(
+            username="factory", password="password"
+        )
+        self.user.groups.add(Group.objects.get(name="factory"))
+        self.user.factories.add(self.factory)
+        self.client.force_authenticate(self.user)
+        self.url = reverse("factorywarehouse-product-counts")
+
+    def test_emptied_rows_are_hidden_until_compacted(self):
+        self.client.put(
+            self.url,
+            [{"product": product.id, "quantity": 0} for product in self.products[:2]],
+            format="json",
+        )
+
+        self.assertEqual(FactoryWarehouse.objects.count(), 3)
+        self.assertEqual(
+            [row["product"] for row in self.client.get(self.url).json()],
+            [self.products[2].id],
+        )
+        self.assertEqual(
+            len(self.client.get(reverse("products-with-quantity-list")).json()), 1
+        )
+
+        self.assertEqual(compact_warehouse(batch_size=1), 2)
+        self.assertEqual(
+            list(FactoryWarehouse.objects.values_list("product_id", flat=True)),
+            [self.products[2].id],
+        )
+
+    def test_restocking_reuses_emptied_row(self):
+        row = FactoryWarehouse.objects.get(product=self.products[0])
+        row.quantity = 0
+        row.save()
+
+        self.client.post(
+            self.url, [{"product": self.products[0].id, "quantity": 4}], format="json"
+        )
+
+        row.refresh_from_db()
+        self.assertEqual(row.quantity, 4)
+        self.assertEqual(FactoryWarehouse.objects.count(), 3)
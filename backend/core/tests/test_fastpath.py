@@ -0,0 +1,104 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import (
+    Factory,
+    FactoryWarehouse,
+    Product,
+    ProductCategory,
+    ProductOrder,
+    SalePoint,
+)
+from core.serializers import (
+    FactoryWarehouseSerializer,
+    ProductOrderSerializer,
+    ProductsWithQuantitySerializer,
+)
+
+
+class FastReadPathTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        category = ProductCategory.objects.create(name="Category")
+        self.sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        for index in range(3):
+            product = Product.objects.create(
+                name=f"Product {index}",
+                price="12.50",
+                weight="0.25",
+                category=category,
+            )
+            FactoryWarehouse.objects.create(
+                factory=self.factory, product=product, quantity=index + 1
+            )
+            ProductOrder.objects.create(
+                sale_point=self.sale_point,
+                product=product,
+                quantity=index + 1,
+                delivery_cost="3.10" if index else None,
+            )
+
+        self.user = get_user_model().objects.create_user(
+            username="user", password="password"
+        )
+        self.client.force_authenticate(self.user)
+
+    def as_json(self, data):
+        return json.loads(json.dumps(data))
+
+    def test_product_orders_match_model_serializer(self):
+        expected = ProductOrderSerializer(
+            ProductOrder.objects.order_by("order_date"), many=True
+        ).data
+
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("productorder-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["results"], self.as_json(expected))
+
+    def test_products_with_quantity_match_model_serializer(self):
+        expected = ProductsWithQuantitySerializer(
+            FactoryWarehouse.objects.all(), many=True
+        ).data
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("products-with-quantity-list"))
+
+        self.assertCountEqual(response.json(), self.as_json(expected))
+
+    def test_product_counts_match_model_serializer(self):
+        expected = FactoryWarehouseSerializer(
+            FactoryWarehouse.objects.all(), many=True
+        ).data
+
+        response = self.client.get(reverse("factorywarehouse-product-counts"))
+
+        self.assertCountEqual(response.json(), self.as_json(expected))
+
+    def test_sparse_fieldsets(self):
+        response = self.client.get(
+            reverse("products-with-quantity-list"),
+            {"fields": "product.name,quantity"},
+        )
+
+        self.assertCountEqual(
+            response.json(),
+            [
+                {"product": {"name": f"Product {index}"}, "quantity": index + 1}
+                for index in range(3)
+            ],
+        )
+
+    def test_unknown_field_is_rejected(self):
+        response = self.client.get(
+            reverse("productorder-list"), {"fields": "id,secret"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
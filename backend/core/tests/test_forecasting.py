@@ -0,0 +1,117 @@
+import datetime
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.forecasting import forecast, run_forecasts
+from core.models import (
+    DailySalesRollup,
+    DemandForecast,
+    Factory,
+    Product,
+    SalePoint,
+)
+
+PATTERN = [10, 12, 14, 16, 18, 4, 2]
+
+
+class SmoothingTest(SimpleTestCase):
+
+    def test_weekly_pattern_is_forecast_for_all_series(self):
+        history = np.array([PATTERN * 8, [3] * 56, [0] * 56], dtype=float)
+
+        daily, sigma = forecast(history, 7)
+
+        np.testing.assert_allclose(daily[0], PATTERN, atol=0.01)
+        np.testing.assert_allclose(daily[1], [3] * 7, atol=0.01)
+        np.testing.assert_allclose(daily[2], [0] * 7, atol=0.01)
+        np.testing.assert_allclose(sigma, 0, atol=0.01)
+
+
+class DemandForecastTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.today = datetime.date(2024, 6, 3)
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.product = Product.objects.create(name="Product", price=1, weight=1)
+        self.sale_points = [
+            SalePoint.objects.create(name=f"Sale Point {index}", address="B")
+            for index in range(2)
+        ]
+        rollups = []
+        for offset in range(1, 29):
+            day = self.today - datetime.timedelta(days=offset)
+            for sale_point in self.sale_points:
+                rollups.append(
+                    DailySalesRollup(
+                        day=day,
+                        sale_point=sale_point,
+                        product=self.product,
+                        factory=self.factory,
+                        status="delivered",
+                        orders=1,
+                        quantity=PATTERN[day.weekday()],
+                    )
+                )
+        DailySalesRollup.objects.bulk_create(rollups)
+
+    def test_run_and_serve_forecasts(self):
+        count = run_forecasts(
+            history_days=28,
+            horizon=7,
+            lead_time=2,
+            service_level=0.95,
+            today=self.today,
+        )
+
+        self.assertEqual(count, 2)
+        forecast = DemandForecast.objects.first()
+        self.assertEqual(forecast.start, self.today)
+        # 2024-06-03 is a Monday
+        self.assertEqual([round(value) for value in forecast.daily], PATTERN)
+        self.assertAlmostEqual(forecast.lead_time_demand, 22, places=0)
+
+        user = get_user_model().objects.create_user(username="factory", password="x")
+        user.factories.add(self.factory)
+        self.client.force_authenticate(user)
+
+        response = self.client.get(reverse("demandforecast-list"))
+        self.assertEqual(response.data["count"], 2)
+
+        response = self.client.get(reverse("demandforecast-suggestions"))
+        row = response.data["results"][0]
+        self.assertEqual(row["product"], self.product.id)
+        self.assertAlmostEqual(row["lead_time_demand"], 44, places=0)
+
+        other = get_user_model().objects.create_user(username="other", password="x")
+        self.client.force_authenticate(other)
+        self.assertEqual(
+            self.client.get(reverse("demandforecast-list")).data["count"], 0
+        )
+
+    def test_filters_take_ids(self):
+        run_forecasts(
+            history_days=28,
+            horizon=7,
+            lead_time=2,
+            service_level=0.95,
+            today=self.today,
+        )
+        user = get_user_model().objects.create_user(username="factory", password="x")
+        user.factories.add(self.factory)
+        self.client.force_authenticate(user)
+
+        response = self.client.get(
+            reverse("demandforecast-list"), {"sale_point": self.sale_points[0].id}
+        )
+        self.assertEqual(response.data["count"], 1)
+
+        for param in ["product", "factory", "sale_point"]:
+            response = self.client.get(reverse("demandforecast-list"), {param: "x"})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(param, response.data)
@@ -0,0 +1,107 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+
+from django.test import SimpleTestCase
+
+from core.log import (
+    AsyncFileHandler,
+    SamplingFilter,
+    SharedRotatingFileHandler,
+    dropped_records,
+)
+
+
+class LoggingPipelineTest(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "test.log")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def record(self, name="core", level=logging.INFO, msg="hello %s", args=("world",)):
+        return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+    def test_records_are_written_as_json_lines(self):
+        handler = AsyncFileHandler(self.filename)
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = self.record(level=logging.ERROR)
+            record.exc_info = sys.exc_info()
+        handler.handle(record)
+        handler.close()
+
+        with open(self.filename) as log_file:
+            entry = json.loads(log_file.readline())
+        self.assertEqual(entry["logger"], "core")
+        self.assertEqual(entry["level"], "ERROR")
+        self.assertEqual(entry["message"], "hello world")
+        self.assertIn("ValueError: boom", entry["exception"])
+
+    def test_full_queue_drops_and_counts_records(self):
+        handler = AsyncFileHandler(self.filename, queue_size=2)
+        handler.listener.stop()
+        for _ in range(5):
+            handler.handle(self.record(name="core.views"))
+
+        self.assertEqual(handler.dropped["core.views"], 3)
+        self.assertEqual(dropped_records()["core.views"], 3)
+        handler.listener = None
+        handler.close()
+
+    def test_forked_processes_write_the_same_file(self):
+        handler = AsyncFileHandler(self.filename)
+        self.addCleanup(handler.close)
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                handler.handle(self.record(msg="from the %s", args=("child",)))
+                handler.close()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        handler.handle(self.record(msg="from the %s", args=("parent",)))
+        handler.close()
+
+        with open(self.filename) as log_file:
+            messages = [json.loads(line)["message"] for line in log_file]
+        self.assertEqual(messages, ["from the child", "from the parent"])
+
+    def test_processes_share_the_rotation(self):
+        handlers = [
+            SharedRotatingFileHandler(
+                self.filename, maxBytes=100, backupCount=2, delay=True
+            )
+            for _ in range(2)
+        ]
+        for index in range(40):
+            handlers[index % 2].handle(
+                self.record(msg="%02d" + "x" * 20, args=(index,))
+            )
+        for handler in handlers:
+            handler.close()
+
+        self.assertEqual(
+            sorted(os.listdir(self.directory.name)),
+            ["test.log", "test.log.1", "test.log.2", "test.log.lock"],
+        )
+        with open(self.filename) as log_file:
+            last = log_file.read().split()
+        self.assertEqual(last[-1][:2], "39")
+        self.assertEqual(last, sorted(last))
+
+    def test_sampling_keeps_warnings_and_unsampled_loggers(self):
+        sampling = SamplingFilter({"django.db.backends": 0.0, "django": 1.0})
+
+        self.assertFalse(sampling.filter(self.record(name="django.db.backends")))
+        self.assertTrue(
+            sampling.filter(self.record(name="django.db.backends", level=logging.ERROR))
+        )
+        self.assertTrue(sampling.filter(self.record(name="django.request")))
+        self.assertTrue(sampling.filter(self.record(name="core")))
@@ -0,0 +1,67 @@
+import gzip
+
+import brotli
+import zstandard
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.middleware import CompressionMiddleware, choose_encoding
+
+CONTENT = b'{"name": "Product", "quantity": 10}' * 100
+
+
+def json_response(content):
+    return HttpResponse(content, content_type="application/json")
+
+
+@override_settings(COMPRESSION_MIN_SIZE=200)
+class CompressionMiddlewareTest(SimpleTestCase):
+
+    def process(self, response, accept_encoding):
+        request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept_encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_choose_encoding(self):
+        encodings = ["zstd", "br", "gzip"]
+
+        self.assertEqual(choose_encoding("gzip, deflate, br", encodings), "br")
+        self.assertEqual(choose_encoding("gzip;q=1.0, br;q=0.5", encodings), "gzip")
+        self.assertEqual(choose_encoding("*", encodings), "zstd")
+        self.assertEqual(choose_encoding("zstd;q=0, identity", encodings), None)
+
+    def test_negotiated_encodings(self):
+        decoders = {
+            "gzip": gzip.decompress,
+            "br": brotli.decompress,
+            "zstd": lambda data: zstandard.ZstdDecompressor()
+            .decompressobj()
+            .decompress(data),
+        }
+        for encoding, decompress in decoders.items():
+            response = self.process(json_response(CONTENT), encoding)
+
+            self.assertEqual(response["Content-Encoding"], encoding)
+            self.assertEqual(response["Content-Length"], str(len(response.content)))
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+            self.assertEqual(decompress(response.content), CONTENT)
+
+    def test_streaming_response(self):
+        chunks = [CONTENT[:100], CONTENT[100:]]
+        response = self.process(
+            StreamingHttpResponse(iter(chunks), content_type="application/json"), "gzip"
+        )
+
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), CONTENT)
+
+    def test_skipped_responses(self):
+        small = self.process(json_response(b"{}"), "gzip")
+        image = self.process(HttpResponse(CONTENT, content_type="image/png"), "gzip")
+        page = self.process(HttpResponse(CONTENT), "gzip")
+        encoded = json_response(CONTENT)
+        encoded["Content-Encoding"] = "br"
+
+        self.assertFalse(small.has_header("Content-Encoding"))
+        self.assertFalse(image.has_header("Content-Encoding"))
+        self.assertFalse(page.has_header("Content-Encoding"))
+        self.assertEqual(self.process(encoded, "gzip").content, CONTENT)
@@ -15,6 +15,7 @@ from django.utils import timezone
 
 
 class ModelsTestCase(TestCase):
+    databases = "__all__"
 
     def setUp(self):
         self.user = get_user_model().objects.create_user(
@@ -0,0 +1,113 @@
+import multiprocessing
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Carrier, Factory, SalePoint
+from core.onboarding import UsernameConflict, create_users, validate_rows
+
+
+class BulkOnboardingTest(APITestCase):
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.carrier = Carrier.objects.create(name="Carrier")
+        self.sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        admin = get_user_model().objects.create_superuser(
+            username="admin", password="password"
+        )
+        self.client.force_authenticate(admin)
+        self.url = reverse("register-user-bulk")
+
+    def test_json_rows(self):
+        rows = [
+            {
+                "username": "factory_user",
+                "email": "factory@example.com",
+                "role": "factory",
+                "entity_id": self.factory.id,
+                "password": "secret-1",
+            },
+            {
+                "username": "carrier_user",
+                "email": "carrier@example.com",
+                "role": "carrier",
+                "entity_id": self.carrier.id,
+            },
+        ]
+
+        with self.assertNumQueries(11):
+            response = self.client.post(self.url, rows, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["created"], 2)
+        generated = response.data["users"][1]["password"]
+        self.assertNotIn("password", response.data["users"][0])
+
+        users = get_user_model().objects
+        factory_user = users.get(username="factory_user")
+        self.assertTrue(factory_user.check_password("secret-1"))
+        self.assertEqual(list(factory_user.factories.all()), [self.factory])
+        self.assertEqual(factory_user.groups_list, ["factory"])
+        self.assertTrue(users.get(username="carrier_user").check_password(generated))
+
+    @override_settings(ONBOARDING_HASH_WORKERS=2, ONBOARDING_POOL_THRESHOLD=2)
+    def test_csv_rows_hashed_in_pool(self):
+        body = "username,email,role,entity_id,password\n" + "".join(
+            f"sp{index},sp{index}@example.com,sale_point,{self.sale_point.id},pw{index}\n"
+            for index in range(4)
+        )
+
+        response = self.client.generic("POST", self.url, body, content_type="text/csv")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.sale_point.users.count(), 4)
+        user = get_user_model().objects.get(username="sp3")
+        self.assertTrue(user.check_password("pw3"))
+        self.assertEqual(multiprocessing.active_children(), [])
+
+    def test_invalid_rows_create_nothing(self):
+        rows = [
+            {
+                "username": "admin",
+                "email": "a@example.com",
+                "role": "factory",
+                "entity_id": self.factory.id,
+            },
+            {
+                "username": "new",
+                "email": "b@example.com",
+                "role": "carrier",
+                "entity_id": 0,
+            },
+        ]
+
+        response = self.client.post(self.url, rows, format="json")
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.data["errors"]), {0, 1})
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_usernames_taken_after_validation_conflict(self):
+        rows, errors = validate_rows(
+            [
+                {
+                    "username": username,
+                    "email": f"{username}@example.com",
+                    "role": "carrier",
+                    "entity_id": self.carrier.id,
+                }
+                for username in ["other", "late"]
+            ]
+        )
+        get_user_model().objects.create_user(username="late", password="x")
+
+        with self.assertRaises(UsernameConflict) as conflict:
+            create_users(rows)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(list(conflict.exception.errors), [1])
+        self.assertFalse(get_user_model().objects.filter(username="other").exists())
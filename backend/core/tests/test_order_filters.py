@@ -0,0 +1,119 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from core.filters import OrderFilterBackend
+from core.models import (
+    Carrier,
+    Delivery,
+    Factory,
+    Product,
+    ProductOrder,
+    SalePoint,
+)
+
+
+class OrderFilterTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.products = [
+            Product.objects.create(name=f"Product {index}", price=1, weight=1)
+            for index in range(2)
+        ]
+        self.sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        self.orders = [
+            ProductOrder.objects.create(
+                sale_point=self.sale_point,
+                product=product,
+                factory=self.factory,
+                quantity=1,
+                status=order_status,
+                delivery_cost=1,
+            )
+            for product, order_status in [
+                (self.products[0], "in_processing"),
+                (self.products[1], "delivery"),
+                (self.products[0], "delivered"),
+            ]
+        ]
+        self.carrier = Carrier.objects.create(name="Carrier")
+        delivery = Delivery.objects.create(carrier=self.carrier, cost=1)
+        self.orders[1].deliveries.add(delivery)
+
+        user = get_user_model().objects.create_user(username="user", password="x")
+        self.client.force_authenticate(user)
+        self.url = reverse("productorder-list")
+
+    def ids(self, params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return [row["id"] for row in response.data["results"]]
+
+    def test_filters(self):
+        orders = [order.id for order in self.orders]
+        now = datetime.datetime.now(datetime.UTC)
+
+        self.assertEqual(self.ids({"product": self.products[0].id}), orders[::2])
+        self.assertEqual(self.ids({"status": "delivery"}), orders[1:2])
+        self.assertEqual(self.ids({"carrier": self.carrier.id}), orders[1:2])
+        self.assertEqual(
+            self.ids({"factory": self.factory.id, "status": "delivered,delivery"}),
+            orders[1:],
+        )
+        self.assertEqual(
+            self.ids(
+                {
+                    "status": "in_processing,delivery",
+                    "order_date_after": (now - datetime.timedelta(days=1)).date(),
+                    "order_date_before": (now + datetime.timedelta(days=1)).isoformat(),
+                }
+            ),
+            orders[:2],
+        )
+        self.assertEqual(self.ids({"order_date_before": "2000-01-01"}), [])
+
+    def test_rejected_filters(self):
+        for params in [
+            {"customer": 1},
+            {"status": "lost"},
+            {"product": "abc"},
+            {"status": "delivery,delivered"},
+            {
+                "status": "delivery,delivered",
+                "order_date_after": "2024-01-01",
+                "order_date_before": "2024-06-01",
+            },
+            {"order_date_after": "2024-02-01", "order_date_before": "2024-01-01"},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_every_driving_filter_uses_an_index(self):
+        backend = OrderFilterBackend()
+        for params in [
+            {},
+            {"status": "delivery"},
+            {"product": self.products[0].id},
+            {"factory": self.factory.id},
+            {"sale_point": self.sale_point.id},
+            {"carrier": self.carrier.id},
+            {"delivery": 1},
+            {"order_date_after": "2024-01-01"},
+        ]:
+            with self.subTest(params=params):
+                request = Request(APIRequestFactory().get(self.url, params))
+                queryset = backend.filter_queryset(
+                    request, ProductOrder.objects.order_by("order_date"), None
+                )
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+                plan = queryset.explain()
+                self.assertNotIn("Seq Scan on core_productorder", plan)
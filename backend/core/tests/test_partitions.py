@@ -0,0 +1,107 @@
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import Product, ProductOrder, SalePoint
+from core.partitions import (
+    add_months,
+    archive_partitions,
+    ensure_partitions,
+    list_partitions,
+    month_start,
+    partition_name,
+)
+
+
+class ProductOrderPartitionTest(TestCase):
+
+    def setUp(self):
+        self.product = Product.objects.create(name="Product", price=10, weight=1)
+        self.sale_point = SalePoint.objects.create(name="Sale Point", address="A")
+
+    def create_order(self, status="in_processing", order_date=None):
+        order = ProductOrder.objects.create(
+            sale_point=self.sale_point,
+            product=self.product,
+            quantity=1,
+            status=status,
+            delivery_cost=0,
+        )
+        if order_date:
+            ProductOrder.objects.filter(id=order.id).update(order_date=order_date)
+        return order
+
+    def partition_of(self, order):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT tableoid::regclass::text FROM core_productorder WHERE id = %s",
+                [order.id],
+            )
+            return cursor.fetchone()[0]
+
+    def test_current_and_upcoming_months_exist(self):
+        partitions = list_partitions("core_productorder")
+        current = month_start(timezone.now())
+        self.assertIn(current, partitions)
+        self.assertIn(add_months(current, 3), partitions)
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        far_future = timezone.now() + datetime.timedelta(days=365 * 3)
+        order = self.create_order(order_date=far_future)
+        self.assertEqual(self.partition_of(order), "core_productorder_default")
+
+        created = ensure_partitions("core_productorder", "order_date")
+
+        name = partition_name("core_productorder", far_future)
+        self.assertIn(name, created)
+        self.assertEqual(self.partition_of(order), name)
+
+    def test_updates_keep_the_order_in_its_partition(self):
+        ordered = timezone.now() - datetime.timedelta(days=62)
+        order = self.create_order(order_date=ordered)
+        partition = self.partition_of(order)
+
+        order.refresh_from_db()
+        order.status = "delivered"
+        order.save()
+
+        order.refresh_from_db()
+        self.assertEqual(order.order_date, ordered)
+        self.assertEqual(self.partition_of(order), partition)
+
+    def test_archive_skips_partitions_with_active_orders(self):
+        delivered_month = timezone.now() - datetime.timedelta(days=365 * 2)
+        active_month = delivered_month - datetime.timedelta(days=62)
+        ensure_partitions("core_productorder", "order_date", start=active_month)
+        delivered = self.create_order(status="delivered", order_date=delivered_month)
+        active = self.create_order(order_date=active_month)
+        self.create_order(status="delivered", order_date=active_month)
+        before = add_months(month_start(timezone.now()), -12)
+
+        archived = archive_partitions(
+            "core_productorder", before, keep_condition="status <> 'delivered'"
+        )
+
+        self.assertIn(partition_name("core_productorder", delivered_month), archived)
+        self.assertNotIn(partition_name("core_productorder", active_month), archived)
+        self.assertFalse(ProductOrder.objects.filter(id=delivered.id).exists())
+        self.assertTrue(ProductOrder.objects.filter(id=active.id).exists())
+
+    def test_date_filter_prunes_partitions(self):
+        since = month_start(timezone.now())
+        ensure_partitions(
+            "core_productorder", "order_date", start=add_months(since, -2)
+        )
+
+        plan = ProductOrder.objects.filter(
+            order_date__gte=datetime.datetime.combine(
+                since, datetime.time(), datetime.UTC
+            )
+        ).explain()
+
+        self.assertIn(partition_name("core_productorder", since), plan)
+        self.assertNotIn(
+            partition_name("core_productorder", add_months(since, -1)), plan
+        )
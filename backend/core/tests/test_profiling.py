@@ -0,0 +1,148 @@
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from core import profiling
+from core.profiling import Sampler
+
+
+def busy_wait(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfileDirMixin:
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = override_settings(PROFILE_DIR=directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class SamplerTest(ProfileDirMixin, SimpleTestCase):
+
+    def test_stacks_are_collapsed_below_the_root(self):
+        sampler = Sampler(threading.get_ident(), 0.001)
+        sampler.start()
+        busy_wait(0.1)
+        sampler.stop()
+
+        lines = sampler.collapsed().splitlines()
+        self.assertTrue(lines)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertTrue(stack.endswith("core.tests.test_profiling:busy_wait"))
+        self.assertGreater(int(count), 0)
+
+    @override_settings(PROFILE_KEEP=2)
+    def test_only_the_newest_profiles_are_kept(self):
+        names = [
+            profiling.save("product-list", "GET", 0.01 * index, "a;b 1\n")
+            for index in range(3)
+        ]
+
+        self.assertEqual(
+            [profile["name"] for profile in profiling.profiles()],
+            names[:0:-1],
+        )
+        self.assertEqual(profiling.profiles()[0]["duration_ms"], 20)
+        self.assertEqual(profiling.profiles(route="product-detail"), [])
+
+
+class ProfilingMiddlewareTest(ProfileDirMixin, APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.admin = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+        self.user = get_user_model().objects.create_user(
+            username="user", password="password"
+        )
+
+    def test_admins_profile_requests_with_the_header(self):
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(reverse("product-list"), HTTP_X_PROFILE="1")
+        listed = self.client.get(reverse("profiles-list"))
+        download = self.client.get(
+            reverse("profiles-detail", args=[response["X-Profile"]])
+        )
+
+        self.assertEqual(
+            [(profile["route"], profile["method"]) for profile in listed.data],
+            [("product-list", "GET")],
+        )
+        self.assertEqual(listed.data[0]["name"], response["X-Profile"])
+        self.assertEqual(download.status_code, status.HTTP_200_OK)
+        self.assertIn("attachment", download["Content-Disposition"])
+
+    def test_header_of_other_users_is_ignored(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(reverse("product-list"), HTTP_X_PROFILE="1")
+
+        self.assertNotIn("X-Profile", response)
+        self.assertEqual(profiling.profiles(), [])
+        self.assertEqual(
+            self.client.get(reverse("profiles-list")).status_code,
+            status.HTTP_403_FORBIDDEN,
+        )
+
+    def test_token_admins_are_known_before_the_view(self):
+        token = Token.objects.create(user=self.admin)
+
+        response = self.client.get(
+            reverse("product-list"),
+            HTTP_X_PROFILE="1",
+            HTTP_AUTHORIZATION=f"Token {token.key}",
+        )
+
+        self.assertEqual(
+            [profile["name"] for profile in profiling.profiles()],
+            [response["X-Profile"]],
+        )
+
+    def test_header_of_anonymous_requests_is_not_sampled(self):
+        with mock.patch.object(Sampler, "start") as start, mock.patch.object(
+            Sampler, "stop"
+        ):
+            response = self.client.get(reverse("product-list"), HTTP_X_PROFILE="1")
+            self.client.get(
+                reverse("product-list"),
+                HTTP_X_PROFILE="1",
+                HTTP_AUTHORIZATION="Token invalid",
+            )
+
+        start.assert_not_called()
+        self.assertNotIn("X-Profile", response)
+
+    @override_settings(PROFILE_SAMPLE_RATE=1)
+    def test_sampled_requests_are_saved(self):
+        self.client.force_authenticate(self.user)
+
+        response = self.client.get(reverse("product-list"))
+
+        self.assertNotIn("X-Profile", response)
+        self.assertEqual(
+            [profile["route"] for profile in profiling.profiles()], ["product-list"]
+        )
+
+    def test_only_profiles_can_be_downloaded(self):
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(reverse("profiles-detail", args=["..settings.py"]))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
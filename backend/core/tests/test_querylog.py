@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core import querylog
+from core.models import Product, SlowQuery
+from core.querylog import Recorder, fingerprint, normalize
+
+
+class NormalizeTest(SimpleTestCase):
+
+    def test_values_do_not_change_the_fingerprint(self):
+        self.assertEqual(
+            normalize(
+                'SELECT "t"."id" FROM "core_order_2024_01" T3\n'
+                "WHERE \"t\".\"id\" IN (%s, %s, %s) AND x = 'it''s' LIMIT 21"
+            ),
+            'SELECT "t"."id" FROM "core_order_2024_01" T3 '
+            'WHERE "t"."id" IN (...) AND x = ? LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint("INSERT INTO t (a) VALUES (%s), (%s)"),
+            fingerprint("INSERT INTO t (a) VALUES (%s)"),
+        )
+
+
+@override_settings(SLOW_QUERY_MS=0.001, SLOW_QUERY_FLUSH_INTERVAL=0)
+class SlowQueryLogTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        patcher = mock.patch.object(querylog, "_recorder", Recorder())
+        self.recorder = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.admin = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+
+    def logged(self, queryset):
+        return SlowQuery.objects.get(fingerprint=fingerprint(str(queryset.query))[0])
+
+    def test_statements_are_aggregated_and_explained(self):
+        list(Product.objects.filter(id__in=[1, 2, 3]))
+        list(Product.objects.filter(id__in=[4]))
+
+        self.recorder.flush()
+
+        logged = self.logged(Product.objects.filter(id__in=[1]))
+        self.assertEqual(logged.calls, 2)
+        self.assertGreaterEqual(logged.total_ms, logged.max_ms)
+        self.assertTrue(
+            logged.frame.startswith(
+                "core.tests.test_querylog:SlowQueryLogTest."
+                "test_statements_are_aggregated_and_explained:"
+            )
+        )
+        self.assertIn("Execution Time", logged.plan)
+        self.assertIsNotNone(logged.plan_at)
+
+    def test_writes_are_only_planned(self):
+        product = Product.objects.create(name="Product", price=1, weight=1)
+        Product.objects.filter(id=product.id).delete()
+
+        self.recorder.flush()
+
+        delete = SlowQuery.objects.get(sql__startswith='DELETE FROM "core_product"')
+        self.assertNotIn("Execution Time", delete.plan)
+        self.assertFalse(Product.objects.exists())
+
+    def test_requests_name_their_view(self):
+        self.client.force_authenticate(self.admin)
+        self.client.get(reverse("product-list"))
+
+        self.recorder.flush()
+
+        self.assertTrue(
+            SlowQuery.objects.filter(
+                view="product-list", sql__contains='FROM "core_product"'
+            ).exists()
+        )
+
+    def test_admin_endpoint(self):
+        list(Product.objects.all())
+        self.recorder.flush()
+        self.client.force_authenticate(self.admin)
+
+        listed = self.client.get(reverse("slowquery-list"), {"order": "calls"})
+        logged = self.logged(Product.objects.all())
+        detail = self.client.get(reverse("slowquery-detail", args=[logged.id]))
+        invalid = self.client.get(reverse("slowquery-list"), {"order": "name"})
+
+        self.assertNotIn("plan", listed.data["results"][0])
+        calls = [row["calls"] for row in listed.data["results"]]
+        self.assertEqual(calls, sorted(calls, reverse=True))
+        self.assertEqual(detail.data["plan"], logged.plan)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_are_refused(self):
+        user = get_user_model().objects.create_user(username="user", password="x")
+        self.client.force_authenticate(user)
+
+        response = self.client.get(reverse("slowquery-list"))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
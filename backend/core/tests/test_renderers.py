@@ -0,0 +1,64 @@
+import datetime
+import decimal
+import io
+import json
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from core.models import Factory, FactoryWarehouse, Product
+from core.parsers import MessagePackParser, ORJSONParser
+from core.renderers import MessagePackRenderer, ORJSONRenderer
+
+
+class RendererTest(SimpleTestCase):
+    data = {
+        "name": "Product \u2028",
+        "price": decimal.Decimal("12.50"),
+        "created": datetime.datetime(2024, 5, 1, 12, 30, tzinfo=datetime.UTC),
+        "day": datetime.date(2024, 5, 1),
+        "items": [1, 2.5, None, True],
+        1: "non-string key",
+    }
+
+    def test_orjson_matches_json_renderer(self):
+        expected = JSONRenderer().render(self.data)
+        rendered = ORJSONRenderer().render(self.data)
+
+        self.assertEqual(json.loads(rendered), json.loads(expected))
+        self.assertIn(b"\\u2028", rendered)
+        self.assertEqual(
+            ORJSONParser().parse(io.BytesIO(rendered)), json.loads(expected)
+        )
+
+    def test_msgpack_round_trip(self):
+        data = {key: value for key, value in self.data.items() if key != 1}
+        rendered = MessagePackRenderer().render(data)
+        parsed = MessagePackParser().parse(io.BytesIO(rendered))
+
+        self.assertEqual(parsed["price"], "12.50")
+        self.assertEqual(parsed["created"], data["created"])
+        self.assertEqual(parsed["items"], data["items"])
+
+
+class ContentNegotiationTest(APITestCase):
+
+    def setUp(self):
+        factory = Factory.objects.create(name="Factory", address="A")
+        product = Product.objects.create(name="Product", price="1.50", weight=1)
+        FactoryWarehouse.objects.create(factory=factory, product=product, quantity=4)
+        user = get_user_model().objects.create_user(username="user", password="x")
+        self.client.force_authenticate(user)
+
+    def test_msgpack_response(self):
+        response = self.client.get(
+            reverse("products-with-quantity-list"), HTTP_ACCEPT="application/msgpack"
+        )
+
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        rows = MessagePackParser().parse(io.BytesIO(response.content))
+        self.assertEqual(rows[0]["quantity"], 4)
+        self.assertEqual(rows[0]["product"]["price"], "1.50")
@@ -0,0 +1,150 @@
+import threading
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from core.models import Factory, FactoryWarehouse, Product, ProductOrder, SalePoint
+from core.retry import ConflictRetriesExhausted, atomic_with_retry, retry_stats
+
+
+class PgError(Exception):
+    def __init__(self, pgcode):
+        self.pgcode = pgcode
+
+
+def failing(pgcode, times):
+    calls = []
+
+    @atomic_with_retry
+    def run():
+        calls.append(None)
+        if len(calls) <= times:
+            raise OperationalError() from PgError(pgcode)
+        return len(calls)
+
+    return run
+
+
+@override_settings(DB_RETRY_BASE_DELAY=0.001, DB_RETRY_ATTEMPTS=3)
+class RetryTest(TransactionTestCase):
+
+    def test_deadlocks_are_retried(self):
+        before = retry_stats()
+
+        self.assertEqual(failing("40P01", 2)(), 3)
+
+        stats = retry_stats()
+        self.assertEqual(stats["deadlock"] - before.get("deadlock", 0), 2)
+        self.assertEqual(stats["transactions"] - before.get("transactions", 0), 1)
+
+    def test_retries_are_limited(self):
+        with self.assertRaises(ConflictRetriesExhausted):
+            failing("40001", 3)()
+
+    def test_other_errors_are_not_retried(self):
+        with self.assertRaises(OperationalError):
+            failing("23505", 1)()
+
+    def test_outer_transactions_are_not_retried(self):
+        with self.assertRaises(OperationalError), transaction.atomic():
+            failing("40P01", 1)()
+
+    def test_real_deadlock_is_resolved(self):
+        factory = Factory.objects.create(name="Factory", address="A")
+        rows = [
+            FactoryWarehouse.objects.create(
+                factory=factory,
+                product=Product.objects.create(name=name, price=1, weight=1),
+                quantity=10,
+            ).id
+            for name in "AB"
+        ]
+        barrier = threading.Barrier(2)
+        attempts = []
+        errors = []
+
+        @atomic_with_retry
+        def take(first, second):
+            attempts.append(first)
+            FactoryWarehouse.objects.select_for_update().get(id=first)
+            if len(attempts) <= 2:
+                barrier.wait(timeout=5)
+            FactoryWarehouse.objects.select_for_update().get(id=second)
+            FactoryWarehouse.objects.filter(id__in=[first, second]).update(
+                quantity=F("quantity") - 1
+            )
+
+        def run(first, second):
+            try:
+                take(first, second)
+            except DatabaseError as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=run, args=order) for order in [rows, rows[::-1]]
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(
+            list(FactoryWarehouse.objects.values_list("quantity", flat=True)), [8, 8]
+        )
+
+
+class CartReservationTest(TestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.sale_point = SalePoint.objects.create(name="Sale Point", address="A")
+        self.factories = [
+            Factory.objects.create(name=name, address="A") for name in "AB"
+        ]
+        self.products = [
+            Product.objects.create(name=name, price=1, weight=1) for name in "XY"
+        ]
+        FactoryWarehouse.objects.create(
+            factory=self.factories[0], product=self.products[0], quantity=2
+        )
+        FactoryWarehouse.objects.create(
+            factory=self.factories[1], product=self.products[0], quantity=5
+        )
+        FactoryWarehouse.objects.create(
+            factory=self.factories[0], product=self.products[1], quantity=1
+        )
+
+    def test_cart_picks_a_factory_with_enough_stock(self):
+        orders = ProductOrder.create_orders(
+            [
+                (self.products[0], 3, self.sale_point),
+                (self.products[0], 2, self.sale_point),
+                (self.products[1], 1, self.sale_point),
+            ]
+        )
+
+        self.assertEqual(
+            [order.factory_id for order in orders],
+            [self.factories[1].id, self.factories[0].id, self.factories[0].id],
+        )
+
+    def test_cart_is_all_or_nothing(self):
+        with self.assertRaises(ValidationError):
+            ProductOrder.create_orders(
+                [
+                    (self.products[0], 1, self.sale_point),
+                    (self.products[1], 2, self.sale_point),
+                ]
+            )
+
+        self.assertFalse(ProductOrder.objects.exists())
+        self.assertEqual(
+            sorted(FactoryWarehouse.objects.values_list("quantity", flat=True)),
+            [1, 2, 5],
+        )
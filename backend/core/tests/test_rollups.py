@@ -0,0 +1,131 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import (
+    DailySalesRollup,
+    Factory,
+    HourlySalesRollup,
+    Product,
+    ProductOrder,
+    SalePoint,
+)
+
+
+class SalesRollupTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.product = Product.objects.create(name="Product", price=2.5, weight=1)
+        self.sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        self.other_sale_point = SalePoint.objects.create(name="Other", address="C")
+
+        self.admin = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+
+    def create_order(self, quantity, sale_point=None):
+        return ProductOrder.objects.create(
+            sale_point=sale_point or self.sale_point,
+            product=self.product,
+            factory=self.factory,
+            quantity=quantity,
+            delivery_cost=0,
+        )
+
+    def rollup(self, status="in_processing"):
+        return DailySalesRollup.objects.filter(status=status).values_list(
+            "orders", "quantity"
+        )
+
+    def test_rollups_follow_orders(self):
+        order = self.create_order(4)
+        self.create_order(6)
+        self.assertEqual(list(self.rollup()), [(2, 10)])
+        self.assertEqual(
+            HourlySalesRollup.objects.get(status="in_processing").quantity, 10
+        )
+
+        order.status = "delivered"
+        order.save()
+        self.assertEqual(list(self.rollup()), [(1, 6)])
+        self.assertEqual(list(self.rollup("delivered")), [(1, 4)])
+
+        order.delete()
+        self.assertEqual(list(self.rollup("delivered")), [(0, 0)])
+
+    def test_order_moved_to_another_partition_is_counted_once(self):
+        order = self.create_order(3)
+        moved_date = timezone.now() - datetime.timedelta(days=90)
+
+        ProductOrder.objects.filter(id=order.id).update(order_date=moved_date)
+
+        self.assertEqual(
+            list(DailySalesRollup.objects.filter(orders=1).values_list("day")),
+            [(moved_date.date(),)],
+        )
+
+    def test_sales_endpoint_groups_and_computes_revenue(self):
+        self.create_order(4)
+        self.create_order(2, self.other_sale_point)
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(
+            reverse("analytics-sales"), {"group_by": "sale_point"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        today = timezone.now().date()
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    "day": today,
+                    "sale_point_id": self.sale_point.id,
+                    "orders": 1,
+                    "quantity": 4,
+                    "revenue": "10.00",
+                },
+                {
+                    "day": today,
+                    "sale_point_id": self.other_sale_point.id,
+                    "orders": 1,
+                    "quantity": 2,
+                    "revenue": "5.00",
+                },
+            ],
+        )
+
+    def test_sales_endpoint_is_scoped_to_user_sale_points(self):
+        self.create_order(4)
+        self.create_order(2, self.other_sale_point)
+        user = get_user_model().objects.create_user(
+            username="seller", password="password"
+        )
+        user.sale_points.add(self.sale_point)
+        self.client.force_authenticate(user)
+
+        response = self.client.get(reverse("analytics-sales"), {"granularity": "hour"})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["quantity"], 4)
+
+    def test_sales_endpoint_rejects_invalid_parameters(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse("analytics-sales")
+
+        for params in [
+            {"granularity": "week"},
+            {"group_by": "carrier"},
+            {"start": "yesterday"},
+            {"start": "2024-02-01", "end": "2024-01-01"},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,108 @@
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Factory, FactoryWarehouse, Product, ProductCategory
+from core.search import trigram_available
+
+
+class ProductSearchTest(APITestCase):
+
+    def setUp(self):
+        self.sweets = ProductCategory.objects.create(name="Sweets")
+        self.drinks = ProductCategory.objects.create(name="Drinks")
+        self.bar = Product.objects.create(
+            name="Dark chocolate bar", price=1, weight=1, category=self.sweets
+        )
+        self.milk = Product.objects.create(
+            name="Chocolate milk", price=1, weight=1, category=self.drinks
+        )
+        self.cookie = Product.objects.create(
+            name="Cookie",
+            price=1,
+            weight=1,
+            category=self.sweets,
+            description="With chocolate chips",
+        )
+        factory = Factory.objects.create(name="Factory", address="A")
+        FactoryWarehouse.objects.create(factory=factory, product=self.bar, quantity=3)
+        FactoryWarehouse.objects.create(factory=factory, product=self.milk, quantity=0)
+
+        user = get_user_model().objects.create_user(username="user", password="x")
+        self.client.force_authenticate(user)
+        self.url = reverse("product-search")
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        return response.data
+
+    def test_ranked_results_and_facets(self):
+        data = self.search(q="chocolate")
+
+        self.assertEqual([row["id"] for row in data["results"]][2], self.cookie.id)
+        self.assertEqual(
+            [row["in_stock"] for row in data["results"][:2]].count(True), 1
+        )
+        self.assertEqual(
+            data["facets"],
+            {
+                "categories": [
+                    {"id": self.sweets.id, "name": "Sweets", "count": 2},
+                    {"id": self.drinks.id, "name": "Drinks", "count": 1},
+                ],
+                "availability": {"in_stock": 1, "out_of_stock": 2},
+            },
+        )
+
+    def test_facet_filters(self):
+        data = self.search(q="chocolate", category=self.sweets.id, in_stock="false")
+
+        self.assertEqual([row["id"] for row in data["results"]], [self.cookie.id])
+        self.assertEqual(
+            data["facets"]["categories"],
+            [
+                {"id": self.drinks.id, "name": "Drinks", "count": 1},
+                {"id": self.sweets.id, "name": "Sweets", "count": 1},
+            ],
+        )
+        self.assertEqual(
+            data["facets"]["availability"], {"in_stock": 1, "out_of_stock": 1}
+        )
+
+    def test_category_name_is_searchable(self):
+        self.assertEqual(self.search(q="drinks")["count"], 1)
+
+        self.drinks.name = "Beverages"
+        self.drinks.save()
+
+        self.assertEqual(self.search(q="drinks")["count"], 0)
+        self.assertEqual(self.search(q="beverages")["count"], 1)
+
+    def test_typos_are_tolerated(self):
+        if not trigram_available():
+            self.skipTest("pg_trgm is not installed")
+
+        data = self.search(q="choclate")
+
+        self.assertIn(self.bar.id, [row["id"] for row in data["results"]])
+
+    def test_autocomplete(self):
+        response = self.client.get(reverse("product-autocomplete"), {"q": "Choc"})
+
+        self.assertEqual(
+            response.data,
+            [
+                {"id": self.milk.id, "name": "Chocolate milk"},
+                {"id": self.bar.id, "name": "Dark chocolate bar"},
+            ],
+        )
+        response = self.client.get(reverse("product-autocomplete"), {"q": "dark choc"})
+        self.assertEqual([row["id"] for row in response.data], [self.bar.id])
+
+    def test_invalid_parameters(self):
+        for params in [{}, {"q": "!!"}, {"q": "milk", "in_stock": "maybe"}]:
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,277 @@
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import ProtectedError
+from django.test import SimpleTestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core import sharding
+from core.models import (
+    Carrier,
+    Delivery,
+    Factory,
+    FactoryWarehouse,
+    Product,
+    ProductOrder,
+    SalePoint,
+    SalePointShard,
+    StockMovement,
+)
+from core.pagination import CappedCountPagination
+from core.sharding import ID_BLOCK, OrderShardRouter, order_shard
+from core.tracking import visible_deliveries
+
+
+class OrderShardRouterTest(SimpleTestCase):
+
+    def test_order_ids_name_their_shard(self):
+        self.assertEqual(order_shard(1), "default")
+        self.assertEqual(order_shard("abc"), "default")
+        self.assertEqual(order_shard(ID_BLOCK * 1000), "default")
+        for index, alias in enumerate(settings.ORDER_SHARDS):
+            self.assertEqual(order_shard(index * ID_BLOCK + 5), alias)
+
+    def test_only_orders_follow_their_shard(self):
+        router = OrderShardRouter()
+        order = ProductOrder(sale_point_id=1)
+        order._state.db = "orders_1"
+
+        self.assertEqual(router.db_for_read(ProductOrder, instance=order), "orders_1")
+        self.assertEqual(router.db_for_write(StockMovement, instance=order), "default")
+        self.assertEqual(router.db_for_read(Product, instance=order), "default")
+        self.assertEqual(router.db_for_read(ProductOrder), "default")
+        self.assertTrue(router.allow_relation(order, Product()))
+        self.assertIsNone(router.allow_relation(Product(), Factory()))
+        self.assertFalse(
+            router.allow_migrate("orders_1", "core", model_name="salepointshard")
+        )
+        self.assertIsNone(
+            router.allow_migrate("orders_1", "core", model_name="productorder")
+        )
+
+
+@unittest.skipUnless(
+    len(settings.ORDER_SHARDS) > 1, "Set ORDER_SHARDS to test with several databases"
+)
+class ShardedOrdersTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.product = Product.objects.create(name="Product", price=2.5, weight=1)
+        FactoryWarehouse.objects.create(
+            factory=self.factory, product=self.product, quantity=100
+        )
+        self.sale_points = [
+            SalePoint.objects.create(name=f"Sale Point {index}", address="B")
+            for index in range(2)
+        ]
+        self.orders = ProductOrder.create_orders(
+            [
+                (self.product, quantity, sale_point)
+                for quantity in [1, 2]
+                for sale_point in self.sale_points
+            ]
+        )
+        self.admin = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+
+    def test_sale_points_are_spread_over_shards(self):
+        shards = dict(SalePointShard.objects.values_list("sale_point", "database"))
+        first, second = [shards[sale_point.id] for sale_point in self.sale_points]
+
+        self.assertNotEqual(first, second)
+        for order in self.orders:
+            self.assertEqual(order._state.db, shards[order.sale_point_id])
+            self.assertEqual(order_shard(order.id), order._state.db)
+            self.assertEqual(StockMovement.objects.filter(order_id=order.id).count(), 1)
+        self.assertEqual(
+            ProductOrder.objects.using(second)
+            .filter(sale_point=self.sale_points[0])
+            .count(),
+            0,
+        )
+        self.assertEqual(FactoryWarehouse.objects.get().quantity, 94)
+
+    def test_admin_list_merges_shards(self):
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.get(reverse("productorder-list"), {"fields": "id"})
+
+        self.assertEqual(response.data["count"], 4)
+        expected = sorted(self.orders, key=lambda order: (order.order_date, order.id))
+        self.assertEqual(
+            [row["id"] for row in response.data["results"]],
+            [order.id for order in expected],
+        )
+
+    def test_admin_list_pages_across_shards(self):
+        self.client.force_authenticate(self.admin)
+        url = reverse("productorder-list")
+        expected = sorted(self.orders, key=lambda order: (order.order_date, order.id))
+
+        with mock.patch.object(CappedCountPagination, "page_size", 3):
+            pages = [
+                self.client.get(url, {"page": page, "fields": "id"}).data
+                for page in [1, 2]
+            ]
+
+        self.assertEqual(
+            [row["id"] for page in pages for row in page["results"]],
+            [order.id for order in expected],
+        )
+        self.assertIsNone(pages[1]["next"])
+
+    def test_sale_point_user_reads_one_shard(self):
+        user = get_user_model().objects.create_user(username="user", password="x")
+        user.sale_points.add(self.sale_points[1])
+        self.client.force_authenticate(user)
+        own = [
+            order for order in self.orders if order.sale_point == self.sale_points[1]
+        ]
+
+        response = self.client.get(reverse("productorder-list"))
+        detail = self.client.get(reverse("productorder-detail", args=[own[0].id]))
+        other = self.client.get(
+            reverse("productorder-detail", args=[self.orders[0].id])
+        )
+
+        self.assertEqual(
+            [row["id"] for row in response.data["results"]],
+            [order.id for order in own],
+        )
+        self.assertEqual(detail.data["id"], own[0].id)
+        self.assertEqual(other.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_status_updates_reach_every_shard(self):
+        self.client.force_authenticate(self.admin)
+
+        response = self.client.patch(
+            reverse("productorder-bulk-update-status"),
+            [{"id": order.id, "status": "delivery"} for order in self.orders],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sum(
+                sharding.gather(
+                    lambda alias: ProductOrder.objects.using(alias)
+                    .filter(status="delivery")
+                    .count()
+                )
+            ),
+            4,
+        )
+
+    def test_sales_report_sums_rollups_of_all_shards(self):
+        self.client.force_authenticate(self.admin)
+        today = timezone.now().date()
+
+        response = self.client.get(reverse("analytics-sales"))
+
+        self.assertEqual(
+            response.data,
+            [
+                {
+                    "day": today,
+                    "orders": 4,
+                    "quantity": 6,
+                    "revenue": "15.00",
+                }
+            ],
+        )
+
+    def test_sale_points_see_deliveries_of_their_orders(self):
+        delivery = Delivery.objects.create(
+            carrier=Carrier.objects.create(name="Carrier"), cost=1
+        )
+        order = next(order for order in self.orders if order._state.db != "default")
+        order.deliveries.add(delivery)
+        user = get_user_model().objects.create_user(username="user", password="x")
+        user.sale_points.add(order.sale_point_id)
+
+        self.assertEqual(list(visible_deliveries(user)), [delivery])
+        # The link is stored next to the order
+        self.assertEqual(
+            list(
+                order.deliveries.through.objects.using(order._state.db).values_list(
+                    "productorder_id", "delivery_id"
+                )
+            ),
+            [(order.id, delivery.id)],
+        )
+
+    def test_admin_reads_and_writes_orders_on_their_shard(self):
+        self.client.force_login(self.admin)
+        order = next(order for order in self.orders if order._state.db != "default")
+        alias = order._state.db
+        changelist = reverse("admin:core_productorder_changelist")
+
+        listed = self.client.get(changelist, {"shard": alias})
+        detail = self.client.get(
+            reverse("admin:core_productorder_change", args=[order.id])
+        )
+        self.client.post(
+            f"{changelist}?shard={alias}",
+            {
+                "action": "mark_delivered",
+                "index": 0,
+                ACTION_CHECKBOX_NAME: [order.id],
+            },
+        )
+        unknown = self.client.get(changelist, {"shard": "unknown"})
+
+        self.assertEqual(
+            {row.id for row in listed.context["cl"].result_list},
+            {row.id for row in self.orders if row._state.db == alias},
+        )
+        self.assertEqual(detail.context["original"], order)
+        order.refresh_from_db()
+        self.assertEqual(order.status, "delivered")
+        self.assertRedirects(unknown, f"{changelist}?e=1")
+
+    def test_deletes_see_orders_on_other_shards(self):
+        sale_point = next(
+            sale_point
+            for sale_point in self.sale_points
+            if sharding.shard_for(sale_point.id) != "default"
+        )
+        product = Product.objects.create(name="Other", price=1, weight=1)
+        FactoryWarehouse.objects.create(
+            factory=self.factory, product=product, quantity=5
+        )
+        ProductOrder.create_orders([(product, 1, sale_point)])
+        self.client.force_login(self.admin)
+
+        confirm = self.client.get(
+            reverse("admin:core_product_delete", args=[product.id])
+        )
+        with self.assertRaises(ProtectedError):
+            product.delete()
+        self.factory.delete()
+
+        self.assertTrue(confirm.context["protected"])
+        self.assertTrue(Product.objects.filter(id=product.id).exists())
+        self.assertEqual(
+            sharding.gather(
+                lambda alias: ProductOrder.objects.using(alias)
+                .exclude(factory=None)
+                .count()
+            ),
+            [0] * len(settings.ORDER_SHARDS),
+        )
+
+    def test_shards_start_in_their_own_id_block(self):
+        for index, alias in enumerate(settings.ORDER_SHARDS[1:], start=1):
+            with connections[alias].cursor() as cursor:
+                cursor.execute("SELECT last_value FROM core_productorder_id_seq")
+                self.assertGreaterEqual(cursor.fetchone()[0], index * ID_BLOCK)
@@ -0,0 +1,109 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import (
+    Factory,
+    FactoryWarehouse,
+    Product,
+    StockMovement,
+    StockSnapshot,
+)
+from core.stock import reconcile, stock_at, take_snapshot
+
+
+class StockLedgerTest(APITestCase):
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.product = Product.objects.create(name="Product", price=1, weight=1)
+        self.user = get_user_model().objects.create_user(
+            username="factory", password="password"
+        )
+        self.user.groups.add(Group.objects.get(name="factory"))
+        self.user.factories.add(self.factory)
+        self.client.force_authenticate(self.user)
+        self.url = reverse("factorywarehouse-product-counts")
+
+    def test_stock_sync_writes_movements(self):
+        self.client.post(
+            self.url, [{"product": self.product.id, "quantity": 10}], format="json"
+        )
+        self.client.put(
+            self.url, [{"product": self.product.id, "quantity": 7}], format="json"
+        )
+
+        self.assertEqual(
+            list(StockMovement.objects.order_by("id").values_list("kind", "delta")),
+            [("restock", 10), ("adjustment", -3)],
+        )
+        self.assertEqual(reconcile(self.factory.id), {})
+
+    def test_deleting_a_row_writes_movement(self):
+        row = FactoryWarehouse.objects.create(
+            factory=self.factory, product=self.product, quantity=5
+        )
+
+        self.client.delete(reverse("factorywarehouse-detail", args=[row.id]))
+
+        self.assertEqual(
+            list(StockMovement.objects.values_list("kind", "delta")),
+            [("adjustment", -5)],
+        )
+
+    def test_stock_at_uses_snapshot_and_later_movements(self):
+        now = timezone.now()
+        hour = datetime.timedelta(hours=1)
+        for delta, created_at in [(10, now - 3 * hour), (-4, now - 2 * hour)]:
+            StockMovement.objects.create(
+                factory=self.factory,
+                product=self.product,
+                kind="restock",
+                delta=delta,
+                created_at=created_at,
+            )
+
+        take_snapshot(self.factory.id, now - 2 * hour)
+        StockMovement.objects.filter(created_at__lt=now - hour).delete()
+        StockMovement.objects.create(
+            factory=self.factory, product=self.product, kind="reservation", delta=-1
+        )
+
+        self.assertEqual(StockSnapshot.objects.get().quantity, 6)
+        self.assertEqual(stock_at(self.factory.id, now - hour), {self.product.id: 6})
+        self.assertEqual(
+            stock_at(self.factory.id, timezone.now()), {self.product.id: 5}
+        )
+
+        response = self.client.get(
+            reverse("factorywarehouse-stock-at"), {"at": timezone.now().isoformat()}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [{"product": self.product.id, "quantity": 5}])
+
+    def test_movement_report(self):
+        StockMovement.record(self.factory.id, self.product.id, "restock", 3)
+        other_factory = Factory.objects.create(name="Other", address="B")
+        StockMovement.record(other_factory.id, self.product.id, "restock", 8)
+
+        response = self.client.get(
+            reverse("factorywarehouse-movements"), {"kind": "restock"}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 1)
+        self.assertEqual(response.data["results"][0]["delta"], 3)
+
+        response = self.client.get(
+            reverse("factorywarehouse-movements"), {"product": self.product.id}
+        )
+        self.assertEqual(response.data["count"], 1)
+        response = self.client.get(
+            reverse("factorywarehouse-movements"), {"product": "abc"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
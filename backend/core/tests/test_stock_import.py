@@ -0,0 +1,185 @@
+import io
+import tempfile
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Factory, FactoryWarehouse, Product, StockMovement
+from core.stock import reconcile
+from core.stock_import import import_stock
+
+
+class StockImportTest(APITestCase):
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.products = [
+            Product.objects.create(name=f"Product {index}", price=1, weight=1)
+            for index in range(4)
+        ]
+        FactoryWarehouse.objects.create(
+            factory=self.factory, product=self.products[0], quantity=5
+        )
+        FactoryWarehouse.objects.create(
+            factory=self.factory, product=self.products[1], quantity=2
+        )
+        StockMovement.record(self.factory.id, self.products[0].id, "restock", 5)
+        StockMovement.record(self.factory.id, self.products[1].id, "restock", 2)
+
+        self.user = get_user_model().objects.create_user(username="user", password="x")
+        self.user.groups.add(Group.objects.get(name="factory"))
+        self.user.factories.add(self.factory)
+        self.client.force_authenticate(self.user)
+        self.url = reverse("factorywarehouse-import-stock")
+
+    def upload(self, lines, mode=None):
+        upload = SimpleUploadedFile(
+            "stock.csv", "\n".join(lines).encode("utf-8-sig"), "text/csv"
+        )
+        return self.client.post(
+            self.url + (f"?mode={mode}" if mode else ""),
+            {"file": upload},
+            format="multipart",
+        )
+
+    def stock(self):
+        return dict(
+            FactoryWarehouse.objects.filter(factory=self.factory).values_list(
+                "product", "quantity"
+            )
+        )
+
+    def test_set_counts(self):
+        first, second, third, fourth = [product.id for product in self.products]
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload(
+                [
+                    "sku,Product,quantity",
+                    f"A-1,{first},8",
+                    f'"A-2",{second}," 2 "',
+                    f"A-3,{third},4",
+                    f"A-4,{fourth},0",
+                ]
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(
+            response.data, {"rows": 4, "created": 1, "updated": 1, "unchanged": 2}
+        )
+        self.assertEqual(self.stock(), {first: 8, second: 2, third: 4})
+        self.assertEqual(
+            list(
+                StockMovement.objects.filter(kind="adjustment")
+                .order_by("product")
+                .values_list("product", "delta")
+            ),
+            [(first, 3), (third, 4)],
+        )
+        self.assertEqual(reconcile(self.factory.id), {})
+
+    def test_add_counts(self):
+        first, second = self.products[0].id, self.products[1].id
+        response = self.upload(["product,quantity", f"{first},1", f"{second},0"], "add")
+
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(self.stock(), {first: 6, second: 2})
+        self.assertEqual(reconcile(self.factory.id), {})
+
+    def test_invalid_lines_are_reported_and_nothing_is_written(self):
+        first = self.products[0].id
+        response = self.upload(
+            [
+                "product,quantity",
+                f"{first},1",
+                "abc,1",
+                "999999,1",
+                f"{first},2",
+                f"{self.products[2].id},-1",
+                f"{self.products[3].id},99999999999",
+            ]
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["errors"],
+            [
+                {"line": 3, "error": "Product must be a product id."},
+                {"line": 4, "error": "Product 999999 does not exist."},
+                {"line": 5, "error": f"Product {first} is already on line 2."},
+                {"line": 6, "error": "Quantity must be a non-negative integer."},
+                {"line": 7, "error": "Quantity must be a non-negative integer."},
+            ],
+        )
+        self.assertEqual(self.stock()[first], 5)
+
+    def test_malformed_files_are_rejected(self):
+        for lines, error in [
+            (["name,count", "1,1"], "Missing column product, quantity."),
+            (["product,quantity", "1,1,1"], "extra data after last expected column"),
+        ]:
+            with self.subTest(lines=lines):
+                response = self.upload(lines)
+
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertIn(error, response.data["errors"][0]["error"])
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as csv_file:
+            csv_file.write(f"product,quantity\n{self.products[2].id},7\n")
+            csv_file.flush()
+            stdout = io.StringIO()
+
+            call_command("import_stock", self.factory.id, csv_file.name, stdout=stdout)
+            with self.assertRaises(CommandError):
+                call_command("import_stock", 0, csv_file.name)
+
+        self.assertIn("1 created", stdout.getvalue())
+        self.assertEqual(self.stock()[self.products[2].id], 7)
+
+
+class ConcurrentStockImportTest(TransactionTestCase):
+
+    def test_ledger_follows_a_reservation_committed_during_the_import(self):
+        factory = Factory.objects.create(name="Factory", address="A")
+        product = Product.objects.create(name="Product", price=1, weight=1)
+        row = FactoryWarehouse.objects.create(
+            factory=factory, product=product, quantity=10
+        )
+        StockMovement.record(factory.id, product.id, "restock", 10)
+        locked = threading.Event()
+
+        def reserve():
+            try:
+                with transaction.atomic():
+                    reserved = FactoryWarehouse.objects.select_for_update().get(
+                        id=row.id
+                    )
+                    locked.set()
+                    # The import reads the row while it is locked here
+                    time.sleep(0.3)
+                    reserved.quantity -= 3
+                    reserved.save(update_fields=["quantity"])
+                    StockMovement.record(factory.id, product.id, "reservation", -3)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=reserve)
+        thread.start()
+        locked.wait(timeout=5)
+        import_stock(
+            factory.id, io.BytesIO(f"product,quantity\n{product.id},4\n".encode())
+        )
+        thread.join()
+
+        row.refresh_from_db()
+        self.assertEqual(row.quantity, 4)
+        self.assertEqual(reconcile(factory.id), {})
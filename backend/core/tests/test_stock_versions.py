@@ -0,0 +1,149 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import (
+    Factory,
+    FactoryWarehouse,
+    Product,
+    ProductOrder,
+    SalePoint,
+    StockMovement,
+)
+from core.stock import reconcile
+
+
+class StockVersionTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.product = Product.objects.create(name="Product", price=1, weight=1)
+        self.other = Product.objects.create(name="Other", price=1, weight=1)
+        self.row = FactoryWarehouse.objects.create(
+            factory=self.factory, product=self.product, quantity=10
+        )
+        self.other_row = FactoryWarehouse.objects.create(
+            factory=self.factory, product=self.other, quantity=5
+        )
+        self.user = get_user_model().objects.create_user(
+            username="factory", password="password"
+        )
+        self.user.groups.add(Group.objects.get(name="factory"))
+        self.user.factories.add(self.factory)
+        self.client.force_authenticate(self.user)
+        self.url = reverse("factorywarehouse-product-counts")
+        self.detail = reverse("factorywarehouse-detail", args=[self.row.id])
+
+    def test_every_update_moves_the_version_on(self):
+        stale = FactoryWarehouse.objects.get(pk=self.row.pk)
+        sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        ProductOrder.create_order(ProductOrder, self.product, 2, sale_point)
+
+        stale.save()
+
+        self.row.refresh_from_db()
+        self.assertEqual(self.row.version, 2)
+
+    def test_sync_with_current_versions(self):
+        response = self.client.put(
+            self.url,
+            [
+                {"product": self.product.id, "quantity": 7, "version": 0},
+                {"product": self.other.id, "quantity": 5, "version": 0},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(row["product_id"], row["version"]) for row in response.data],
+            [(self.product.id, 1), (self.other.id, 0)],
+        )
+        self.assertEqual(
+            list(StockMovement.objects.values_list("kind", "delta")),
+            [("adjustment", -3)],
+        )
+
+    def test_stale_rows_are_reported_and_nothing_is_written(self):
+        sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        ProductOrder.create_order(ProductOrder, self.product, 2, sale_point)
+
+        response = self.client.put(
+            self.url,
+            [
+                {"product": self.other.id, "quantity": 1, "version": 0},
+                {"product": self.product.id, "quantity": 20, "version": 0},
+            ],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(
+            response.data,
+            {"conflicts": [{"product": self.product.id, "quantity": 8, "version": 1}]},
+        )
+        self.other_row.refresh_from_db()
+        self.assertEqual(self.other_row.quantity, 5)
+        self.assertEqual(StockMovement.objects.exclude(kind="reservation").count(), 0)
+
+    def test_sync_without_versions_keeps_the_ledger(self):
+        sale_point = SalePoint.objects.create(name="Sale Point", address="B")
+        ProductOrder.create_order(ProductOrder, self.product, 2, sale_point)
+        StockMovement.objects.create(
+            factory=self.factory, product=self.product, kind="restock", delta=10
+        )
+        StockMovement.objects.create(
+            factory=self.factory, product=self.other, kind="restock", delta=5
+        )
+
+        response = self.client.put(
+            self.url, [{"product": self.product.id, "quantity": 3}], format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["version"], 2)
+        self.assertEqual(reconcile(self.factory.id), {})
+
+    def test_unknown_product_is_not_found(self):
+        response = self.client.put(
+            self.url, [{"product": 0, "quantity": 3}], format="json"
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_detail_has_etag(self):
+        response = self.client.get(self.detail)
+
+        self.assertEqual(response["ETag"], '"0"')
+        self.assertEqual(response.data["version"], 0)
+
+    def test_if_match_writes_current_version_only(self):
+        stale = self.client.patch(
+            self.detail, {"quantity": 4}, format="json", HTTP_IF_MATCH='"3"'
+        )
+        updated = self.client.patch(
+            self.detail, {"quantity": 4}, format="json", HTTP_IF_MATCH='W/"0"'
+        )
+
+        self.assertEqual(stale.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(stale["ETag"], '"0"')
+        self.assertEqual(stale.data["quantity"], 10)
+        self.assertEqual(updated.status_code, status.HTTP_200_OK)
+        self.assertEqual(updated["ETag"], '"1"')
+        self.assertEqual(updated.data["quantity"], 4)
+
+    def test_delete_with_stale_if_match_keeps_the_row(self):
+        self.client.patch(self.detail, {"quantity": 4}, format="json")
+
+        stale = self.client.delete(self.detail, HTTP_IF_MATCH='"0"')
+        deleted = self.client.delete(self.detail, HTTP_IF_MATCH='"1"')
+
+        self.assertEqual(stale.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertEqual(deleted.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(FactoryWarehouse.objects.filter(pk=self.row.pk).exists())
+        self.assertEqual(
+            list(StockMovement.objects.values_list("delta", flat=True)), [-6, -4]
+        )
@@ -0,0 +1,78 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import Factory, FactoryWarehouse, Product
+from core.throttling import ConcurrencyLimitMiddleware, LocalStore
+
+
+class TokenBucketTest(SimpleTestCase):
+
+    def test_bucket_refills_at_rate(self):
+        store = LocalStore()
+        with mock.patch("core.throttling.time.monotonic", return_value=100.0):
+            self.assertEqual(store.take("key", 2, 2), 0)
+            self.assertEqual(store.take("key", 2, 2), 0)
+            self.assertEqual(store.take("key", 2, 2), 0.5)
+        with mock.patch("core.throttling.time.monotonic", return_value=100.5):
+            self.assertEqual(store.take("key", 2, 2), 0)
+
+    @override_settings(CONCURRENCY_LIMITS={"": 1}, CONCURRENCY_RETRY_AFTER=2)
+    def test_concurrency_limit_sheds_writes(self):
+        store = LocalStore()
+        responses = []
+
+        def view(request):
+            # Second request arrives while the first one is in flight
+            responses.append(middleware(RequestFactory().post("/product_order/")))
+            return "ok"
+
+        middleware = ConcurrencyLimitMiddleware(view)
+        with mock.patch("core.throttling.get_store", return_value=store):
+            self.assertEqual(middleware(RequestFactory().post("/factory/")), "ok")
+            self.assertEqual(middleware(RequestFactory().get("/factory/")), "ok")
+
+        self.assertEqual(responses[0].status_code, 429)
+        self.assertEqual(responses[0]["Retry-After"], "2")
+        self.assertEqual(store.counters, {"concurrency-slots:": 0})
+
+
+class EndpointThrottleTest(APITestCase):
+
+    def setUp(self):
+        self.factory = Factory.objects.create(name="Factory", address="A")
+        self.product = Product.objects.create(name="Product", price=1, weight=1)
+        FactoryWarehouse.objects.create(
+            factory=self.factory, product=self.product, quantity=5
+        )
+        self.user = get_user_model().objects.create_user(
+            username="factory", password="password"
+        )
+        self.user.groups.add(Group.objects.get(name="factory"))
+        self.user.factories.add(self.factory)
+        self.client.force_authenticate(self.user)
+
+    def test_stock_sync_is_throttled(self):
+        rest_framework = {
+            "DEFAULT_THROTTLE_CLASSES": ["core.throttling.EndpointWriteThrottle"],
+            "DEFAULT_THROTTLE_RATES": {"stock_sync": "2/min"},
+        }
+        url = reverse("factorywarehouse-product-counts")
+        data = [{"product": self.product.id, "quantity": 1}]
+
+        with override_settings(REST_FRAMEWORK=rest_framework), mock.patch(
+            "core.throttling.get_store", return_value=LocalStore()
+        ):
+            codes = [
+                self.client.put(url, data, format="json").status_code for _ in range(3)
+            ]
+            read = self.client.get(url)
+
+        self.assertEqual(codes[:2], [status.HTTP_200_OK] * 2)
+        self.assertEqual(codes[2], status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(read.status_code, status.HTTP_200_OK)
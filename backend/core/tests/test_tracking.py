@@ -0,0 +1,165 @@
+import datetime
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from core.models import (
+    Carrier,
+    Delivery,
+    DeliveryPosition,
+    Product,
+    ProductOrder,
+    SalePoint,
+    TrackingEvent,
+)
+
+
+class DeliveryTrackingTest(APITestCase):
+    databases = "__all__"
+
+    def setUp(self):
+        carrier = Carrier.objects.create(name="Carrier")
+        self.deliveries = [
+            Delivery.objects.create(carrier=carrier, cost=1) for _ in range(2)
+        ]
+        self.other = Delivery.objects.create(
+            carrier=Carrier.objects.create(name="Other"), cost=1
+        )
+        self.carrier_user = get_user_model().objects.create_user(
+            username="carrier", password="x"
+        )
+        self.carrier_user.carriers.add(carrier)
+        self.client.force_authenticate(self.carrier_user)
+        self.url = reverse("delivery-ingest-tracking")
+        self.now = timezone.now().replace(microsecond=0)
+
+    def ping(self, delivery, minutes, status="in_transit", latitude=50.45):
+        return {
+            "delivery": delivery.id,
+            "status": status,
+            "latitude": latitude,
+            "longitude": 30.52,
+            "recorded_at": (self.now - datetime.timedelta(minutes=minutes)).isoformat(),
+        }
+
+    def test_ingest_writes_events_and_latest_positions(self):
+        first, second = self.deliveries
+        response = self.client.post(
+            self.url,
+            [
+                self.ping(first, 10, "picked_up"),
+                self.ping(first, 1, latitude=51.0),
+                self.ping(first, 5),
+                self.ping(second, 3, "arrived"),
+            ],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data, {"ingested": 4})
+        self.assertEqual(TrackingEvent.objects.count(), 4)
+        self.assertEqual(
+            list(
+                DeliveryPosition.objects.order_by("delivery").values_list(
+                    "delivery", "status", "latitude"
+                )
+            ),
+            [(first.id, "in_transit", 51.0), (second.id, "arrived", 50.45)],
+        )
+
+        # An older ping arriving late does not move the position back
+        self.client.post(self.url, [self.ping(second, 30, "picked_up")], format="json")
+        self.assertEqual(
+            DeliveryPosition.objects.get(delivery=second).status, "arrived"
+        )
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT count(*) FROM pg_inherits "
+                "WHERE inhparent = 'core_trackingevent'::regclass"
+            )
+            self.assertGreater(cursor.fetchone()[0], 1)
+
+    def test_invalid_batches_are_rejected(self):
+        valid = self.ping(self.deliveries[0], 1)
+        future = self.ping(self.deliveries[0], -60)
+        for rows, errors in [
+            ([valid, {**valid, "latitude": 91}], {1: ["latitude"]}),
+            (
+                [{**valid, "status": "lost", "recorded_at": "yesterday"}],
+                {0: ["status", "recorded_at"]},
+            ),
+            ([future], {0: ["recorded_at"]}),
+            ([valid, self.ping(self.other, 1)], {1: ["delivery"]}),
+        ]:
+            with self.subTest(rows=rows):
+                response = self.client.post(self.url, rows, format="json")
+
+                self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+                self.assertEqual(
+                    {
+                        index: list(fields)
+                        for index, fields in response.data["errors"].items()
+                    },
+                    errors,
+                )
+        self.assertFalse(TrackingEvent.objects.exists())
+
+    def test_csv_batches_are_accepted(self):
+        ping = self.ping(self.deliveries[0], 1)
+        body = ",".join(ping) + "\n" + ",".join(str(value) for value in ping.values())
+
+        response = self.client.post(self.url, body, content_type="text/csv")
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            TrackingEvent.objects.get().recorded_at,
+            self.now - datetime.timedelta(minutes=1),
+        )
+
+    def test_history_and_positions_are_scoped(self):
+        self.client.post(
+            self.url,
+            [self.ping(self.deliveries[0], minutes) for minutes in (3, 2, 1)],
+            format="json",
+        )
+
+        response = self.client.get(
+            reverse("delivery-tracking-history", args=[self.deliveries[0].id]),
+            {"after": (self.now - datetime.timedelta(minutes=3)).isoformat()},
+        )
+        self.assertEqual(response.data["count"], 2)
+        response = self.client.get(reverse("delivery-tracking-history", args=["abc"]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        sale_point = SalePoint.objects.create(name="Sale Point", address="A")
+        order = ProductOrder.objects.create(
+            sale_point=sale_point,
+            product=Product.objects.create(name="Product", price=1, weight=1),
+            quantity=1,
+            delivery_cost=1,
+        )
+        order.deliveries.add(self.deliveries[0])
+        sale_point_user = get_user_model().objects.create_user(
+            username="sale_point", password="x"
+        )
+        sale_point_user.sale_points.add(sale_point)
+        self.client.force_authenticate(sale_point_user)
+
+        response = self.client.get(reverse("delivery-positions"))
+        self.assertEqual(
+            [row["delivery"] for row in response.data["results"]],
+            [self.deliveries[0].id],
+        )
+        response = self.client.get(
+            reverse("delivery-tracking-history", args=[self.other.id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.post(
+            self.url, [self.ping(self.deliveries[0], 1)], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,49 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.test import TestCase, override_settings
+
+from core.models import Product
+from core.warmup import connect_threads, warm_up
+
+
+@override_settings(AVAILABILITY_INDEX=False)
+class WarmUpTest(TestCase):
+
+    def test_caches_are_primed(self):
+        ContentType.objects.clear_cache()
+
+        timings = warm_up()
+
+        self.assertEqual(
+            list(timings),
+            ["database", "urls", "content_types", "search", "availability"],
+        )
+        with self.assertNumQueries(0):
+            ContentType.objects.get_for_model(Product)
+
+    def test_failed_steps_do_not_stop_the_worker(self):
+        with mock.patch("core.warmup.get_index", side_effect=RuntimeError):
+            with self.assertLogs("core.warmup", "ERROR"):
+                timings = warm_up(timeout=0)
+
+        self.assertIn("availability", timings)
+
+    def test_every_request_thread_is_connected(self):
+        barrier = threading.Barrier(3)
+
+        def check_and_close():
+            barrier.wait(5)
+            connected = connections["default"].connection is not None
+            connections.close_all()
+            return connected
+
+        with ThreadPoolExecutor(3) as executor:
+            connect_threads(executor, 3, timeout=5)
+            self.assertEqual(len(executor._threads), 3)
+            results = [executor.submit(check_and_close) for _ in range(3)]
+
+        self.assertEqual([future.result() for future in results], [True] * 3)
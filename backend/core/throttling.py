@@ -0,0 +1,230 @@
+import math
+import secrets
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import JsonResponse
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = clock[1] + clock[2] / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - updated, 0) * rate)
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    wait = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+# Slots are members of a sorted set scored by the time they expire at, so a
+# slot that is never released (a killed worker) is dropped after the timeout
+# however busy the key is
+ACQUIRE_SCRIPT = """
+local clock = redis.call('TIME')
+local now = clock[1] * 1000 + math.floor(clock[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[2]), ARGV[3])
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+
+class LocalStore:
+    # Per-process stand-in for the shared store, used when THROTTLE_STORE_URL
+    # is empty (development, tests, single worker deployments)
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.counters = {}
+
+    def take(self, key, rate, capacity, cost=1):
+        # Returns 0 when the tokens were taken, else the seconds to wait
+        with self.lock:
+            now = time.monotonic()
+            tokens, updated = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            wait = 0
+            if tokens >= cost:
+                tokens -= cost
+            else:
+                wait = (cost - tokens) / rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > 10000:
+                self.prune(now)
+            return wait
+
+    def prune(self, now):
+        # Buckets that have not been touched for a minute are full again for
+        # every rate we use, so forgetting them changes nothing
+        for key, (_, updated) in list(self.buckets.items()):
+            if now - updated > 60:
+                del self.buckets[key]
+
+    def acquire(self, key, limit, timeout):
+        # Returns a slot to release, or None when `limit` are taken. Slots
+        # are only counted in this process, so every worker has its own limit.
+        with self.lock:
+            if self.counters.get(key, 0) >= limit:
+                return None
+            self.counters[key] = self.counters.get(key, 0) + 1
+            return True
+
+    def release(self, key, slot):
+        with self.lock:
+            self.counters[key] = max(self.counters.get(key, 0) - 1, 0)
+
+
+class RedisStore:
+    # Shared between all workers and hosts. Buckets and counters are updated by
+    # Lua scripts, so every check is one atomic round trip.
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured(
+                "THROTTLE_STORE_URL is set but the redis package is not installed."
+            )
+        self.client = redis.Redis.from_url(url)
+        self.take_script = self.client.register_script(TOKEN_BUCKET_SCRIPT)
+        self.acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+
+    def take(self, key, rate, capacity, cost=1):
+        return float(self.take_script(keys=[key], args=[rate, capacity, cost]))
+
+    def acquire(self, key, limit, timeout):
+        # Each slot expires `timeout` seconds after it was taken, so slots
+        # leaked by killed workers come back
+        slot = secrets.token_hex(8)
+        taken = self.acquire_script(keys=[key], args=[limit, int(timeout * 1000), slot])
+        return slot if taken else None
+
+    def release(self, key, slot):
+        self.client.zrem(key, slot)
+
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    # "120/min" -> (120, 60), same format as DRF's SimpleRateThrottle
+    count, period = rate.split("/")
+    return int(count), PERIODS[period[0]]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            if settings.THROTTLE_STORE_URL:
+                _store = RedisStore(settings.THROTTLE_STORE_URL)
+            else:
+                _store = LocalStore()
+        return _store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    # Rates use the DRF format, e.g. "120/min": the bucket holds 120 tokens and
+    # refills at 2 per second. Only write requests take tokens.
+    scope = None
+
+    def get_scope(self, view):
+        return self.scope
+
+    def get_principal(self, request):
+        if request.user and request.user.is_authenticated:
+            return f"user:{request.user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        if request.method in SAFE_METHODS:
+            return True
+        scope = self.get_scope(view)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+        if rate is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        key = f"throttle:{scope}:{self.get_principal(request)}"
+        wait = get_store().take(key, capacity / period, capacity)
+        if wait > 0:
+            self.wait_time = wait
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_time
+
+
+class PrincipalWriteThrottle(TokenBucketThrottle):
+    # All write requests of one user or address
+    scope = "writes"
+
+
+class EndpointWriteThrottle(TokenBucketThrottle):
+    # Write requests of one user or address to the views or actions that set
+    # `throttle_scope`
+    def get_scope(self, view):
+        return getattr(view, "throttle_scope", None)
+
+
+class ConcurrencyLimitMiddleware:
+    # Sheds write requests with 429 once CONCURRENCY_LIMITS requests for the same
+    # path prefix are in flight, before they pile up on database locks. The
+    # longest matching prefix wins; "" limits all writes. The limits are global
+    # only with THROTTLE_STORE_URL set; otherwise they apply per worker process.
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.limits = sorted(
+            settings.CONCURRENCY_LIMITS.items(), key=lambda item: -len(item[0])
+        )
+
+    def __call__(self, request):
+        if request.method in SAFE_METHODS:
+            return self.get_response(request)
+        prefix, limit = next(
+            (
+                (prefix, limit)
+                for prefix, limit in self.limits
+                if request.path.startswith(prefix)
+            ),
+            (None, None),
+        )
+        if not limit:
+            return self.get_response(request)
+
+        key = f"concurrency-slots:{prefix}"
+        store = get_store()
+        slot = store.acquire(key, limit, settings.CONCURRENCY_SLOT_TIMEOUT)
+        if slot is None:
+            response = JsonResponse(
+                {"detail": "Too many concurrent requests, retry later."}, status=429
+            )
+            response["Retry-After"] = str(math.ceil(settings.CONCURRENCY_RETRY_AFTER))
+            return response
+        try:
+            return self.get_response(request)
+        finally:
+            store.release(key, slot)
@@ -0,0 +1,174 @@
+import csv
+import datetime
+import io
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core import sharding
+from core.models import Delivery, ProductOrder, TrackingEvent
+
+STATUSES = {value for value, _ in TrackingEvent.STATUS_CHOICES}
+
+COLUMNS = ["delivery_id", "status", "latitude", "longitude", "recorded_at"]
+
+UPSERT_POSITIONS = """
+INSERT INTO core_deliveryposition AS latest
+    (delivery_id, status, latitude, longitude, recorded_at)
+SELECT * FROM unnest(
+    %s::bigint[], %s::varchar[], %s::float8[], %s::float8[], %s::timestamptz[]
+)
+ON CONFLICT (delivery_id) DO UPDATE SET
+    status = EXCLUDED.status,
+    latitude = EXCLUDED.latitude,
+    longitude = EXCLUDED.longitude,
+    recorded_at = EXCLUDED.recorded_at
+WHERE EXCLUDED.recorded_at > latest.recorded_at
+"""
+
+
+def _delivery(value):
+    if isinstance(value, bool):
+        raise ValueError("A valid integer is required.")
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError("A valid integer is required.")
+
+
+def _status(value):
+    if value not in STATUSES:
+        raise ValueError(f'"{value}" is not a valid choice.')
+    return value
+
+
+def _coordinate(limit):
+    def parse(value):
+        try:
+            number = float(value)
+        except (TypeError, ValueError):
+            raise ValueError("A valid number is required.")
+        if not -limit <= number <= limit:
+            raise ValueError(f"Must be between -{limit} and {limit}.")
+        return number
+
+    return parse
+
+
+def _recorded_at(value):
+    # MessagePack bodies carry timestamps as datetimes already
+    if isinstance(value, datetime.datetime):
+        moment = value
+    else:
+        moment = parse_datetime(value) if isinstance(value, str) else None
+    if moment is None:
+        raise ValueError("A valid ISO 8601 datetime is required.")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, datetime.UTC)
+    skew = datetime.timedelta(seconds=settings.TRACKING_MAX_CLOCK_SKEW)
+    if moment > timezone.now() + skew:
+        raise ValueError("Must not be in the future.")
+    return moment
+
+
+FIELDS = [
+    ("delivery", _delivery),
+    ("status", _status),
+    ("latitude", _coordinate(90)),
+    ("longitude", _coordinate(180)),
+    ("recorded_at", _recorded_at),
+]
+
+
+def parse_events(rows):
+    # Batches hold thousands of pings, so rows are checked with plain functions
+    # instead of a serializer. Returns (event tuples in COLUMNS order,
+    # {row index: errors}).
+    events = []
+    errors = {}
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[index] = {"non_field_errors": ["Expected an object."]}
+            continue
+        event = []
+        row_errors = {}
+        for name, parse in FIELDS:
+            if row.get(name) in (None, ""):
+                row_errors[name] = ["This field is required."]
+                continue
+            try:
+                event.append(parse(row[name]))
+            except ValueError as exc:
+                row_errors[name] = [str(exc)]
+        if row_errors:
+            errors[index] = row_errors
+        else:
+            events.append(tuple(event))
+    return events, errors
+
+
+def visible_deliveries(user, admin=False):
+    # Carriers see their own deliveries, sale points the deliveries of their
+    # orders
+    deliveries = Delivery.objects.all()
+    if admin:
+        return deliveries
+    sale_points = list(user.sale_points.values_list("id", flat=True))
+    if not sale_points:
+        return deliveries.filter(carrier__in=user.carriers.all())
+
+    # The orders are on the shards of the sale points, the deliveries in the
+    # default database
+    def linked(alias):
+        return list(
+            ProductOrder.deliveries.through.objects.using(alias)
+            .filter(productorder__sale_point_id__in=sale_points)
+            .values_list("delivery_id", flat=True)
+            .distinct()
+        )
+
+    ids = {
+        id
+        for ids in sharding.gather(linked, sharding.shards_for(sale_points))
+        for id in ids
+    }
+    return deliveries.filter(Q(carrier__in=user.carriers.all()) | Q(id__in=ids))
+
+
+def check_deliveries(events, user, admin=False):
+    ids = {event[0] for event in events}
+    deliveries = Delivery.objects.filter(id__in=ids)
+    if not admin:
+        deliveries = deliveries.filter(carrier__in=user.carriers.all())
+    allowed = set(deliveries.values_list("id", flat=True))
+    return {
+        index: {"delivery": ["Unknown delivery."]}
+        for index, event in enumerate(events)
+        if event[0] not in allowed
+    }
+
+
+def ingest(events, using="default"):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(events)
+    buffer.seek(0)
+
+    latest = {}
+    for event in events:
+        if event[0] not in latest or event[4] > latest[event[0]][4]:
+            latest[event[0]] = event
+    # Sorted by delivery so that concurrent batches lock positions in the same
+    # order
+    positions = [latest[delivery] for delivery in sorted(latest)]
+
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY core_trackingevent ({', '.join(COLUMNS)}) "
+            f"FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        cursor.execute(UPSERT_POSITIONS, [list(column) for column in zip(*positions)])
+    return len(events)
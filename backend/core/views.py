@@ -1,12 +1,22 @@
-from itertools import product
+import datetime
+from itertools import product, takewhile
+from django.conf import settings
 from django.contrib.auth.models import Group
 from django.core.exceptions import ValidationError
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Greatest, Sqrt
 from django.db.models.query import transaction
-from rest_framework import permissions, viewsets
+from django.http import FileResponse, Http404
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from django.utils.http import parse_etags
+from rest_framework import mixins, permissions, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.schemas.coreapi import serializers
+from rest_framework.settings import api_settings
 from rest_framework.views import APIView, status
 
 from core.models import (
@@ -18,22 +28,42 @@ from core.models import (
     SalePoint,
     Carrier,
     Delivery,
+    DeliveryPosition,
+    DemandForecast,
+    ReorderThreshold,
+    SlowQuery,
+    StockAlert,
+    StockMovement,
+    TrackingEvent,
 )
 
 from core.serializers import (
     CreateOrderSerializer,
+    DemandForecastSerializer,
+    FactoryWarehouseRowSerializer,
     GroupSerializer,
     ProductCategorySerializer,
+    ProductCountSerializer,
+    ProductSearchSerializer,
     ProductSerializer,
+    ProductsWithQuantityRowSerializer,
     ProductsWithQuantitySerializer,
     UniversalUserRegistrationSerializer,
     UserSerializer,
     FactorySerializer,
     FactoryWarehouseSerializer,
+    ProductOrderRowSerializer,
     ProductOrderSerializer,
     SalePointSerializer,
+    SlowQueryDetailSerializer,
+    SlowQuerySerializer,
     CarrierSerializer,
+    DeliveryPositionSerializer,
     DeliverySerializer,
+    ReorderThresholdSerializer,
+    StockAlertSerializer,
+    StockMovementSerializer,
+    TrackingEventSerializer,
 )
 
 from core.permissions import (
@@ -44,6 +74,15 @@ from core.permissions import (
     IsSelf,
 )
 
+from core.alerts import stock_changed
+from core.availability import availability, can_reserve, in_stock_rows
+from core.filters import OrderFilterBackend, parse_ids
+from core.onboarding import UsernameConflict, create_users, read_csv, validate_rows
+from core.pagination import CappedCountPagination
+from core.parsers import CSVParser
+from core.rollups import GRANULARITIES, GROUP_BY_FIELDS, sales_report
+from core import bootstrap, profiling, search, sharding, stock, stock_import, tracking
+
 from django.contrib.auth import get_user_model
 
 ExtendedUser = get_user_model()
@@ -73,15 +112,44 @@ class UserViewSet(viewsets.ModelViewSet):
 
 
 class UserInfoView(APIView):
+    def get(self, request):
+        return Response(bootstrap.user_info(request.user))
+
+
+class BootstrapView(APIView):
+    # Everything the page of `role` loads on start in one response, with a
+    # fixed number of queries, see core/bootstrap.py
+    role = None
+
     def get(self, request):
         user = request.user
-        user_data = {
-            "username": user.username,
-            "email": user.email,
-            "role": user.role,
-            "groups": user.groups_list,
-        }
-        return Response(user_data)
+        if self.role == "factory":
+            factory = user.factories.first()
+            if not factory:
+                return Response(
+                    {"error": "User is not associated with any factory."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(bootstrap.factory_page(request, factory))
+
+        if self.role == "sale_point":
+            sale_points = user.sale_points.order_by("name")
+            if not sale_points.exists():
+                return Response(
+                    {"error": "User is not associated with any sale point."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            return Response(bootstrap.sale_point_page(request, sale_points))
+
+        if not (
+            IsCarrierUser().has_permission(request, self)
+            or IsAdminUser().has_permission(request, self)
+        ):
+            return Response(
+                {"error": "User is not associated with any carrier."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(bootstrap.carrier_page(request))
 
 
 class UniversalUserRegistrationViewSet(viewsets.ModelViewSet):
@@ -89,6 +157,57 @@ class UniversalUserRegistrationViewSet(viewsets.ModelViewSet):
     serializer_class = UniversalUserRegistrationSerializer
     permission_classes = [IsAdminUser]
 
+    @action(
+        detail=False,
+        methods=["post"],
+        parser_classes=api_settings.DEFAULT_PARSER_CLASSES + [CSVParser],
+    )
+    def bulk(self, request):
+        # A JSON list, a text/csv body or a CSV file upload of
+        # username, email, role, entity_id and optionally password
+        if "file" in request.FILES:
+            rows = read_csv(request.FILES["file"].read().decode("utf-8-sig"))
+        else:
+            rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {"error": "Data should be a non-empty list of users."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(rows) > settings.ONBOARDING_MAX_ROWS:
+            return Response(
+                {"error": f"At most {settings.ONBOARDING_MAX_ROWS} users per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        rows, errors = validate_rows(rows)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            users = create_users(rows)
+        except UsernameConflict as exc:
+            return Response({"errors": exc.errors}, status=status.HTTP_409_CONFLICT)
+        return Response(
+            {
+                "created": len(users),
+                "users": [
+                    {
+                        "id": user.id,
+                        "username": user.username,
+                        "role": row["role"],
+                        **(
+                            {"password": row["generated_password"]}
+                            if "generated_password" in row
+                            else {}
+                        ),
+                    }
+                    for user, row in zip(users, rows)
+                ],
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
 
 class GroupViewSet(viewsets.ModelViewSet):
     queryset = Group.objects.all().order_by("name")
@@ -118,7 +237,7 @@ class ProductCategoryViewSet(viewsets.ModelViewSet):
 
 
 class ProductViewSet(viewsets.ModelViewSet):
-    queryset = Product.objects.all().order_by("name")
+    queryset = Product.objects.defer("search_vector").order_by("name")
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticated, IsFactoryGroup]
 
@@ -132,6 +251,73 @@ class ProductViewSet(viewsets.ModelViewSet):
         factory = user.factories.first()
         factory.products.add(product)
 
+    @action(detail=False, methods=["get"])
+    def availability(self, request):
+        try:
+            ids = [int(value) for value in request.query_params["ids"].split(",")]
+        except (KeyError, ValueError):
+            return Response(
+                {"error": "'ids' must be a comma-separated list of product ids."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        data = []
+        for product_id in ids:
+            quantity, by_factory = availability(product_id)
+            data.append(
+                {
+                    "product": product_id,
+                    "quantity": quantity,
+                    "factories": [
+                        {"factory": factory_id, "quantity": factory_quantity}
+                        for factory_id, factory_quantity in sorted(by_factory.items())
+                    ],
+                }
+            )
+        return Response(data)
+
+    @action(detail=False, methods=["get"], serializer_class=ProductSearchSerializer)
+    def search(self, request):
+        text = request.query_params.get("q", "")
+        if not search.terms(text):
+            return Response(
+                {"error": "'q' must contain at least one word."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        categories = parse_ids("category", request.query_params.get("category", ""))
+        available = request.query_params.get("in_stock")
+        if available not in (None, "true", "false"):
+            return Response(
+                {"error": "'in_stock' must be 'true' or 'false'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if available is not None:
+            available = available == "true"
+
+        matches = search.matching(self.get_queryset(), text)
+        results = matches.select_related("category").order_by("-rank", "name", "id")
+        if categories:
+            results = results.filter(category__in=categories)
+        if available is not None:
+            results = results.filter(in_stock=available)
+
+        page = self.paginate_queryset(results)
+        response = self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+        response.data["facets"] = search.facets(matches, categories, available)
+        return response
+
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        return Response(
+            search.autocomplete(
+                self.get_queryset(),
+                request.query_params.get("q", ""),
+                settings.SEARCH_AUTOCOMPLETE_LIMIT,
+            )
+        )
+
 
 class FactoryViewSet(viewsets.ModelViewSet):
     queryset = Factory.objects.all().order_by("name")
@@ -143,17 +329,58 @@ class FactoryWarehouseViewSet(viewsets.ModelViewSet):
     queryset = FactoryWarehouse.objects.all()
     serializer_class = FactoryWarehouseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = None
+
+    def get_queryset(self):
+        if self.action == "list":
+            return FactoryWarehouse.objects.in_stock()
+        return super().get_queryset()
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="import",
+        permission_classes=[IsFactoryGroup],
+        throttle_scope="stock_sync",
+    )
+    def import_stock(self, request):
+        # A CSV upload in `file` with product and quantity columns, e.g. an ERP
+        # export. ?mode=set (default) replaces the counts, ?mode=add adds them.
+        factory = request.user.factories.first()
+        if not factory:
+            return Response(
+                {"error": "User is not associated with any factory."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if "file" not in request.FILES:
+            return Response(
+                {"error": "Upload the CSV file as 'file'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        mode = request.query_params.get("mode", "set")
+        if mode not in stock_import.MODES:
+            return Response(
+                {"error": "'mode' must be 'set' or 'add'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            result = stock_import.import_stock(factory.id, request.FILES["file"], mode)
+        except stock_import.StockImportError as exc:
+            return Response({"errors": exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result)
 
     @action(
         detail=False,
         methods=["get", "post", "put"],
         permission_classes=[IsFactoryGroup],
+        throttle_scope="stock_sync",
     )
     def product_counts(self, request):
         if request.method == "GET":
-            warehouse_products = self.get_queryset()
-            serializer = self.get_serializer(warehouse_products, many=True)
-            return Response(serializer.data)
+            rows = FactoryWarehouseRowSerializer(request.query_params.get("fields"))
+            queryset = self.get_queryset().in_stock()
+            return Response(rows.to_representation(rows.values(queryset)))
 
         elif request.method == "POST":
             return self._handle_post_request(request)
@@ -179,11 +406,13 @@ class FactoryWarehouseViewSet(viewsets.ModelViewSet):
         if serializer.is_valid():
             with transaction.atomic():
                 serializer.save()
-                FactoryWarehouse.objects.filter(quantity=0).delete()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     def _handle_put_request(self, request):
+        # Rows with a "version" are only written if they have not changed since
+        # the client read them; if any row is stale nothing is written and the
+        # current rows are returned with 409
         user = self.request.user
         factory = user.factories.first()  # Получаем фабрику, связанную с пользователем
 
@@ -197,37 +426,240 @@ class FactoryWarehouseViewSet(viewsets.ModelViewSet):
         if isinstance(data, dict):
             data = list(data.values())
 
-        responses = []
-        with transaction.atomic():
-            for item in data:
-                try:
-                    instance = FactoryWarehouse.objects.get(
-                        product_id=item["product"], factory=factory
-                    )
-                    serializer = self.get_serializer(
-                        instance,
-                        data=item,
-                        partial=True,
-                        context={"request": request, "factory": factory},
-                    )
-                    if serializer.is_valid():
-                        serializer.save()
-                        responses.append(
-                            {"product_id": instance.product.id, "status": "updated"}
-                        )
-                    else:
-                        return Response(
-                            serializer.errors, status=status.HTTP_400_BAD_REQUEST
-                        )
-                except FactoryWarehouse.DoesNotExist:
+        serializer = ProductCountSerializer(data=data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        items = serializer.validated_data
+
+        try:
+            versions = stock.set_counts(
+                factory.id,
+                {
+                    item["product"]: (item["quantity"], item.get("version"))
+                    for item in items
+                },
+            )
+        except FactoryWarehouse.DoesNotExist as exc:
+            return Response(
+                {"error": f"Product with ID {exc.args[0]} not found in factory."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except stock.StockConflict as exc:
+            return Response({"conflicts": exc.rows}, status=status.HTTP_409_CONFLICT)
+        return Response(
+            [
+                {
+                    "product_id": item["product"],
+                    "status": "updated",
+                    "version": versions[item["product"]],
+                }
+                for item in items
+            ],
+            status=status.HTTP_200_OK,
+        )
+
+    def if_match(self, instance):
+        # The version a request's If-Match header asks to write at: None
+        # without the header or for "*", or a 412 response if the row has
+        # another version. The compression middleware weakens the ETag, so
+        # weak tags are compared too.
+        header = self.request.headers.get("If-Match")
+        if header is None:
+            return None, None
+        tags = [tag.removeprefix("W/") for tag in parse_etags(header)]
+        if "*" in tags:
+            return None, None
+        if f'"{instance.version}"' in tags:
+            return instance.version, None
+        return None, self.precondition_failed(stock.current(instance))
+
+    def precondition_failed(self, row):
+        response = Response(
+            {
+                "error": "The row was changed since it was read.",
+                "quantity": row["quantity"],
+                "version": row["version"],
+            },
+            status=status.HTTP_412_PRECONDITION_FAILED,
+        )
+        response["ETag"] = f'"{row["version"]}"'
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        response["ETag"] = f'"{response.data["version"]}"'
+        return response
+
+    def update(self, request, *args, **kwargs):
+        instance = self.get_object()
+        version, failed = self.if_match(instance)
+        if failed:
+            return failed
+        serializer = self.get_serializer(
+            instance,
+            data=request.data,
+            partial=kwargs.get("partial", False),
+            context={**self.get_serializer_context(), "version": version},
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            serializer.save()
+        except FactoryWarehouse.DoesNotExist:
+            raise Http404
+        except stock.StockConflict as exc:
+            return self.precondition_failed(exc.rows[0])
+        response = Response(serializer.data)
+        response["ETag"] = f'"{instance.version}"'
+        return response
+
+    def destroy(self, request, *args, **kwargs):
+        instance = self.get_object()
+        version, failed = self.if_match(instance)
+        if failed:
+            return failed
+        try:
+            stock.delete_count(instance, version)
+        except FactoryWarehouse.DoesNotExist:
+            raise Http404
+        except stock.StockConflict as exc:
+            return self.precondition_failed(exc.rows[0])
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsFactoryGroup],
+        serializer_class=StockMovementSerializer,
+    )
+    def movements(self, request):
+        factory = request.user.factories.first()
+        if not factory:
+            return Response(
+                {"error": "User is not associated with any factory."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        movements = StockMovement.objects.filter(factory=factory).order_by("-id")
+        params = request.query_params
+        if "product" in params:
+            movements = movements.filter(
+                product_id__in=parse_ids("product", params["product"])
+            )
+        if "kind" in params:
+            movements = movements.filter(kind=params["kind"])
+        for param, lookup in [("start", "created_at__gte"), ("end", "created_at__lt")]:
+            if param in params:
+                value = parse_datetime(params[param])
+                if value is None:
                     return Response(
-                        {
-                            "error": f'Product with ID {item["product"]} not found in factory.'
-                        },
-                        status=status.HTTP_404_NOT_FOUND,
+                        {"error": f"'{param}' must be an ISO 8601 datetime."},
+                        status=status.HTTP_400_BAD_REQUEST,
                     )
-        FactoryWarehouse.objects.filter(quantity=0).delete()
-        return Response(responses, status=status.HTTP_200_OK)
+                movements = movements.filter(**{lookup: value})
+
+        page = self.paginate_queryset(movements)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["get", "put"],
+        permission_classes=[IsFactoryGroup],
+        serializer_class=ReorderThresholdSerializer,
+    )
+    def thresholds(self, request):
+        factory = request.user.factories.first()
+        if not factory:
+            return Response(
+                {"error": "User is not associated with any factory."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.method == "PUT":
+            serializer = self.get_serializer(data=request.data, many=True)
+            serializer.is_valid(raise_exception=True)
+            with transaction.atomic():
+                ReorderThreshold.objects.bulk_create(
+                    [
+                        ReorderThreshold(factory=factory, **item)
+                        for item in serializer.validated_data
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["factory", "product"],
+                    update_fields=["threshold", "reorder_quantity"],
+                )
+                for item in serializer.validated_data:
+                    stock_changed(factory.id, item["product"].id)
+
+        thresholds = ReorderThreshold.objects.filter(factory=factory).order_by(
+            "product_id"
+        )
+        return Response(self.get_serializer(thresholds, many=True).data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsFactoryGroup],
+        serializer_class=StockAlertSerializer,
+    )
+    def alerts(self, request):
+        # Event feed: clients pass the last id they have seen as ?after=
+        factory = request.user.factories.first()
+        if not factory:
+            return Response(
+                {"error": "User is not associated with any factory."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            after = int(request.query_params.get("after", 0))
+        except ValueError:
+            return Response(
+                {"error": "'after' must be an alert id."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        # The page ends before the first alert that may have been committed
+        # ahead of lower ids, so clients do not move past those
+        cutoff = timezone.now() - datetime.timedelta(
+            seconds=settings.STOCK_ALERT_FEED_LAG
+        )
+        alerts = takewhile(
+            lambda alert: alert.created_at <= cutoff,
+            StockAlert.objects.filter(factory=factory, id__gt=after).order_by("id")[
+                : settings.STOCK_ALERT_FEED_LIMIT
+            ],
+        )
+        return Response(self.get_serializer(alerts, many=True).data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="stock-at",
+        permission_classes=[IsFactoryGroup],
+    )
+    def stock_at(self, request):
+        factory = request.user.factories.first()
+        if not factory:
+            return Response(
+                {"error": "User is not associated with any factory."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        at = parse_datetime(request.query_params.get("at", ""))
+        if at is None:
+            return Response(
+                {"error": "'at' must be an ISO 8601 datetime."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        return Response(
+            [
+                {"product": product_id, "quantity": quantity}
+                for product_id, quantity in sorted(
+                    stock.stock_at(factory.id, at).items()
+                )
+            ]
+        )
 
 
 class ProductOrderViewSet(viewsets.ModelViewSet):
@@ -237,6 +669,9 @@ class ProductOrderViewSet(viewsets.ModelViewSet):
         .prefetch_related("sale_points", "product__factorywarehouse__factory")
     )
     permission_classes = [permissions.IsAuthenticated | IsCarrierUser]
+    throttle_scope = "orders"
+    filter_backends = [OrderFilterBackend]
+    pagination_class = CappedCountPagination
 
     def get_permissions(self):
         if self.action in ["create", "update", "partial_update", "destroy"]:
@@ -245,21 +680,61 @@ class ProductOrderViewSet(viewsets.ModelViewSet):
             self.permission_classes = [IsAuthenticated]
         return super().get_permissions()
 
-    def get_queryset(self):
+    # order_date with the id as tie-breaker, so rows from several shards merge
+    # in a stable order
+    ordering = ["order_date", "id"]
+
+    @cached_property
+    def sale_point_ids(self):
+        # Sale point users only see the orders of their sale points
         user = self.request.user
-        if user.is_authenticated and user.sale_points.exists():
-            return ProductOrder.objects.filter(sale_points__in=user.sale_points.all())
-        return ProductOrder.objects.all().order_by("order_date")
+        if not user.is_authenticated:
+            return None
+        return list(user.sale_points.values_list("id", flat=True)) or None
+
+    def get_queryset(self):
+        queryset = ProductOrder.objects.order_by(*self.ordering)
+        sale_points = self.sale_point_ids
+        if sale_points is not None:
+            queryset = queryset.filter(sale_point__in=sale_points)
+        if self.lookup_field in self.kwargs:
+            return queryset.using(sharding.order_shard(self.kwargs[self.lookup_field]))
+        return queryset
+
+    def shard_querysets(self):
+        sale_points = self.sale_point_ids
+        if sale_points is None:
+            aliases = sharding.shards()
+        else:
+            aliases = sharding.shards_for(sale_points)
+        queryset = self.get_queryset()
+        return {alias: self.filter_queryset(queryset.using(alias)) for alias in aliases}
 
     def get_serializer_class(self):
         if self.action == "create":
             return CreateOrderSerializer
         return ProductOrderSerializer
 
+    def list(self, request, *args, **kwargs):
+        rows = ProductOrderRowSerializer(request.query_params.get("fields"))
+        querysets = self.shard_querysets()
+        if len(querysets) == 1:
+            queryset = rows.values(*querysets.values())
+        else:
+            queryset = sharding.Scatter(querysets, rows.sources, self.ordering)
+
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(rows.to_representation(page))
+        return Response(rows.to_representation(queryset))
+
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data, many=True)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        try:
+            self.perform_create(serializer)
+        except ValidationError as e:
+            return Response({"detail": e.messages}, status=status.HTTP_400_BAD_REQUEST)
         headers = self.get_success_headers(serializer.data)
         return Response(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
@@ -268,24 +743,27 @@ class ProductOrderViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         orders_data = serializer.validated_data
 
-        orders = []
+        items = []
         for order_data in orders_data:
             product = order_data["product"]
             quantity = order_data["quantity"]
             sale_point = order_data["sale_point"]
 
-            factory_warehouse = FactoryWarehouse.objects.filter(product=product).first()
-            if factory_warehouse is None or factory_warehouse.quantity < quantity:
+            if not can_reserve(product.id, quantity):
                 raise ValidationError(
                     f"Insufficient product quantity in the factory warehouse for product {product.name}."
                 )
+            items.append((product, quantity, sale_point))
 
-            order = ProductOrder.create_order(ProductOrder, product, quantity)
-            orders.append(order)
-
-        return orders
+        # The whole cart is reserved in one transaction, or nothing is
+        return ProductOrder.create_orders(items)
 
-    @action(detail=False, methods=["patch"], url_path="bulk-update-status")
+    @action(
+        detail=False,
+        methods=["patch"],
+        url_path="bulk-update-status",
+        throttle_scope="order_status",
+    )
     def bulk_update_status(self, request):
         orders_data = request.data
         if not isinstance(orders_data, list):
@@ -295,7 +773,7 @@ class ProductOrderViewSet(viewsets.ModelViewSet):
             )
 
         updated_orders = []
-        with transaction.atomic():
+        with sharding.atomic(sharding.shards()):
             for order_data in orders_data:
                 order_id = order_data.get("id")
                 new_status = order_data.get("status")
@@ -307,8 +785,10 @@ class ProductOrderViewSet(viewsets.ModelViewSet):
                     )
 
                 try:
-                    order = ProductOrder.objects.get(id=order_id)
-                except ProductOrder.DoesNotExist:
+                    order = ProductOrder.objects.using(
+                        sharding.order_shard(order_id)
+                    ).get(id=order_id)
+                except (ProductOrder.DoesNotExist, ValueError):
                     return Response(
                         {"error": f"Order with id {order_id} does not exist."},
                         status=status.HTTP_404_NOT_FOUND,
@@ -339,8 +819,14 @@ class SalePointViewSet(viewsets.ModelViewSet):
     queryset = SalePoint.objects.all().order_by("name")
     serializer_class = SalePointSerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = None
 
-    @action(detail=True, methods=["post"], serializer_class=CreateOrderSerializer)
+    @action(
+        detail=True,
+        methods=["post"],
+        serializer_class=CreateOrderSerializer,
+        throttle_scope="orders",
+    )
     def create_order(self, request, pk=None):
         sale_point = self.get_object()
         serializer = self.get_serializer(data=request.data)
@@ -360,14 +846,19 @@ class SalePointViewSet(viewsets.ModelViewSet):
 
 
 class ProductsWithQuantityViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = FactoryWarehouse.objects.all()
+    queryset = FactoryWarehouse.objects.in_stock()
     serializer_class = ProductsWithQuantitySerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        rows = ProductsWithQuantityRowSerializer(request.query_params.get("fields"))
+        queryset = in_stock_rows(rows)
+        # Pages like the other lists when asked to, e.g. by the `next` link of
+        # the sale point bootstrap, and returns all rows otherwise
+        if "page" in request.query_params:
+            page = self.paginate_queryset(queryset)
+            return self.get_paginated_response(rows.to_representation(page))
+        return Response(rows.to_representation(queryset))
 
 
 class CarrierViewSet(viewsets.ModelViewSet):
@@ -380,3 +871,254 @@ class DeliveryViewSet(viewsets.ModelViewSet):
     queryset = Delivery.objects.all()
     serializer_class = DeliverySerializer
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = None
+
+    def is_admin(self):
+        return IsAdminUser().has_permission(self.request, self)
+
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="tracking",
+        parser_classes=api_settings.DEFAULT_PARSER_CLASSES + [CSVParser],
+        permission_classes=[permissions.IsAuthenticated, IsCarrierUser | IsAdminUser],
+        throttle_scope="tracking",
+    )
+    def ingest_tracking(self, request):
+        # A list of {delivery, status, latitude, longitude, recorded_at} pings
+        rows = request.data
+        if not isinstance(rows, list) or not rows:
+            return Response(
+                {"error": "Data should be a non-empty list of tracking events."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(rows) > settings.TRACKING_MAX_BATCH:
+            return Response(
+                {"error": f"At most {settings.TRACKING_MAX_BATCH} events per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        events, errors = tracking.parse_events(rows)
+        if not errors:
+            errors = tracking.check_deliveries(events, request.user, self.is_admin())
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(
+            {"ingested": tracking.ingest(events)}, status=status.HTTP_201_CREATED
+        )
+
+    @action(detail=True, methods=["get"], url_path="tracking")
+    def tracking_history(self, request, pk=None):
+        try:
+            pk = int(pk)
+        except ValueError:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+        deliveries = tracking.visible_deliveries(request.user, self.is_admin())
+        if not deliveries.filter(pk=pk).exists():
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        events = TrackingEvent.objects.filter(delivery_id=pk).order_by("recorded_at")
+        for param, lookup in [
+            ("after", "recorded_at__gt"),
+            ("before", "recorded_at__lt"),
+        ]:
+            if param in request.query_params:
+                moment = parse_datetime(request.query_params[param])
+                if moment is None:
+                    return Response(
+                        {"error": f"'{param}' must be an ISO 8601 datetime."},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+                events = events.filter(**{lookup: moment})
+
+        page = self.paginate_queryset(events)
+        return self.get_paginated_response(
+            TrackingEventSerializer(page, many=True).data
+        )
+
+    @action(detail=False, methods=["get"])
+    def positions(self, request):
+        deliveries = tracking.visible_deliveries(request.user, self.is_admin())
+        positions = DeliveryPosition.objects.filter(delivery__in=deliveries).order_by(
+            "delivery"
+        )
+        if "delivery" in request.query_params:
+            positions = positions.filter(
+                delivery__in=parse_ids("delivery", request.query_params["delivery"])
+            )
+
+        page = self.paginate_queryset(positions)
+        return self.get_paginated_response(
+            DeliveryPositionSerializer(page, many=True).data
+        )
+
+
+class DemandForecastViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = DemandForecast.objects.all()
+    serializer_class = DemandForecastSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        user = self.request.user
+        queryset = DemandForecast.objects.order_by("id")
+        if not IsAdminUser().has_permission(self.request, self):
+            queryset = queryset.filter(
+                Q(sale_point__in=user.sale_points.all())
+                | Q(factory__in=user.factories.all())
+            )
+        for param in ["product", "factory", "sale_point"]:
+            if param in self.request.query_params:
+                queryset = queryset.filter(
+                    **{
+                        f"{param}_id__in": parse_ids(
+                            param, self.request.query_params[param]
+                        )
+                    }
+                )
+        return queryset
+
+    @action(detail=False, methods=["get"])
+    def suggestions(self, request):
+        # Stock suggestions per factory and product over all sale points. The
+        # forecast errors are treated as independent, so safety stocks add up
+        # as the square root of the sum of squares.
+        rows = (
+            self.get_queryset()
+            .filter(factory__isnull=False)
+            .order_by()
+            .values("factory", "product")
+            .annotate(
+                demand=Sum("total"),
+                lead_time_demand=Sum("lead_time_demand"),
+                safety_stock=Sqrt(Sum(F("safety_stock") * F("safety_stock"))),
+            )
+            .order_by("factory", "product")
+        )
+        page = self.paginate_queryset(rows)
+        for row in page:
+            row["reorder_point"] = row["lead_time_demand"] + row["safety_stock"]
+        return self.get_paginated_response(page)
+
+
+class SalesAnalyticsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+
+        granularity = params.get("granularity", "day")
+        if granularity not in GRANULARITIES:
+            return Response(
+                {"error": f"Invalid granularity '{granularity}'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        group_by = [name for name in params.get("group_by", "").split(",") if name]
+        for name in group_by:
+            if name not in GROUP_BY_FIELDS:
+                return Response(
+                    {"error": f"Cannot group by '{name}'."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+        try:
+            end = datetime.date.fromisoformat(
+                params.get("end", timezone.now().date().isoformat())
+            )
+            start = datetime.date.fromisoformat(
+                params.get("start", (end - datetime.timedelta(days=30)).isoformat())
+            )
+        except ValueError:
+            return Response(
+                {"error": "Dates must be in YYYY-MM-DD format."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if start > end:
+            return Response(
+                {"error": "'start' must not be after 'end'."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        end += datetime.timedelta(days=1)
+        if granularity == "hour":
+            start = datetime.datetime.combine(start, datetime.time(), datetime.UTC)
+            end = datetime.datetime.combine(end, datetime.time(), datetime.UTC)
+
+        user = request.user
+        scope = None
+        if not IsAdminUser().has_permission(request, self):
+            # Ids rather than subqueries, the rollups may be on another shard
+            scope = Q(
+                sale_point__in=list(user.sale_points.values_list("id", flat=True))
+            ) | Q(factory__in=list(user.factories.values_list("id", flat=True)))
+
+        data = []
+        for row in sales_report(start, end, granularity, group_by, scope):
+            row["orders"] = row.pop("order_count")
+            row["quantity"] = row.pop("units")
+            row["revenue"] = str(row["revenue"])
+            data.append(row)
+        return Response(data)
+
+
+class ProfileViewSet(viewsets.ViewSet):
+    # Request profiles saved by core.profiling.ProfilingMiddleware, newest
+    # first, optionally only those of one ?route= (a URL name). Downloads are
+    # collapsed stacks that speedscope or flamegraph.pl open as they are.
+    permission_classes = [IsAdminUser]
+    lookup_value_regex = r"[\w.-]+"
+
+    def list(self, request):
+        return Response(profiling.profiles(request.query_params.get("route")))
+
+    def retrieve(self, request, pk=None):
+        path = profiling.profile_path(pk)
+        if path is None:
+            raise Http404
+        return FileResponse(
+            open(path, "rb"), as_attachment=True, content_type="text/plain"
+        )
+
+
+class SlowQueryViewSet(
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    # Statements slower than SLOW_QUERY_MS per fingerprint, see core/querylog.py.
+    # ?order=total (default), mean, max, calls or recent; the plan is in the
+    # detail. Deleting a fingerprint starts its counts over, e.g. after a fix.
+    queryset = SlowQuery.objects.all()
+    permission_classes = [IsAdminUser]
+    orderings = {
+        "total": "-total_ms",
+        "mean": "-mean_ms",
+        "max": "-max_ms",
+        "calls": "-calls",
+        "recent": "-last_seen",
+    }
+
+    def get_serializer_class(self):
+        if self.action == "retrieve":
+            return SlowQueryDetailSerializer
+        return SlowQuerySerializer
+
+    def get_queryset(self):
+        if self.action != "list":
+            return SlowQuery.objects.all()
+        order = self.request.query_params.get("order", "total")
+        return (
+            SlowQuery.objects.defer("plan")
+            .annotate(mean_ms=F("total_ms") / Greatest(F("calls"), 1))
+            .order_by(self.orderings[order], "id")
+        )
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("order", "total") not in self.orderings:
+            return Response(
+                {"error": f"'order' must be one of {', '.join(self.orderings)}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.urls import get_resolver
+
+from core import search
+from core.availability import get_index
+
+logger = logging.getLogger(__name__)
+
+
+def connect():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def connect_threads(executor, count, timeout=None):
+    # Opens a connection in each of the executor's threads. Django keeps one
+    # connection per thread, so with DB_CONN_MAX_AGE the request threads of a
+    # worker start out connected. The barrier makes every task wait until all
+    # are running, which forces the executor to start `count` threads.
+    timeout = settings.WARMUP_TIMEOUT if timeout is None else timeout
+    barrier = threading.Barrier(count)
+
+    def run():
+        barrier.wait(timeout)
+        connect()
+
+    for future in [executor.submit(run) for _ in range(count)]:
+        future.result()
+
+
+def warm_up(timeout=None):
+    # Pays the first-request costs of a fresh worker up front: the database
+    # connection, the URL resolver (which imports every view and serializer),
+    # the content type cache behind permission checks, the search probe and
+    # the availability index load. Gunicorn calls this before the worker
+    # accepts connections, see gunicorn.conf.py. Returns seconds per step.
+    timeout = settings.WARMUP_TIMEOUT if timeout is None else timeout
+    timings = {}
+
+    def step(name, func):
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception:
+            # A worker that cannot warm up still serves, just slower at first
+            logger.exception("Warm-up step %s failed", name)
+        timings[name] = time.perf_counter() - start
+
+    def index():
+        index = get_index()
+        if index is not None and not index.ready.wait(timeout):
+            logger.warning("Availability index not loaded after %ss", timeout)
+
+    step("database", connect)
+    step("urls", lambda: get_resolver().url_patterns)
+    step(
+        "content_types", lambda: ContentType.objects.get_for_models(*apps.get_models())
+    )
+    step("search", search.trigram_available)
+    step("availability", index)
+
+    logger.info(
+        "Worker warmed up in %.3fs: %s",
+        sum(timings.values()),
+        ", ".join(f"{name} {seconds:.3f}s" for name, seconds in timings.items()),
+    )
+    return timings
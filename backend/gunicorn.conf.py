@@ -0,0 +1,64 @@
+import os
+
+# Production serving profile, read by `gunicorn asgs.wsgi` from this directory.
+# Every value can be overridden with the GUNICORN_* variables below.
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name) or default)
+
+
+# Workers keep their database connections between requests
+os.environ.setdefault("DB_CONN_MAX_AGE", "60")
+# Application logs go to stdout with the access log, collected by the
+# container runtime. A LOG_FILE is shared and rotated by all workers.
+os.environ.setdefault("LOG_FILE", "-")
+
+# CPUs this container may run on, not the host's
+cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else 1
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+# Requests mostly wait on the database, so two processes per CPU each with a
+# few threads keep the CPUs busy without multiplying connections too much
+workers = _env_int("GUNICORN_WORKERS", cpus * 2 + 1)
+threads = _env_int("GUNICORN_THREADS", max(2, 8 // cpus))
+worker_class = "gthread"
+
+# Imports Django once in the master, forked workers share the pages
+preload_app = True
+
+# Recycles workers to bound slow leaks; the jitter keeps them from all
+# restarting at once
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 2000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 200)
+
+timeout = _env_int("GUNICORN_TIMEOUT", 30)
+# Time a worker gets to finish its requests on SIGTERM, HUP or recycling
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5)
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+
+
+def when_ready(server):
+    # Anything the preloaded app connected to in the master must not leak into
+    # the workers, which would share one socket
+    from django.db import connections
+
+    connections.close_all()
+
+
+def post_worker_init(worker):
+    # Runs in each new worker before it accepts connections, including those
+    # replacing recycled workers and on `kill -HUP` reloads
+    from core.warmup import connect_threads, warm_up
+
+    timings = warm_up()
+    # The gthread worker has created its request thread pool by now
+    if getattr(worker, "tpool", None) is not None:
+        try:
+            connect_threads(worker.tpool, worker.cfg.threads)
+        except Exception:
+            worker.log.exception("Could not connect the request threads")
+    worker.log.info("Worker %s warmed up in %.3fs", worker.pid, sum(timings.values()))